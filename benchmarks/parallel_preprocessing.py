@@ -0,0 +1,55 @@
+# benchmarks/parallel_preprocessing.py
+"""
+Speedup of ParallelChunkProcessor by worker count on a synthetic recon extract.
+
+Run from the repository root:  python -m benchmarks.parallel_preprocessing
+"""
+import logging
+import os
+import time
+import numpy as np
+import pandas as pd
+from preprocessing.categorizer import Categorizer
+from preprocessing.data_cleaner import DataCleaner
+from preprocessing.parallel import ParallelChunkProcessor
+
+
+def clean_and_categorize(df):
+    """Module-level (hence picklable) clean + categorize task."""
+    cleaned = DataCleaner().clean_data(df, date_columns={'sys_a_date': '%d/%m/%Y'})
+    return Categorizer().categorize_data(cleaned, 'recon_sub_status', 'Not Found-SysB')
+
+
+def synthetic_chunks(rows=2_000_000, chunk_rows=250_000):
+    rng = np.random.default_rng(0)
+    statuses = np.array(['Not Found-SysB', 'Not Found-SysA', 'Matched', 'Amount Mismatch'])
+    data = pd.DataFrame({
+        'txn_ref_id': pd.Series(rng.integers(0, rows, rows)).astype(str),
+        'sys_a_amount_attribute_1': np.where(rng.random(rows) < 0.05, np.nan, rng.random(rows) * 1000),
+        'sys_a_date': pd.Series(pd.date_range('2023-01-01', periods=730).strftime('%d/%m/%Y'))
+                        .sample(rows, replace=True, random_state=0).to_numpy(),
+        'recon_sub_status': statuses[rng.integers(0, len(statuses), rows)],
+    })
+    return [data.iloc[start:start + chunk_rows] for start in range(0, rows, chunk_rows)]
+
+
+def main(worker_counts=(1, 2, 4, 8)):
+    logger = logging.getLogger(__name__)
+    chunks = synthetic_chunks()
+    started = time.perf_counter()
+    serial = pd.concat(clean_and_categorize(chunk) for chunk in chunks)
+    baseline = time.perf_counter() - started
+    logger.info(f"{os.cpu_count()} CPUs, {sum(len(chunk) for chunk in chunks)} rows in {len(chunks)} chunks")
+    logger.info(f"serial      {baseline:6.2f}s")
+    for workers in worker_counts:
+        started = time.perf_counter()
+        parallel = pd.concat(ParallelChunkProcessor(clean_and_categorize, workers).map(chunks))
+        seconds = time.perf_counter() - started
+        assert parallel.reset_index(drop=True).equals(serial.reset_index(drop=True))
+        logger.info(f"{workers} worker(s) {seconds:6.2f}s  speedup {baseline / seconds:4.2f}x")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    logging.getLogger(__name__).setLevel(logging.INFO)
+    main()
@@ -1,6 +1,26 @@
 # config.py
 import os
 from dotenv import load_dotenv
+from data_ingestion.schema import IngestSchema, DTYPE_BACKENDS
+from data_ingestion.readers import SUPPORTED_FILE_TYPES, EXCEL_ENGINES
+from preprocessing.exporter import EXPORT_FORMATS
+
+def _to_bool(value):
+    """Casts an environment variable string such as 'true'/'0'/'no' to a bool."""
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+
+def _to_date_columns(value):
+    """Casts 'col1,col2=%d/%m/%Y' to {'col1': None, 'col2': '%d/%m/%Y'} (None: detect the format)."""
+    columns = {}
+    for item in str(value).split(','):
+        col, _, date_format = item.partition('=')
+        if col.strip():
+            columns[col.strip()] = date_format.strip() or None
+    return columns
+
+def _to_sheet(value):
+    """Casts a worksheet setting to a 0-based index if numeric, else keeps it as a sheet name."""
+    return int(value) if str(value).strip().isdigit() else value
 
 class Config:
     """
@@ -24,12 +44,69 @@ class Config:
         self.sftp_file_type = self._get_env('SFTP_FILE_TYPE', 'csv')
         self.sftp_comments_file = self._get_env("SFTP_COMMENTS_FILE", '')
         self.sftp_comments_file_type = self._get_env("SFTP_COMMENTS_FILE_TYPE", "csv")
+        # Pooled SFTP sessions: one authenticated transport per host/user is reused across fetches
+        self.sftp_pool_enabled = self._get_env('SFTP_POOL_ENABLED', True, _to_bool)
+        self.sftp_max_channels = self._get_env('SFTP_MAX_CHANNELS', 4, int)
+        self.sftp_idle_timeout = self._get_env('SFTP_IDLE_TIMEOUT', 300, int)  # seconds
+        self.sftp_keepalive_interval = self._get_env('SFTP_KEEPALIVE_INTERVAL', 30, int)  # seconds
+        # Concurrent downloads when SFTP_REMOTE_FILE is a glob (e.g. /drop/recon_*.csv)
+        self.sftp_fetch_workers = self._get_env('SFTP_FETCH_WORKERS', 4, int)
+        # Incremental sync: mirror remote files locally and skip transfers when size/mtime are unchanged
+        self.sftp_incremental_sync = self._get_env('SFTP_INCREMENTAL_SYNC', False, _to_bool)
+        self.sftp_append_only = self._get_env('SFTP_APPEND_ONLY', False, _to_bool)  # fetch only new bytes of grown files
+        self.sftp_sync_dir = self._get_env('SFTP_SYNC_DIR', 'temp/sftp_sync')
+        # Rows per chunk for streaming CSV ingestion.  0 disables streaming and
+        # loads the whole file into a single DataFrame.
+        self.ingest_chunk_size = self._get_env('INGEST_CHUNK_SIZE', 0, int)
+        # Excel reader: 'streaming' (row-streaming read-only openpyxl), 'openpyxl' (pandas default)
+        # or 'calamine' (requires the optional python-calamine package)
+        self.excel_engine = self._get_env('EXCEL_ENGINE', 'streaming')
+        # Worksheet to read: a 0-based index or a sheet name
+        self.excel_sheet = self._get_env('EXCEL_SHEET', 0, _to_sheet)
+        # Parsed-dataset cache: re-uploads of the same file are loaded from a memory-mapped Arrow copy
+        # instead of being parsed (without a copy only with DATAFRAME_ENGINE=pyarrow)
+        self.dataset_cache_enabled = self._get_env('DATASET_CACHE_ENABLED', True, _to_bool)
+        self.dataset_cache_dir = self._get_env('DATASET_CACHE_DIR', 'temp/dataset_cache')
+        self.dataset_cache_max_mb = self._get_env('DATASET_CACHE_MAX_MB', 2048, int)
+        self.dataset_cache_max_entries = self._get_env('DATASET_CACHE_MAX_ENTRIES', 32, int)
 
         # --- Preprocessing ---
         self.system_b_column = self._get_env('SYSTEM_B_COLUMN', 'recon_sub_status')
         self.not_found_value = self._get_env('NOT_FOUND_VALUE', 'Not Found-SysB')
         self.csv_export_columns = ['txn_ref_id', 'sys_a_amount_attribute_1', 'sys_a_date']  # Keep as list, no need for env var
-        self.date_columns = ['date']  # Keep as list
+        # When set, every recon sub-status bucket (Not Found-SysA, Not Found-SysB, ...) is exported
+        # to its own CSV in this directory during preprocessing
+        self.bucket_export_dir = self._get_env('BUCKET_EXPORT_DIR', '')
+        # Memory the streaming preprocessing pipeline may use (chunk splitting and in-memory result)
+        self.pipeline_memory_mb = self._get_env('PIPELINE_MEMORY_MB', 512, int)
+        # Worker processes cleaning/categorizing hash partitions (by txn_ref_id) of each chunk; 1 = in process
+        self.pipeline_workers = self._get_env('PIPELINE_WORKERS', 1, int)
+        # Format of the categorized export uploaded to GCS: csv, csv.gz, csv.zst (needs zstandard) or parquet
+        self.export_format = self._get_env('EXPORT_FORMAT', 'csv')
+        self.export_workers = self._get_env('EXPORT_WORKERS', 4, int)  # threads formatting/compressing CSV chunks
+        # Date columns, each optionally with its strptime format: 'sys_a_date=%d/%m/%Y,value_date'.
+        # Columns without a format have it detected from a sample of their values.
+        self.date_columns = self._get_env('DATE_COLUMNS', {'date': None}, _to_date_columns)
+        # Cross-chunk deduplication of streamed input.  Empty DEDUP_KEY_COLUMNS compares whole rows;
+        # otherwise a comma-separated key (e.g. txn_ref_id) whose first occurrence is kept.
+        self.dedup_key_columns = [col.strip() for col in self._get_env('DEDUP_KEY_COLUMNS', '').split(',') if col.strip()]
+        self.dedup_memory_mb = self._get_env('DEDUP_MEMORY_MB', 256, int)  # hash storage before spilling to disk
+        self.dedup_spill_dir = self._get_env('DEDUP_SPILL_DIR', 'temp/dedup')
+
+        # --- Ingest Schema ---
+        # Only the columns preprocessing needs are parsed; everything else in the
+        # extract is skipped by the reader.  Set INGEST_SCHEMA_ENABLED=false to load all columns.
+        self.ingest_schema_enabled = self._get_env('INGEST_SCHEMA_ENABLED', True, _to_bool)
+        # Column storage for ingest and preprocessing: 'numpy' (pandas default) or 'pyarrow'
+        # (Arrow-backed strings/numbers; converted back to NumPy only for display)
+        self.dataframe_engine = self._get_env('DATAFRAME_ENGINE', 'numpy')
+        self.ingest_columns = ['txn_ref_id', 'sys_a_amount_attribute_1', 'sys_a_date', self.system_b_column]
+        self.ingest_dtypes = {'txn_ref_id': 'string', 'sys_a_amount_attribute_1': 'float64'}
+        self.ingest_categorical_columns = [self.system_b_column]
+        self.ingest_date_formats = {}  # e.g. {'sys_a_date': '%Y-%m-%d'}
+        # Keep only rows whose SYSTEM_B_COLUMN contains NOT_FOUND_VALUE.  Parquet/Feather/Arrow
+        # readers evaluate this inside the reader, so the other rows are never materialized.
+        self.ingest_row_filter_enabled = self._get_env('INGEST_ROW_FILTER_ENABLED', False, _to_bool)
 
         # --- File Handling (Google Cloud Storage) ---
         self.gcs_bucket_name = self._get_env('GCS_BUCKET_NAME')
@@ -44,6 +121,23 @@ class Config:
         # --- Resolution Handler ---
         self.openai_api_key = self._get_env('OPENAI_API_KEY')
         self.openai_model_name = self._get_env('OPENAI_MODEL_NAME', 'gpt-3.5-turbo')
+        self.llm_max_concurrency = self._get_env('LLM_MAX_CONCURRENCY', 8, int)  # classification requests in flight
+        self.llm_batch_size = self._get_env('LLM_BATCH_SIZE', 20, int)  # comments per classification request
+        self.llm_batch_max_tokens = self._get_env('LLM_BATCH_MAX_TOKENS', 3000, int)  # estimated prompt tokens per batch
+        # Persistent cache of classifications, keyed by normalized comment, model and prompt version
+        self.llm_cache_enabled = self._get_env('LLM_CACHE_ENABLED', True, _to_bool)
+        self.llm_cache_path = self._get_env('LLM_CACHE_PATH', 'temp/llm_cache.sqlite')
+        self.llm_cache_ttl_days = self._get_env('LLM_CACHE_TTL_DAYS', 30, float)
+        self.llm_cache_max_entries = self._get_env('LLM_CACHE_MAX_ENTRIES', 100_000, int)
+        # Keyword/regex rules labelling obvious comments first (JSON rule list; empty: built-in rules)
+        self.rule_classifier_enabled = self._get_env('RULE_CLASSIFIER_ENABLED', True, _to_bool)
+        self.rule_classifier_rules_path = self._get_env('RULE_CLASSIFIER_RULES_PATH', '')
+        # Embedding nearest-neighbour classifier; low-confidence comments fall back to the LLM
+        self.local_classifier_enabled = self._get_env('LOCAL_CLASSIFIER_ENABLED', True, _to_bool)
+        self.local_classifier_store_path = self._get_env('LOCAL_CLASSIFIER_STORE_PATH', 'temp/embedding_store.npz')
+        self.local_classifier_k = self._get_env('LOCAL_CLASSIFIER_K', 5, int)
+        self.local_classifier_confidence = self._get_env('LOCAL_CLASSIFIER_CONFIDENCE', 0.9, float)
+        self.local_classifier_audit_fraction = self._get_env('LOCAL_CLASSIFIER_AUDIT_FRACTION', 0.05, float)  # also sent to the LLM
         self.num_clusters = self._get_env("NUM_CLUSTERS", 3, int)
 
         # --- Reporting ---
@@ -82,6 +176,22 @@ class Config:
             raise ValueError(f"Invalid value for environment variable '{var_name}': {e}")
 
 
+    def ingest_schema(self):
+        """
+        Builds the ingest schema for the reconciliation data.
+
+        Returns:
+            IngestSchema: The schema, or None if schema projection is disabled
+                (and the default NumPy engine is used).
+        """
+        if not self.ingest_schema_enabled:
+            return IngestSchema(dtype_backend=self.dataframe_engine) if self.dataframe_engine != 'numpy' else None
+        return IngestSchema(columns=self.ingest_columns, dtypes=self.ingest_dtypes,
+                            categorical_columns=self.ingest_categorical_columns,
+                            date_formats=self.ingest_date_formats,
+                            row_filter=(self.system_b_column, self.not_found_value) if self.ingest_row_filter_enabled else None,
+                            dtype_backend=self.dataframe_engine)
+
     def validate(self):
         """
         Performs additional validation checks on configuration settings.
@@ -94,6 +204,17 @@ class Config:
             os.makedirs(self.local_temp_dir, exist_ok=True) #optionally create the directory
             # raise ValueError(f"LOCAL_TEMP_DIR '{self.local_temp_dir}' is not a valid directory.")
 
+        for name, file_type in (('SFTP_FILE_TYPE', self.sftp_file_type),
+                                 ('SFTP_COMMENTS_FILE_TYPE', self.sftp_comments_file_type)):
+            if file_type.lower() not in SUPPORTED_FILE_TYPES:
+                raise ValueError(f"{name} '{file_type}' is not one of {', '.join(SUPPORTED_FILE_TYPES)}.")
+        if self.excel_engine not in EXCEL_ENGINES:
+            raise ValueError(f"EXCEL_ENGINE '{self.excel_engine}' is not one of {', '.join(EXCEL_ENGINES)}.")
+        if self.dataframe_engine not in DTYPE_BACKENDS:
+            raise ValueError(f"DATAFRAME_ENGINE '{self.dataframe_engine}' is not one of {', '.join(DTYPE_BACKENDS)}.")
+        if self.export_format not in EXPORT_FORMATS:
+            raise ValueError(f"EXPORT_FORMAT '{self.export_format}' is not one of {', '.join(EXPORT_FORMATS)}.")
+
         # GCS Validation:  Check for *either* ADC working *or* credentials file
         if self.gcs_credentials_path and not os.path.exists(self.gcs_credentials_path):
             raise ValueError(f"GCS_CREDENTIALS_PATH '{self.gcs_credentials_path}' does not exist.")
@@ -1,25 +1,65 @@
 # data_ingestion/api_ingestor.py
 import requests
+from requests.adapters import HTTPAdapter
 import pandas as pd
+import numpy as np
 import logging
 import json
+import math
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from data_ingestion.chunked_dataset import ChunkedDataset
+from data_ingestion.json_stream import iter_json_records, iter_record_frames
+
+# Query parameter names used by each pagination strategy (overridable per call)
+PAGINATION_PARAMS = {
+    'page': {'page_param': 'page', 'size_param': 'page_size'},
+    'offset': {'page_param': 'offset', 'size_param': 'limit'},
+    'cursor': {'page_param': 'cursor', 'size_param': 'limit'},
+}
 
 class APIIngestor:
     """
     Fetches data from a REST API.
     """
 
-    def __init__(self, base_url, api_key=None):
+    def __init__(self, base_url, api_key=None, schema=None, max_concurrency=8, timeout=30, cache=None):
+        """
+        Args:
+            base_url (str): The API base URL.
+            api_key (str, optional): Bearer token.
+            schema (IngestSchema, optional): Applied to every fetched DataFrame.
+            max_concurrency (int): Maximum pages fetched in parallel; also the
+                size of the keep-alive connection pool.
+            timeout (float): Per-request timeout in seconds.
+            cache (HTTPResponseCache, optional): Revalidating response cache
+                used by `fetch_data`.
+        """
         self.base_url = base_url
         self.api_key = api_key
+        self.schema = schema  # IngestSchema applied to every fetched DataFrame
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.cache = cache
         self.headers = {}
         if api_key:
             self.headers['Authorization'] = f'Bearer {api_key}'
+        # One pooled keep-alive session: connections are reused across requests and threads
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update(self.headers)
+        self.page_stats = []  # Per-page latency records of the last paginated fetch
 
     def fetch_data(self, endpoint, params=None):
         """
         Fetches data from a specific API endpoint.
 
+        If a cache is configured, the request carries the cached entry's
+        validators and a `304 Not Modified` is answered from the cache.
+
         Args:
             endpoint (str): The API endpoint (e.g., '/transactions').
             params (dict, optional): Query parameters for the API request.
@@ -29,24 +69,27 @@ class APIIngestor:
             None: If there is an error or the response is not valid JSON.
         """
         url = f"{self.base_url}{endpoint}"
+        cache_key = self.cache.key(url, params) if self.cache is not None else None
         try:
-            response = requests.get(url, headers=self.headers, params=params)
+            headers = self.cache.conditional_headers(cache_key) if self.cache is not None else None
+            response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+            if response.status_code == 304:
+                df = self.cache.load(cache_key)
+                if df is not None:
+                    logging.info(f"API response for {url} not modified; using cached copy")
+                    return df
+                # Cached frame vanished: fetch unconditionally
+                response = self.session.get(url, params=params, timeout=self.timeout)
             response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
 
             try:
                 data = response.json()
-                # Handle different JSON structures (list of dicts, nested data, etc.)
-                if isinstance(data, list):
-                    df = pd.DataFrame(data)
-                elif isinstance(data, dict):
-                    # Example: If the data is nested under a key like 'results'
-                    if 'results' in data and isinstance(data['results'], list):
-                        df = pd.DataFrame(data['results'])
-                    else:
-                        df = pd.DataFrame([data])  # Convert single dict to DataFrame
-                else:
+                df = self._to_frame(data)
+                if df is None:
                     logging.error(f"Unexpected JSON structure: {data}")
-                    return None
+                elif self.cache is not None:
+                    self.cache.store(cache_key, url, df, response.headers.get('ETag'),
+                                     response.headers.get('Last-Modified'))
                 return df
             except json.JSONDecodeError:
                 logging.error(f"Failed to decode JSON from response: {response.text}")
@@ -55,4 +98,195 @@ class APIIngestor:
 
         except requests.exceptions.RequestException as e:
             logging.error(f"Error fetching data from API: {e}")
-            return None
\ No newline at end of file
+            return None
+
+    def stream_data(self, endpoint, params=None, chunk_rows=50_000, json_format='auto', read_size=64 * 1024):
+        """
+        Streams a large JSON array or NDJSON response as bounded DataFrame chunks.
+
+        The body is read `read_size` bytes at a time and decoded record by
+        record.  Peak memory is therefore about one chunk of `chunk_rows` rows,
+        however large the response is.  Each iteration of the returned
+        dataset issues a fresh request.
+
+        Args:
+            endpoint (str): The API endpoint.
+            params (dict, optional): Query parameters for the API request.
+            chunk_rows (int): Maximum rows per DataFrame chunk.
+            json_format (str): 'array', 'ndjson', or 'auto' (uses the
+                Content-Type, then the first character of the body).
+            read_size (int): Bytes read from the socket per step.
+
+        Returns:
+            ChunkedDataset: Re-iterable over the DataFrame chunks.
+
+        Raises:
+            ValueError: If `chunk_rows` is not positive.
+        """
+        if chunk_rows <= 0:
+            raise ValueError("chunk_rows must be a positive integer.")
+        url = f"{self.base_url}{endpoint}"
+
+        def chunks():
+            with self.session.get(url, params=params, timeout=self.timeout, stream=True) as response:
+                response.raise_for_status()
+                body_format = json_format
+                content_type = response.headers.get('Content-Type', '')
+                if body_format == 'auto' and ('ndjson' in content_type or 'jsonl' in content_type):
+                    body_format = 'ndjson'
+                records = iter_json_records(response.iter_content(read_size), body_format,
+                                            response.encoding or 'utf-8')
+                yield from iter_record_frames(records, chunk_rows, self.schema)
+
+        return ChunkedDataset(chunks, description=url)
+
+    def _to_frame(self, data, records_key='results'):
+        """Converts a decoded JSON body into a DataFrame (None for unexpected structures)."""
+        # Handle different JSON structures (list of dicts, nested data, etc.)
+        if isinstance(data, list):
+            df = pd.DataFrame(data)
+        elif isinstance(data, dict):
+            # Example: If the data is nested under a key like 'results'
+            if records_key in data and isinstance(data[records_key], list):
+                df = pd.DataFrame(data[records_key])
+            else:
+                df = pd.DataFrame([data])  # Convert single dict to DataFrame
+        else:
+            return None
+        if self.schema:
+            df = self.schema.apply(df)
+        return df
+
+    def _fetch_page(self, url, params, page_number, records_key):
+        """Fetches one page; returns `(DataFrame, decoded body)` and records its latency."""
+        started = time.perf_counter()
+        response = self.session.get(url, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        records = data.get(records_key, []) if isinstance(data, dict) else data
+        # Build the page's DataFrame right away so the decoded JSON can be released
+        df = self._to_frame(records if isinstance(records, list) else [], records_key)
+        self.page_stats.append({'page': page_number, 'seconds': time.perf_counter() - started,
+                                'records': len(df), 'status': response.status_code})
+        return df, data
+
+    def iter_pages(self, endpoint, params=None, pagination='page', page_size=1000, records_key='results',
+                   total_key='total', next_cursor_key='next_cursor', max_pages=None, **param_names):
+        """
+        Fetches a paginated endpoint, yielding one DataFrame per page in page order.
+
+        'page' and 'offset' pagination fetch up to `max_concurrency` pages in
+        parallel.  If the first page reports the total record count
+        (`total_key`), exactly the remaining pages are requested.  Otherwise
+        pages are requested in windows until a short or empty page is seen.
+        'cursor' pagination is inherently sequential (each request needs the
+        previous response's `next_cursor_key`) but still reuses the pooled
+        keep-alive connection.
+
+        Per-page latency is recorded in `page_stats` (see `latency_summary`).
+
+        Args:
+            endpoint (str): The API endpoint.
+            params (dict, optional): Extra query parameters sent with every page.
+            pagination (str): 'page', 'offset' or 'cursor'.
+            page_size (int): Records requested per page.
+            records_key (str): Key holding the records in a JSON object body.
+            total_key (str): Key holding the total record count, if the API reports it.
+            next_cursor_key (str): Key holding the next cursor ('cursor' pagination).
+            max_pages (int, optional): Stop after this many pages.
+            **param_names: Override the query parameter names (`page_param`,
+                `size_param`), see `PAGINATION_PARAMS`.
+
+        Yields:
+            pandas.DataFrame: One page of records.
+
+        Raises:
+            ValueError: For an unknown pagination strategy.
+            requests.exceptions.RequestException: If a page request fails.
+        """
+        if pagination not in PAGINATION_PARAMS:
+            raise ValueError(f"Unsupported pagination '{pagination}'.  Use one of {', '.join(PAGINATION_PARAMS)}.")
+        names = {**PAGINATION_PARAMS[pagination], **param_names}
+        url = f"{self.base_url}{endpoint}"
+        self.page_stats = []
+        max_pages = max_pages or math.inf
+
+        def page_params(index, cursor=None):
+            query = dict(params or {})
+            query[names['size_param']] = page_size
+            if pagination == 'page':
+                query[names['page_param']] = index + 1
+            elif pagination == 'offset':
+                query[names['page_param']] = index * page_size
+            elif cursor is not None:
+                query[names['page_param']] = cursor
+            return query
+
+        # The first page is always fetched alone: it tells us the total or the first cursor
+        df, data = self._fetch_page(url, page_params(0), 1, records_key)
+        yield df
+        if len(df) < page_size or max_pages <= 1:
+            return
+
+        if pagination == 'cursor':
+            index = 1
+            cursor = data.get(next_cursor_key) if isinstance(data, dict) else None
+            while cursor and index < max_pages:
+                df, data = self._fetch_page(url, page_params(index, cursor), index + 1, records_key)
+                yield df
+                index += 1
+                cursor = data.get(next_cursor_key) if isinstance(data, dict) else None
+            return
+
+        total = data.get(total_key) if isinstance(data, dict) else None
+        last_index = min(max_pages, math.ceil(total / page_size)) if isinstance(total, int) else max_pages
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            pending = deque()
+            next_index, done = 1, False
+            while not done:
+                while len(pending) < self.max_concurrency and next_index < last_index:
+                    pending.append(executor.submit(self._fetch_page, url, page_params(next_index),
+                                                   next_index + 1, records_key))
+                    next_index += 1
+                if not pending:
+                    break
+                df, _ = pending.popleft().result()
+                if len(df):
+                    yield df
+                # A short page is the last one; speculative requests past it are dropped
+                done = len(df) < page_size
+            for future in pending:
+                future.cancel()
+
+    def fetch_all(self, endpoint, params=None, pagination='page', page_size=1000, **kwargs):
+        """
+        Fetches every page of an endpoint (see `iter_pages`) into one DataFrame.
+
+        Returns:
+            pandas.DataFrame: All records.
+            None: If any page request fails.
+        """
+        try:
+            frames = list(self.iter_pages(endpoint, params, pagination, page_size, **kwargs))
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logging.error(f"Error fetching paginated data from API: {e}")
+            return None
+        summary = self.latency_summary()
+        logging.info(f"Fetched {summary['pages']} pages from {endpoint}: "
+                     f"mean {summary['mean_seconds']:.3f}s, p95 {summary['p95_seconds']:.3f}s per page")
+        return pd.concat(frames, ignore_index=True)
+
+    def latency_summary(self):
+        """
+        Summarizes per-page latency of the last paginated fetch.
+
+        Returns:
+            dict: 'pages', 'records', 'mean_seconds', 'p50_seconds', 'p95_seconds', 'max_seconds'.
+        """
+        seconds = np.array([stat['seconds'] for stat in self.page_stats])
+        if not len(seconds):
+            return {'pages': 0, 'records': 0, 'mean_seconds': 0.0, 'p50_seconds': 0.0,
+                    'p95_seconds': 0.0, 'max_seconds': 0.0}
+        return {'pages': len(seconds), 'records': sum(stat['records'] for stat in self.page_stats),
+                'mean_seconds': float(seconds.mean()), 'p50_seconds': float(np.percentile(seconds, 50)),
+                'p95_seconds': float(np.percentile(seconds, 95)), 'max_seconds': float(seconds.max())}
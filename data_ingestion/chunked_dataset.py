@@ -0,0 +1,47 @@
+# data_ingestion/chunked_dataset.py
+import pandas as pd
+
+
+class ChunkedDataset:
+    """
+    Re-iterable handle over a chunked ingest.
+
+    Every iteration calls the factory again and therefore re-opens the
+    underlying source, so the data can be scanned more than once (preview,
+    preprocessing) without ever being held in memory as a single DataFrame.
+    """
+
+    def __init__(self, chunk_factory, description=""):
+        """
+        Args:
+            chunk_factory (callable): Zero-argument callable returning a fresh
+                iterator of pandas DataFrames.
+            description (str): Human readable name of the source (for logging).
+        """
+        self.chunk_factory = chunk_factory
+        self.description = description
+
+    def __iter__(self):
+        return iter(self.chunk_factory())
+
+    def head(self, n=5):
+        """
+        Returns the first `n` rows, reading only the first chunk.
+
+        Args:
+            n (int): Number of rows to return.
+
+        Returns:
+            pd.DataFrame: The leading rows (empty if the source has no rows).
+        """
+        for chunk in self:
+            return chunk.head(n)
+        return pd.DataFrame()
+
+    @property
+    def empty(self):
+        """True if the source yields no rows (checks the first chunk only)."""
+        return self.head(1).empty
+
+    def __repr__(self):
+        return f"ChunkedDataset({self.description!r})"
@@ -0,0 +1,146 @@
+# data_ingestion/compression.py
+"""
+Transparent decompression of ingest sources.
+
+Compression is detected from the leading magic bytes rather than from the
+file name, so `.csv.gz` uploads, renamed files and SFTP drops all work.
+gzip, bz2 and zstd streams are decompressed on the fly while the parser
+reads them, so no uncompressed copy is ever written.  A zip archive is
+expanded into its data files, which are ingested as one dataset.
+"""
+import bz2
+import gzip
+import io
+import os
+import zipfile
+from contextlib import contextmanager, ExitStack
+
+MAGIC_NUMBERS = (
+    (b'\x1f\x8b', 'gzip'),
+    (b'BZh', 'bz2'),
+    (b'\x28\xb5\x2f\xfd', 'zstd'),
+    (b'PK\x03\x04', 'zip'),
+)
+# Extensions stripped before inferring the file type from a name (e.g. 'recon.csv.gz')
+COMPRESSION_EXTENSIONS = ('gz', 'gzip', 'bz2', 'zst', 'zstd')
+
+
+def _head(source, size=4):
+    """
+    Returns the first bytes of a source without consuming them.  Sources that
+    can neither seek nor peek return b'' (and are treated as uncompressed).
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source[:size])
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            return f.read(size)
+    if hasattr(source, 'seekable') and source.seekable():
+        position = source.tell()
+        head = source.read(size)
+        source.seek(position)
+        return head if isinstance(head, bytes) else b''
+    if hasattr(source, 'peek'):
+        return source.peek(size)[:size]
+    return b''
+
+
+def detect_compression(source):
+    """
+    Identifies the compression of a source from its magic bytes.
+
+    Args:
+        source (bytes | str | file-like): File content, path or binary file object.
+
+    Returns:
+        str: 'gzip', 'bz2', 'zstd' or 'zip'.
+        None: If the source is not compressed (or cannot be inspected).
+    """
+    head = _head(source)
+    for magic, compression in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def _is_xlsx(archive):
+    """True if a zip archive is itself an Office Open XML workbook."""
+    return '[Content_Types].xml' in archive.namelist() and any(
+        name.startswith('xl/') for name in archive.namelist())
+
+
+def _open_binary(source, stack):
+    """Returns a binary file object for a source, registering anything opened on `stack`."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    if isinstance(source, (str, os.PathLike)):
+        return stack.enter_context(open(source, 'rb'))
+    return source
+
+
+def _decompressing_stream(raw, compression):
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=raw, mode='rb')
+    if compression == 'bz2':
+        return bz2.BZ2File(raw, mode='rb')
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError("zstd-compressed input needs the optional 'zstandard' package (pip install zstandard).")
+    return zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+
+
+@contextmanager
+def open_parts(source, file_type, member_file_type=None):
+    """
+    Opens a possibly compressed source as the list of data parts to parse.
+
+    Uncompressed sources (and .xlsx workbooks, which are zip files) are
+    returned unchanged as a single part.  gzip/bz2/zstd sources become one
+    decompressing stream.  A zip archive becomes one part per data file, in
+    name order, with compressed members decompressed too.  Each part's file
+    type comes from its name if recognizable, else `file_type`.
+
+    Args:
+        source (bytes | str | file-like): File content, path or binary file object.
+        file_type (str): The declared file type of the (decompressed) data.
+        member_file_type (callable, optional): Maps a zip member name to a file
+            type, or returns None to use `file_type`.
+
+    Yields:
+        list: `(part_source, part_file_type)` pairs, valid until the block exits.
+
+    Raises:
+        ValueError: If a zip archive contains no data files, or zstd support is missing.
+    """
+    compression = detect_compression(source)
+    if compression is None:
+        yield [(source, file_type)]
+        return
+
+    with ExitStack() as stack:
+        raw = _open_binary(source, stack)
+        if compression != 'zip':
+            yield [(stack.enter_context(_decompressing_stream(raw, compression)), file_type)]
+            return
+
+        position = raw.tell()
+        archive = stack.enter_context(zipfile.ZipFile(raw))
+        if _is_xlsx(archive):
+            # An Excel workbook, not an archive of data files
+            raw.seek(position)
+            yield [(source, 'excel')]
+            return
+        names = sorted(name for name in archive.namelist()
+                       if not name.endswith('/') and not name.startswith('__MACOSX/'))
+        if not names:
+            raise ValueError("The zip archive contains no data files.")
+        parts = []
+        for name in names:
+            part_type = (member_file_type(name) if member_file_type else None) or file_type
+            member = stack.enter_context(archive.open(name))
+            member_compression = detect_compression(member)
+            if member_compression not in (None, 'zip'):  # e.g. part-1.csv.gz inside the archive
+                member = stack.enter_context(_decompressing_stream(member, member_compression))
+            parts.append((member, part_type))
+        yield parts
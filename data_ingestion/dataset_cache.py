@@ -0,0 +1,149 @@
+# data_ingestion/dataset_cache.py
+import hashlib
+import json
+import logging
+import os
+import threading
+import pyarrow as pa
+from data_ingestion.schema import arrow_types_mapper
+
+
+class DatasetCache:
+    """
+    Content-addressed cache of parsed DataFrames.
+
+    Entries are keyed by a SHA-256 of the raw file bytes plus the ingest
+    options (file type, schema, encoding), so re-uploading the same file
+    skips parsing entirely, while a changed schema or file never hits a stale
+    entry.  Frames are stored as uncompressed Arrow IPC files, which are
+    memory-mapped on load instead of being parsed.  Reading the Arrow table
+    is then near-instant; building NumPy-backed columns from it still copies
+    (and converts strings to Python objects), which only Arrow-backed frames
+    (`dtype_backend='pyarrow'`) avoid.  The least recently used entries are
+    evicted once the cache exceeds `max_bytes` or `max_entries`.
+    """
+
+    SUFFIX = '.arrow'
+
+    def __init__(self, cache_dir, max_bytes=2 * 1024 ** 3, max_entries=32):
+        """
+        Args:
+            cache_dir (str): Directory holding the cached frames.
+            max_bytes (int): Maximum total size of the cache on disk.
+            max_entries (int): Maximum number of cached datasets.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(content, **options):
+        """
+        Returns the cache key for raw file content and the options it is parsed with.
+
+        Args:
+            content (bytes | str): The file bytes, or a path to the file (hashed in blocks).
+            **options: Anything that changes the parse result (file type, schema, ...).
+        """
+        digest = hashlib.sha256()
+        if isinstance(content, (bytes, bytearray, memoryview)):
+            digest.update(content)
+        else:
+            with open(content, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(block)
+        return DatasetCache.key_from_digest(digest.hexdigest(), **options)
+
+    @staticmethod
+    def key_from_digest(sha256, **options):
+        """Like `key`, for content whose SHA-256 hex digest is already known."""
+        payload = json.dumps([sha256, options], sort_keys=True, default=repr)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}{self.SUFFIX}")
+
+    def get(self, key, dtype_backend='numpy'):
+        """
+        Loads a cached DataFrame by memory-mapping its Arrow file.
+
+        Args:
+            key (str): The cache key.
+            dtype_backend (str): 'numpy' for NumPy/object-backed columns (a
+                copy of the data), or 'pyarrow' for Arrow-backed columns that
+                reference the memory-mapped buffers without copying.
+
+        Returns:
+            pd.DataFrame: The cached frame.
+            None: On a cache miss.
+        """
+        path = self._path(key)
+        try:
+            with pa.memory_map(path, 'r') as source:
+                table = pa.ipc.open_file(source).read_all()
+            os.utime(path)  # Mark as recently used
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, pa.ArrowInvalid) as e:
+            logging.warning(f"Discarding unreadable cached dataset {path}: {e}")
+            self._remove(path)
+            self.misses += 1
+            return None
+        self.hits += 1
+        if dtype_backend == 'pyarrow':
+            return table.to_pandas(types_mapper=arrow_types_mapper)
+        return table.to_pandas()
+
+    def put(self, key, df):
+        """
+        Stores a parsed DataFrame, then evicts old entries if over budget.
+
+        Returns:
+            bool: True if the frame was cached.
+        """
+        path = self._path(key)
+        tmp_path = f"{path}.tmp"
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            with pa.OSFile(tmp_path, 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(tmp_path, path)
+        except (OSError, pa.ArrowException) as e:
+            # e.g. mixed-type object columns that Arrow can't represent
+            logging.warning(f"Could not cache parsed dataset: {e}")
+            self._remove(tmp_path)
+            return False
+        self.evict()
+        return True
+
+    def evict(self):
+        """Removes the least recently used entries until the cache is within its limits."""
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(self.SUFFIX):
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                    entries.append((stat.st_mtime, stat.st_size, name))
+            entries.sort()
+            total = sum(size for _, size, _ in entries)
+            while entries and (total > self.max_bytes or len(entries) > self.max_entries):
+                _, size, name = entries.pop(0)
+                self._remove(os.path.join(self.cache_dir, name))
+                total -= size
+                logging.info(f"Evicted cached dataset {name}")
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def __len__(self):
+        return sum(1 for name in os.listdir(self.cache_dir) if name.endswith(self.SUFFIX))
@@ -0,0 +1,146 @@
+# data_ingestion/excel_stream.py
+"""
+Row-streaming reader for .xlsx worksheets.
+
+openpyxl (which `pd.read_excel` uses) builds a cell object, a style lookup and
+rich-text parse for every cell of every column before pandas sees a value.
+This reader opens the workbook read-only only to get the shared strings and
+date styles.  It then walks the sheet XML itself, converting only the cells
+of the wanted columns and clearing each parsed row straight away.  Rows are
+emitted as DataFrame chunks, so memory stays bounded by the chunk size.
+"""
+import io
+from itertools import count
+from xml.etree.ElementTree import iterparse
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.utils.cell import column_index_from_string
+from openpyxl.utils.datetime import from_excel, from_ISO8601
+
+_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_SHEET_DATA, _ROW, _VALUE, _TEXT = f'{_NS}sheetData', f'{_NS}row', f'{_NS}v', f'{_NS}t'
+_DIGITS = '0123456789'
+
+
+def _to_number(text):
+    """Parses a numeric cell, returning integral values as int (as pandas' Excel reader does)."""
+    try:
+        return int(text)
+    except ValueError:
+        value = float(text)
+        return int(value) if value.is_integer() else value
+
+
+class _CellConverter:
+    """Converts raw `<c>` elements into Python values using the workbook's metadata."""
+
+    def __init__(self, workbook):
+        self.shared_strings = workbook.shared_strings
+        # openpyxl keeps the style ids with date/duration number formats on the
+        # read-only workbook; openpyxl is pinned in requirements.txt
+        self.date_styles = workbook._date_formats
+        self.timedelta_styles = workbook._timedelta_formats
+        self.epoch = workbook.epoch
+
+    def value(self, cell):
+        data_type = cell.get('t', 'n')
+        if data_type == 'inlineStr':
+            return ''.join(text.text or '' for text in cell.iter(_TEXT)) or None
+        value = cell.findtext(_VALUE)
+        if value is None:
+            return None
+        if data_type == 'n':
+            value = _to_number(value)
+            style = cell.get('s')
+            if style and int(style) in self.date_styles:
+                try:
+                    return from_excel(value, self.epoch, timedelta=int(style) in self.timedelta_styles)
+                except (OverflowError, ValueError):
+                    return None
+            return value
+        if data_type == 's':
+            return self.shared_strings[int(value)]
+        if data_type == 'b':
+            return value == '1'
+        if data_type == 'd':
+            return from_ISO8601(value)
+        return value  # 'str' (formula result) and 'e' (error such as '#N/A')
+
+
+def iter_excel_chunks(source, chunksize=100_000, schema=None, sheet_name=0):
+    """
+    Streams a worksheet as DataFrames of at most `chunksize` rows.
+
+    The first row is the header.  Columns the schema does not want are never
+    converted, and the schema's dtypes, row filter and dates are applied to
+    every chunk.
+
+    Args:
+        source (bytes | str | file-like): Workbook content, path or binary file object.
+        chunksize (int): Number of rows per chunk.
+        schema (IngestSchema, optional): Columns/dtypes to apply while parsing.
+        sheet_name (int | str): Worksheet index or name.
+
+    Yields:
+        pd.DataFrame: The chunks.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    workbook = load_workbook(source, read_only=True, data_only=True, keep_links=False)
+    try:
+        sheet = workbook.worksheets[sheet_name] if isinstance(sheet_name, int) else workbook[sheet_name]
+        converter = _CellConverter(workbook)
+        column_by_letters = {}
+        header, keep, columns = None, None, None
+        rows, emitted = [], False
+        with sheet._get_source() as xml:
+            sheet_data = None
+            for event, element in iterparse(xml, events=('start', 'end')):
+                if event == 'start':
+                    if element.tag == _SHEET_DATA:
+                        sheet_data = element
+                    continue
+                if element.tag != _ROW:
+                    continue
+                values = {}
+                positions = count()
+                for cell in element:
+                    reference = cell.get('r')
+                    if reference:
+                        letters = reference.rstrip(_DIGITS)
+                        column = column_by_letters.get(letters)
+                        if column is None:
+                            column = column_by_letters[letters] = column_index_from_string(letters) - 1
+                    else:
+                        column = next(positions)  # Writers may omit references on dense rows
+                    if keep is None or column in keep:
+                        values[column] = converter.value(cell)
+                element.clear()
+
+                if header is None:
+                    width = max(values, default=-1) + 1
+                    header = [f"Unnamed: {i}" if values.get(i) is None else values[i] for i in range(width)]
+                    keep = [i for i, name in enumerate(header) if schema is None or schema.wants(name)]
+                    columns = [header[i] for i in keep]
+                    keep = set(keep)
+                    order = sorted(keep)
+                    continue
+                rows.append([values.get(i) for i in order])
+                if len(rows) >= chunksize:
+                    yield _to_frame(rows, columns, schema)
+                    rows, emitted = [], True
+                    if sheet_data is not None:
+                        sheet_data.clear()  # Drop the cleared row elements parsed so far
+        if columns is not None and (rows or not emitted):
+            yield _to_frame(rows, columns, schema)  # Remaining rows (or the header of an empty sheet)
+    finally:
+        workbook.close()
+
+
+def _to_frame(rows, columns, schema):
+    df = pd.DataFrame.from_records(rows, columns=columns)
+    # Empty cells are None in object columns; pandas' readers use NaN
+    object_columns = df.columns[df.dtypes == object]
+    if len(object_columns):
+        df[object_columns] = df[object_columns].where(df[object_columns].notna(), float('nan'))
+    return schema.apply(df) if schema else df
@@ -1,13 +1,24 @@
 # data_ingestion/file_upload_ingestor.py
-import pandas as pd
 import logging
-import io
+from data_ingestion.readers import check_file_type, read_frame, iter_frames
 
 class FileUploadIngestor:
     """Handles data ingestion from a direct file upload (e.g., from a web form)."""
 
-    def __init__(self):
-        pass
+    def __init__(self, schema=None, cache=None, sheet_name=0, excel_engine='streaming'):
+        """
+        Args:
+            schema (IngestSchema, optional): Column subset and dtypes applied
+                while parsing.  None loads every column with inferred dtypes.
+            cache (DatasetCache, optional): Parsed-dataset cache; re-uploads of
+                the same file with the same schema skip parsing.
+            sheet_name (int | str): Worksheet to read from Excel uploads.
+            excel_engine (str): Excel reader ('streaming', 'openpyxl' or 'calamine').
+        """
+        self.schema = schema
+        self.cache = cache
+        self.sheet_name = sheet_name
+        self.excel_engine = excel_engine
 
     def ingest_data(self, file_content, file_type='csv'):
         """
@@ -15,7 +26,8 @@ class FileUploadIngestor:
 
         Args:
             file_content (bytes): The file content as bytes.
-            file_type (str): 'csv' or 'excel'.
+            file_type (str): 'csv', 'excel', 'parquet', 'feather' or 'arrow'.  gzip, bz2,
+                zstd and zip input of any of them is detected and decompressed.
 
         Returns:
             pandas.DataFrame: The loaded DataFrame.
@@ -24,16 +36,47 @@ class FileUploadIngestor:
         Raises:
             ValueError: For unsupported file types.
         """
+        file_type = check_file_type(file_type)
         try:
-            if file_type.lower() == 'csv':
-                # Use io.StringIO to treat the bytes as a file
-                df = pd.read_csv(io.StringIO(file_content.decode('ISO-8859-1')))
-                return df
-            elif file_type.lower() == 'excel':
-                df = pd.read_excel(io.BytesIO(file_content))
-                return df
-            else:
-                raise ValueError("Unsupported file type.  Only 'csv' and 'excel' are supported.")
+            cache_key = None
+            if self.cache is not None:
+                cache_key = self.cache.key(file_content, file_type=file_type, schema=repr(self.schema),
+                                           encoding='ISO-8859-1', sheet_name=self.sheet_name,
+                                           excel_engine=self.excel_engine)
+                df = self.cache.get(cache_key, self.schema.dtype_backend if self.schema else 'numpy')
+                if df is not None:
+                    logging.info("Loaded parsed upload from the dataset cache.")
+                    return df
+            # CSV is parsed straight from the bytes; decoding happens inside the
+            # parser so we never hold a decoded copy of the whole upload.
+            df = read_frame(file_content, file_type, self.schema, encoding='ISO-8859-1',
+                            sheet_name=self.sheet_name, excel_engine=self.excel_engine)
+            if cache_key is not None:
+                self.cache.put(cache_key, df)
+            return df
         except Exception as e:
             logging.error(f"Error ingesting file: {e}")
-            return None
\ No newline at end of file
+            return None
+
+    def ingest_chunks(self, source, file_type='csv', chunksize=100_000):
+        """
+        Streams data from an upload as fixed-size DataFrame chunks.
+
+        Unlike `ingest_data`, the full dataset is never materialized: only one
+        chunk of `chunksize` rows is resident at a time.
+
+        Args:
+            source (bytes | str | os.PathLike): The file content as bytes, or a
+                path to the file on disk (preferred for large uploads).
+            file_type (str): 'csv' or 'excel'.  Excel is streamed row by row
+                from a read-only workbook.
+            chunksize (int): Number of rows per chunk.
+
+        Returns:
+            Iterator[pandas.DataFrame]: Iterator over the chunks.
+
+        Raises:
+            ValueError: For unsupported file types or a non-positive chunk size.
+        """
+        return iter_frames(source, file_type, chunksize, self.schema, encoding='ISO-8859-1',
+                           sheet_name=self.sheet_name)
@@ -0,0 +1,138 @@
+# data_ingestion/http_cache.py
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import pandas as pd
+
+
+class HTTPResponseCache:
+    """
+    On-disk cache of parsed API responses, revalidated with HTTP validators.
+
+    Entries are keyed by URL plus query parameters.  Each holds the response's
+    `ETag` / `Last-Modified` validators and the parsed DataFrame, stored as
+    Parquet so that a `304 Not Modified` costs a columnar read instead of a
+    download and a JSON parse.  When the cache exceeds `max_bytes` or
+    `max_entries`, the least recently used entries are evicted.
+    """
+
+    INDEX_FILE = 'index.json'
+
+    def __init__(self, cache_dir, max_bytes=512 * 1024 * 1024, max_entries=256):
+        """
+        Args:
+            cache_dir (str): Directory holding the cached frames and the index.
+            max_bytes (int): Maximum total size of the cached frames.
+            max_entries (int): Maximum number of cached responses.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._index_path = os.path.join(cache_dir, self.INDEX_FILE)
+        self._index = {}
+        if os.path.exists(self._index_path):
+            try:
+                with open(self._index_path, 'r') as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable HTTP cache index {self._index_path}: {e}")
+
+    @staticmethod
+    def key(url, params=None):
+        """Returns the cache key for a URL and its query parameters."""
+        payload = json.dumps([url, sorted((params or {}).items())], default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _frame_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.parquet")
+
+    def conditional_headers(self, key):
+        """
+        Returns the `If-None-Match` / `If-Modified-Since` headers for a cached
+        entry, or an empty dict if the entry is missing.
+        """
+        with self._lock:
+            entry = self._index.get(key)
+        if entry is None or not os.path.exists(self._frame_path(key)):
+            return {}
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def load(self, key):
+        """
+        Returns the cached DataFrame for `key` and marks it recently used.
+
+        Returns:
+            pd.DataFrame: The cached frame.
+            None: If the entry is missing or unreadable.
+        """
+        try:
+            df = pd.read_parquet(self._frame_path(key))
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not read cached response {key}: {e}")
+            self.misses += 1
+            return None
+        with self._lock:
+            if key in self._index:
+                self._index[key]['last_access'] = time.time()
+                self._save_index_locked()
+            self.hits += 1
+        return df
+
+    def store(self, key, url, df, etag=None, last_modified=None):
+        """
+        Caches a parsed response.  Responses without validators are not cached,
+        since they could never be revalidated.
+
+        Returns:
+            bool: True if the response was cached.
+        """
+        self.misses += 1
+        if not etag and not last_modified:
+            return False
+        path = self._frame_path(key)
+        try:
+            df.to_parquet(f"{path}.tmp", index=False)
+            os.replace(f"{path}.tmp", path)
+        except (OSError, ValueError, TypeError, ImportError) as e:
+            # e.g. mixed-type object columns that Parquet can't represent
+            logging.warning(f"Could not cache response from {url}: {e}")
+            return False
+        with self._lock:
+            self._index[key] = {'url': url, 'etag': etag, 'last_modified': last_modified,
+                                'size': os.path.getsize(path), 'last_access': time.time()}
+            self._evict_locked()
+            self._save_index_locked()
+        return True
+
+    def _evict_locked(self):
+        by_age = sorted(self._index, key=lambda k: self._index[k]['last_access'])
+        total = sum(entry['size'] for entry in self._index.values())
+        while by_age and (total > self.max_bytes or len(self._index) > self.max_entries):
+            key = by_age.pop(0)
+            total -= self._index.pop(key)['size']
+            try:
+                os.remove(self._frame_path(key))
+            except OSError:
+                pass
+            logging.info(f"Evicted cached API response {key}")
+
+    def _save_index_locked(self):
+        tmp_path = f"{self._index_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self._index_path)
+
+    def __len__(self):
+        return len(self._index)
@@ -0,0 +1,144 @@
+# data_ingestion/json_stream.py
+"""
+Incremental JSON parsing for large API responses.  Records are decoded one
+at a time from the byte stream, so neither the raw body nor the full Python
+object tree is ever held in memory.
+"""
+import codecs
+import json
+from itertools import islice
+import pandas as pd
+
+_WHITESPACE = ' \t\r\n'
+
+
+def _iter_text(byte_chunks, encoding='utf-8'):
+    """Decodes byte chunks to text, keeping multi-byte characters split across chunks intact."""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    for chunk in byte_chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def iter_ndjson(text_chunks):
+    """
+    Yields one decoded value per non-empty line of newline-delimited JSON.
+
+    Raises:
+        json.JSONDecodeError: If a line is not valid JSON.
+    """
+    pending = ''
+    for text in text_chunks:
+        lines = (pending + text).split('\n')
+        pending = lines.pop()  # Last piece may be an incomplete line
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+    if pending.strip():
+        yield json.loads(pending)
+
+
+def iter_json_array(text_chunks):
+    """
+    Yields the elements of a top-level JSON array as they are completed.
+
+    Raises:
+        json.JSONDecodeError: If the body is not a well-formed JSON array.
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos, started, finished = '', 0, False, False
+    text_chunks = iter(text_chunks)
+    exhausted = False
+    while not finished:
+        if not exhausted:
+            try:
+                buffer = buffer[pos:] + next(text_chunks)
+                pos = 0
+            except StopIteration:
+                exhausted = True
+        while True:
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            if pos == len(buffer):
+                break
+            if not started:
+                if buffer[pos] != '[':
+                    raise json.JSONDecodeError("Expected a top-level JSON array", buffer, pos)
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == ']':
+                finished = True
+                break
+            if buffer[pos] == ',':
+                pos += 1
+                continue
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if exhausted:
+                    raise
+                break  # Element not complete yet: read more
+            if end == len(buffer) and not exhausted:
+                break  # A scalar at the buffer edge (e.g. 12|3) may still be growing
+            yield value
+            pos = end
+        if exhausted and not finished:
+            raise json.JSONDecodeError("Unterminated JSON array", buffer, pos)
+
+
+def _chain_first(first, rest):
+    if first:
+        yield first
+    yield from rest
+
+
+def iter_json_records(byte_chunks, json_format='auto', encoding='utf-8'):
+    """
+    Streams records from a JSON array or NDJSON body.
+
+    Args:
+        byte_chunks (Iterable[bytes]): The raw response body, in chunks.
+        json_format (str): 'array', 'ndjson', or 'auto' to decide from the
+            first non-whitespace character.
+        encoding (str): Text encoding of the body.
+
+    Yields:
+        The decoded records.
+    """
+    text_chunks = _iter_text(byte_chunks, encoding)
+    if json_format == 'auto':
+        first = ''
+        for text in text_chunks:
+            first += text
+            if first.strip():
+                break
+        json_format = 'array' if first.lstrip().startswith('[') else 'ndjson'
+        text_chunks = _chain_first(first, text_chunks)
+    parse = iter_json_array if json_format == 'array' else iter_ndjson
+    return parse(text_chunks)
+
+
+def iter_record_frames(records, chunk_rows=50_000, schema=None):
+    """
+    Groups a record iterator into DataFrames of at most `chunk_rows` rows.
+
+    Args:
+        records (Iterable[dict]): The records.
+        chunk_rows (int): Maximum rows per DataFrame.
+        schema (IngestSchema, optional): Applied to every chunk.
+
+    Yields:
+        pd.DataFrame: The chunks.
+    """
+    records = iter(records)
+    while True:
+        batch = list(islice(records, chunk_rows))
+        if not batch:
+            return
+        df = pd.DataFrame(batch)
+        yield schema.apply(df) if schema else df
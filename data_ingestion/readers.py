@@ -0,0 +1,228 @@
+# data_ingestion/readers.py
+"""
+File-format dispatch shared by all file-based ingestors, so that every
+ingestor applies the same ingest schema while parsing.
+"""
+import io
+import logging
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from data_ingestion.excel_stream import iter_excel_chunks
+from data_ingestion.compression import open_parts, COMPRESSION_EXTENSIONS
+
+SUPPORTED_FILE_TYPES = ('csv', 'excel', 'parquet', 'feather', 'arrow')
+ARROW_FILE_TYPES = ('parquet', 'feather', 'arrow')
+CHUNKED_FILE_TYPES = ('csv', 'excel')
+# 'streaming': row-streaming reader in excel_stream.py, 'openpyxl': pandas' default
+# reader, 'calamine': pandas' Rust-based reader (needs the optional python-calamine package)
+EXCEL_ENGINES = ('streaming', 'openpyxl', 'calamine')
+
+# Maps upload file extensions to the file type understood by the readers
+FILE_TYPE_BY_EXTENSION = {
+    'csv': 'csv',
+    'xls': 'excel',
+    'xlsx': 'excel',
+    'excel': 'excel',
+    'parquet': 'parquet',
+    'pq': 'parquet',
+    'feather': 'feather',
+    'arrow': 'arrow',
+    'ipc': 'arrow',
+    'arrows': 'arrow',
+}
+
+
+def check_file_type(file_type):
+    """
+    Validates and normalizes a file type.
+
+    Raises:
+        ValueError: If the file type is not supported.
+    """
+    file_type = file_type.lower()
+    if file_type not in SUPPORTED_FILE_TYPES:
+        raise ValueError("Unsupported file type.  Only 'csv', 'excel', 'parquet', 'feather' and 'arrow' are supported.")
+    return file_type
+
+
+def file_type_from_path(path):
+    """
+    Infers the file type from a file name's extension (e.g. 'data.xlsx' -> 'excel').
+
+    Compression extensions are skipped ('recon.csv.gz' -> 'csv').  A compressed
+    file or archive without a recognizable inner extension ('drop.zip') is
+    assumed to hold CSV; zip members are typed by their own names when parsed.
+    """
+    parts = os.path.basename(str(path)).lower().split('.')
+    compressed = False
+    while len(parts) > 1 and parts[-1] in COMPRESSION_EXTENSIONS + ('zip',):
+        parts.pop()
+        compressed = True
+    extension = parts[-1] if len(parts) > 1 else ''
+    if extension in FILE_TYPE_BY_EXTENSION:
+        return FILE_TYPE_BY_EXTENSION[extension]
+    return 'csv' if compressed else extension
+
+
+def _member_file_type(name):
+    """File type of a zip member from its name, or None if the name doesn't tell."""
+    parts = os.path.basename(name).lower().split('.')
+    while len(parts) > 1 and parts[-1] in COMPRESSION_EXTENSIONS:
+        parts.pop()
+    return FILE_TYPE_BY_EXTENSION.get(parts[-1]) if len(parts) > 1 else None
+
+
+def _as_source(source):
+    """Wraps raw bytes in a binary buffer; paths and file objects pass through."""
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    return source
+
+
+def _read_arrow(source, file_type, schema=None):
+    """
+    Reads a Parquet / Feather / Arrow IPC file, pushing the schema's column
+    projection and row filter down into the Arrow reader.  For Parquet the
+    filter is checked against row-group statistics, so non-matching row
+    groups are never decoded; either way the filtered-out rows are never
+    converted to pandas.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = pa.BufferReader(source)  # Zero-copy view over the upload
+    file_format = ds.ParquetFileFormat() if file_type == 'parquet' else ds.IpcFileFormat()
+    try:
+        scannable = file_format.make_fragment(source)
+        names = scannable.physical_schema.names
+    except pa.ArrowInvalid:
+        if file_type != 'arrow':
+            raise
+        # Arrow IPC *stream* format (no footer): read the record batches, then
+        # project/filter the in-memory table like any other dataset
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        scannable = ds.dataset(pa.ipc.open_stream(source).read_all())
+        names = scannable.schema.names
+
+    columns = [name for name in names if schema is None or schema.wants(name)]
+    expression = schema.arrow_filter(names) if schema else None
+    table = scannable.to_table(columns=columns, filter=expression)
+    return schema.to_pandas(table) if schema else table.to_pandas()
+
+
+def _read_excel(source, schema=None, sheet_name=0, excel_engine='streaming'):
+    """Reads a whole worksheet with the selected Excel engine."""
+    if excel_engine not in EXCEL_ENGINES:
+        raise ValueError(f"Unsupported Excel engine '{excel_engine}'.  Use one of {', '.join(EXCEL_ENGINES)}.")
+    if excel_engine != 'streaming':
+        kwargs = schema.read_kwargs() if schema else {}
+        try:
+            df = pd.read_excel(_as_source(source), sheet_name=sheet_name, engine=excel_engine, **kwargs)
+            return schema.parse_dates(schema.filter_rows(df)) if schema else df
+        except ImportError as e:
+            logging.warning(f"Excel engine '{excel_engine}' is not available ({e}); using the streaming reader.")
+    frames = list(iter_excel_chunks(source, 100_000, schema, sheet_name))
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+
+def _read_part(source, file_type, schema=None, encoding=None, sheet_name=0, excel_engine='streaming'):
+    """Parses one (already decompressed) source into a DataFrame."""
+    if file_type in ARROW_FILE_TYPES:
+        df = _read_arrow(source, file_type, schema)
+        return schema.apply(df) if schema else df
+    if file_type == 'excel':
+        return _read_excel(source, schema, sheet_name, excel_engine)
+
+    kwargs = schema.read_kwargs() if schema else {}
+    df = pd.read_csv(_as_source(source), encoding=encoding, **kwargs)
+    return schema.parse_dates(schema.filter_rows(df)) if schema else df
+
+
+def _random_access(part, source, file_type):
+    """
+    Excel and Arrow readers seek around the file, which a decompressing stream
+    can only emulate by re-reading it, so decompressed parts of those types are
+    read into memory first.  CSV is always streamed.
+    """
+    if part is source or file_type == 'csv':
+        return part
+    return part.read()
+
+
+def read_frame(source, file_type='csv', schema=None, encoding=None, sheet_name=0, excel_engine='streaming'):
+    """
+    Parses a whole file into a single DataFrame.
+
+    gzip, bz2, zstd and zip input is detected from its magic bytes and
+    decompressed while parsing; the data files of a zip archive are parsed
+    in name order and concatenated.
+
+    Args:
+        source (bytes | str | file-like): File content, path or binary file object.
+        file_type (str): 'csv', 'excel', 'parquet', 'feather' or 'arrow'.
+        schema (IngestSchema, optional): Columns/dtypes to apply while parsing.
+        encoding (str, optional): Text encoding for CSV input.
+        sheet_name (int | str): Worksheet to read from Excel input (index or name).
+        excel_engine (str): Excel reader, one of `EXCEL_ENGINES`.
+
+    Returns:
+        pd.DataFrame: The parsed data.
+    """
+    file_type = check_file_type(file_type)
+    with open_parts(source, file_type, _member_file_type) as parts:
+        frames = [_read_part(_random_access(part, source, part_type), part_type, schema, encoding,
+                             sheet_name, excel_engine)
+                  for part, part_type in parts]
+    return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+
+def iter_frames(source, file_type='csv', chunksize=100_000, schema=None, encoding=None, sheet_name=0):
+    """
+    Parses a file as an iterator of DataFrames with at most `chunksize` rows.
+
+    Compressed input is decompressed on the fly as the chunks are consumed
+    (see `read_frame`); no uncompressed copy is written.
+
+    Args:
+        source (bytes | str | file-like): File content, path or binary file object.
+        file_type (str): 'csv' or 'excel'.
+        chunksize (int): Number of rows per chunk.
+        schema (IngestSchema, optional): Columns/dtypes to apply while parsing.
+        encoding (str, optional): Text encoding for CSV input.
+        sheet_name (int | str): Worksheet to read from Excel input (index or name).
+
+    Returns:
+        Iterator[pd.DataFrame]: The chunks.
+
+    Raises:
+        ValueError: For unsupported file types or a non-positive chunk size.
+    """
+    file_type = file_type.lower()
+    if file_type not in CHUNKED_FILE_TYPES:
+        raise ValueError("Unsupported file type for chunked ingestion.  Only 'csv' and 'excel' are supported.")
+    if chunksize <= 0:
+        raise ValueError("chunksize must be a positive integer.")
+    return _iter_parts(source, file_type, chunksize, schema, encoding, sheet_name)
+
+
+def _iter_parts(source, file_type, chunksize, schema, encoding, sheet_name):
+    with open_parts(source, file_type, _member_file_type) as parts:
+        for part, part_type in parts:
+            part = _random_access(part, source, part_type)
+            if part_type == 'csv':
+                yield from _iter_csv(part, chunksize, schema, encoding)
+            elif part_type == 'excel':
+                yield from iter_excel_chunks(part, chunksize, schema, sheet_name)
+            else:
+                yield _read_part(part, part_type, schema)  # Columnar zip members: one chunk each
+
+
+def _iter_csv(source, chunksize, schema, encoding):
+    kwargs = schema.read_kwargs() if schema else {}
+    reader = pd.read_csv(_as_source(source), encoding=encoding, chunksize=chunksize, **kwargs)
+    if schema is None or (not schema.date_formats and schema.row_filter is None):
+        return reader
+    return (schema.parse_dates(schema.filter_rows(chunk)) for chunk in reader)
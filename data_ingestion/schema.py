@@ -0,0 +1,185 @@
+# data_ingestion/schema.py
+import logging
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+# 'numpy': NumPy/object-backed pandas columns (pandas' default).  'pyarrow': Arrow-backed
+# columns (pd.ArrowDtype), e.g. Arrow strings instead of Python string objects.
+DTYPE_BACKENDS = ('numpy', 'pyarrow')
+
+
+def arrow_types_mapper(arrow_type):
+    """`to_pandas` types mapper that keeps dictionary columns as pandas categoricals."""
+    return None if pa.types.is_dictionary(arrow_type) else pd.ArrowDtype(arrow_type)
+
+
+def is_arrow_backed(dtype):
+    """True for Arrow-backed pandas dtypes (ArrowDtype, and 'string[pyarrow]' StringDtype)."""
+    return isinstance(dtype, pd.ArrowDtype) or (isinstance(dtype, pd.StringDtype) and dtype.storage == 'pyarrow')
+
+
+def _to_arrow_dtype(dtype):
+    """Maps a schema dtype ('string', 'float64', ...) to its Arrow-backed equivalent."""
+    if dtype == 'category' or isinstance(dtype, (pd.CategoricalDtype, pd.ArrowDtype)):
+        return dtype
+    if dtype in ('string', 'str', str):
+        return pd.ArrowDtype(pa.string())
+    try:
+        return pd.ArrowDtype(pa.from_numpy_dtype(np.dtype(dtype)))
+    except (TypeError, pa.ArrowNotImplementedError):
+        return dtype
+
+
+def to_arrow_backed(df):
+    """
+    Converts the NumPy/object-backed columns of `df` to Arrow-backed dtypes.
+    Categorical and already Arrow-backed columns are left as they are.
+    """
+    columns = [col for col, dtype in df.dtypes.items()
+               if not (is_arrow_backed(dtype) or isinstance(dtype, pd.CategoricalDtype))]
+    if not columns:
+        return df
+    converted = pa.Table.from_pandas(df[columns], preserve_index=False).to_pandas(types_mapper=arrow_types_mapper)
+    converted.index = df.index
+    return df.assign(**{col: converted[col] for col in columns})
+
+
+def to_numpy_backed(df):
+    """
+    Converts Arrow-backed columns back to the NumPy/object dtypes pandas'
+    default readers produce (e.g. for display, or to compare engines).
+    Integer columns with missing values become float64, and missing strings NaN.
+    """
+    columns = [col for col, dtype in df.dtypes.items() if is_arrow_backed(dtype)]
+    if not columns:
+        return df
+    converted = pa.Table.from_pandas(df[columns], preserve_index=False).to_pandas(ignore_metadata=True)
+    converted.index = df.index
+    object_columns = converted.columns[converted.dtypes == object]
+    if len(object_columns):
+        converted[object_columns] = converted[object_columns].where(converted[object_columns].notna(), np.nan)
+    return df.assign(**{col: converted[col] for col in columns})
+
+
+class IngestSchema:
+    """
+    Declarative description of what to read from an input file.
+
+    Ingestors hand the schema to the parser so that unused columns are
+    skipped and declared dtypes are applied while parsing, instead of
+    loading every column as inferred `object` data and trimming afterwards.
+    Columns named in the schema but missing from a file are ignored.
+    """
+
+    def __init__(self, columns=None, dtypes=None, categorical_columns=None, date_formats=None, row_filter=None,
+                 dtype_backend='numpy'):
+        """
+        Args:
+            columns (list, optional): Columns to keep.  None keeps every column.
+            dtypes (dict, optional): Mapping of column name to pandas dtype.
+            categorical_columns (list, optional): Columns to load as `category`.
+            date_formats (dict, optional): Mapping of column name to a strptime
+                format (or None to let pandas infer it).
+            row_filter (tuple, optional): `(column, substring)` pair; only rows
+                whose column contains the substring are kept.  Columnar readers
+                evaluate it inside the reader.
+            dtype_backend (str): 'numpy', or 'pyarrow' to load Arrow-backed
+                columns (declared dtypes are mapped to their Arrow equivalents).
+        """
+        if dtype_backend not in DTYPE_BACKENDS:
+            raise ValueError(f"Unsupported dtype backend '{dtype_backend}'.  Use one of {', '.join(DTYPE_BACKENDS)}.")
+        self.columns = list(columns) if columns else None
+        self.dtypes = dict(dtypes or {})
+        self.categorical_columns = list(categorical_columns or [])
+        self.date_formats = dict(date_formats or {})
+        self.row_filter = tuple(row_filter) if row_filter else None
+        self.dtype_backend = dtype_backend
+
+    def wants(self, column):
+        """True if `column` should be loaded."""
+        return self.columns is None or column in self.columns
+
+    def column_dtypes(self):
+        """Returns the dtype mapping, with categorical columns folded in."""
+        dtypes = dict(self.dtypes)
+        if self.dtype_backend == 'pyarrow':
+            dtypes = {col: _to_arrow_dtype(dtype) for col, dtype in dtypes.items()}
+        dtypes.update({col: 'category' for col in self.categorical_columns})
+        return dtypes
+
+    def read_kwargs(self):
+        """
+        Keyword arguments for `pd.read_csv` / `pd.read_excel` that push the
+        column projection and dtypes down into the parser.
+        """
+        kwargs = {}
+        if self.columns is not None:
+            # A callable tolerates schema columns that a given file doesn't have
+            kwargs['usecols'] = self.wants
+        dtypes = self.column_dtypes()
+        if dtypes:
+            kwargs['dtype'] = dtypes
+        if self.dtype_backend == 'pyarrow':
+            kwargs['dtype_backend'] = 'pyarrow'
+        return kwargs
+
+    def to_pandas(self, table):
+        """Converts an Arrow table to pandas in the schema's dtype backend."""
+        return table.to_pandas(types_mapper=arrow_types_mapper if self.dtype_backend == 'pyarrow' else None)
+
+    def arrow_filter(self, available_columns):
+        """
+        Returns the row filter as an Arrow dataset expression, or None if no
+        filter is set or its column is not in `available_columns`.  The column
+        is cast to string first, since substring matching has no kernel for
+        dictionary-encoded columns (e.g. files written from pandas categoricals).
+        """
+        if self.row_filter is None or self.row_filter[0] not in available_columns:
+            return None
+        column, value = self.row_filter
+        return pc.match_substring(ds.field(column).cast(pa.string()), value)
+
+    def filter_rows(self, df):
+        """Applies the row filter to a parsed DataFrame (for readers without pushdown)."""
+        if self.row_filter is None or self.row_filter[0] not in df.columns:
+            return df
+        column, value = self.row_filter
+        mask = df[column].astype('string').str.contains(value, regex=False).fillna(False).to_numpy(dtype=bool)
+        return df[mask]
+
+    def parse_dates(self, df):
+        """Converts the declared date columns present in `df`."""
+        parsed = {col: pd.to_datetime(df[col], format=date_format, errors='coerce')
+                  for col, date_format in self.date_formats.items() if col in df.columns}
+        return df.assign(**parsed) if parsed else df
+
+    def apply(self, df):
+        """
+        Applies the schema to an already-parsed DataFrame.  Used for sources
+        whose parser cannot project columns itself (e.g. JSON API responses).
+
+        Args:
+            df (pd.DataFrame): The parsed data.
+
+        Returns:
+            pd.DataFrame: The projected and typed DataFrame.
+        """
+        if self.columns is not None:
+            df = df[[col for col in df.columns if self.wants(col)]]
+        dtypes = {col: dtype for col, dtype in self.column_dtypes().items() if col in df.columns}
+        if dtypes:
+            try:
+                df = df.astype(dtypes)
+            except (TypeError, ValueError) as e:
+                logging.warning(f"Could not apply ingest dtypes {dtypes}: {e}")
+        if self.dtype_backend == 'pyarrow':
+            df = to_arrow_backed(df)
+        return self.parse_dates(self.filter_rows(df))
+
+    def __repr__(self):
+        return (f"IngestSchema(columns={self.columns!r}, dtypes={self.dtypes!r}, "
+                f"categorical_columns={self.categorical_columns!r}, date_formats={self.date_formats!r}, "
+                f"row_filter={self.row_filter!r}, dtype_backend={self.dtype_backend!r})")
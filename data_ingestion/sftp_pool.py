@@ -0,0 +1,187 @@
+# data_ingestion/sftp_pool.py
+import logging
+import threading
+import time
+from contextlib import contextmanager
+import paramiko
+
+
+def open_transport(host, port, username, password=None, private_key_path=None, private_key_passphrase=None):
+    """
+    Opens and authenticates an SSH transport.  Prioritizes key-based authentication.
+
+    Returns:
+        paramiko.Transport: The authenticated transport.
+    """
+    transport = paramiko.Transport((host, port))
+    if private_key_path:
+        private_key = paramiko.RSAKey.from_private_key_file(private_key_path, password=private_key_passphrase)
+        transport.connect(username=username, pkey=private_key)
+    else:
+        transport.connect(username=username, password=password)
+    return transport
+
+
+class _PooledTransport:
+    """One authenticated transport plus the SFTP channels currently parked on it."""
+
+    def __init__(self, transport, max_channels):
+        self.transport = transport
+        self.channel_slots = threading.BoundedSemaphore(max_channels)
+        self.idle_clients = []  # SFTPClients (channels) ready to be reused
+        self.in_use = 0
+        self.last_used = time.monotonic()
+        self.retired = False  # Dropped from the pool; closed once its last user releases it
+
+    def is_healthy(self):
+        return self.transport.is_active() and self.transport.is_authenticated()
+
+    def close(self):
+        for client in self.idle_clients:
+            client.close()
+        self.idle_clients = []
+        self.transport.close()
+
+
+class SFTPConnectionPool:
+    """
+    Keeps authenticated SFTP sessions alive between fetches.
+
+    Transports are keyed by (host, port, username), so every fetch in a
+    pipeline run (data file, comments file, ...) reuses one SSH handshake
+    and key exchange.  Transports are health-checked before reuse, closed
+    after `idle_timeout` seconds without use, and each one serves at most
+    `max_channels` concurrent SFTP channels.  The pool is thread-safe.
+    """
+
+    def __init__(self, max_channels=4, idle_timeout=300, keepalive_interval=30):
+        """
+        Args:
+            max_channels (int): Maximum concurrent SFTP channels per transport.
+            idle_timeout (float): Seconds after which an unused transport is closed.
+            keepalive_interval (int): Seconds between SSH keep-alive packets (0 disables).
+        """
+        self.max_channels = max_channels
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+        self._entries = {}
+        self._connecting = {}  # key -> Event set once the thread connecting that key is done
+        self._lock = threading.Lock()
+
+    def _checkout_entry(self, key, credentials):
+        """
+        Returns a healthy pooled transport for `key`, connecting if needed.
+
+        The connect (TCP, SSH handshake, auth) runs outside the pool lock, so a
+        slow host only delays checkouts for that host.  Concurrent checkouts of
+        a key being connected wait for that connect instead of opening their own.
+        """
+        while True:
+            with self._lock:
+                self._evict_idle_locked()
+                entry = self._entries.get(key)
+                if entry is not None and not entry.is_healthy():
+                    logging.info(f"Dropping dead SFTP transport to {key[0]}:{key[1]}")
+                    self._retire_locked(key, entry)
+                    entry = None
+                if entry is not None:
+                    entry.in_use += 1
+                    return entry
+                connected = self._connecting.get(key)
+                if connected is None:
+                    connected = self._connecting[key] = threading.Event()  # This thread connects
+                    break
+            connected.wait()
+
+        try:
+            transport = open_transport(key[0], key[1], key[2], **credentials)
+            if self.keepalive_interval:
+                transport.set_keepalive(self.keepalive_interval)
+            entry = _PooledTransport(transport, self.max_channels)
+            with self._lock:
+                self._entries[key] = entry
+                entry.in_use += 1
+            logging.info(f"Opened pooled SFTP transport to {key[0]}:{key[1]} as {key[2]}")
+            return entry
+        finally:
+            with self._lock:
+                del self._connecting[key]
+            connected.set()
+
+    def _retire_locked(self, key, entry):
+        """Drops `entry` from the pool; it is closed now if unused, else by its last user."""
+        if self._entries.get(key) is entry:
+            del self._entries[key]
+        entry.retired = True
+        if entry.in_use == 0:
+            entry.close()
+
+    @contextmanager
+    def sftp(self, host, port, username, password=None, private_key_path=None, private_key_passphrase=None):
+        """
+        Borrows an SFTP client from the pool.
+
+        Blocks while the transport already has `max_channels` channels in use.
+        The client is returned to the pool (not closed) when the block exits.
+
+        Yields:
+            paramiko.SFTPClient: A client on a shared, authenticated transport.
+        """
+        key = (host, port, username)
+        entry = self._checkout_entry(key, dict(password=password, private_key_path=private_key_path,
+                                               private_key_passphrase=private_key_passphrase))
+        entry.channel_slots.acquire()
+        client = None
+        try:
+            with self._lock:
+                while entry.idle_clients and client is None:
+                    candidate = entry.idle_clients.pop()
+                    if candidate.get_channel().closed:
+                        candidate.close()
+                    else:
+                        client = candidate
+            if client is None:
+                client = paramiko.SFTPClient.from_transport(entry.transport)
+            yield client
+        except Exception as e:
+            # After anything but a plain SFTP/IO error the channel may be in an
+            # unknown state; don't hand it out again
+            if client is not None and not isinstance(e, OSError):
+                client.close()
+                client = None
+            raise
+        finally:
+            with self._lock:
+                if client is not None:
+                    if entry.retired:
+                        client.close()
+                    else:
+                        entry.idle_clients.append(client)
+                entry.in_use -= 1
+                entry.last_used = time.monotonic()
+                if entry.retired and entry.in_use == 0:
+                    entry.close()
+            entry.channel_slots.release()
+
+    def _evict_idle_locked(self):
+        now = time.monotonic()
+        for key, entry in list(self._entries.items()):
+            if entry.in_use == 0 and now - entry.last_used > self.idle_timeout:
+                logging.info(f"Closing idle SFTP transport to {key[0]}:{key[1]}")
+                entry.close()
+                del self._entries[key]
+
+    def evict_idle(self):
+        """Closes transports that have been idle for longer than `idle_timeout`."""
+        with self._lock:
+            self._evict_idle_locked()
+
+    def close_all(self):
+        """Closes every pooled transport."""
+        with self._lock:
+            for entry in self._entries.values():
+                entry.close()
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,76 @@
+# data_ingestion/sync_manifest.py
+import hashlib
+import json
+import logging
+import os
+
+
+def copy_hashing(source, target, previous_digest=None, block_size=1024 * 1024):
+    """
+    Copies `source` to `target` in blocks and returns the hex SHA-256 of what
+    was copied, chained onto `previous_digest` when given.
+
+    Chaining lets an appended-to file get a new digest from just the
+    appended bytes: sha256(previous_digest + appended bytes).  The result
+    depends on how the file grew, so it identifies a sync history, not
+    the file content.
+    """
+    digest = hashlib.sha256()
+    if previous_digest:
+        digest.update(previous_digest.encode('ascii'))
+    for block in iter(lambda: source.read(block_size), b''):
+        target.write(block)
+        digest.update(block)
+    return digest.hexdigest()
+
+
+class SyncManifest:
+    """
+    Local record of remote files mirrored by an incremental sync.
+
+    Each entry maps a remote path to the remote size and mtime seen at the
+    last sync, the chain digest of the local copy and where that copy lives.
+    The chain digest is the SHA-256 of the downloaded file, chained over
+    every append since (see `copy_hashing`), so it is computed from the
+    transferred bytes only.  It is NOT a content hash: identical files
+    reached through different append histories have different chain
+    digests, and it cannot be checked against a plain SHA-256 of the file.
+    The manifest is a small JSON file, rewritten atomically on every save.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Location of the manifest JSON file.  Created on first save.
+        """
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable sync manifest {path}: {e}")
+        for entry in self.entries.values():
+            if 'sha256' in entry:
+                # Older manifests stored the file's plain SHA-256, a valid start of a chain
+                entry.setdefault('chain_digest', entry.pop('sha256'))
+
+    def get(self, remote_path):
+        """Returns the entry for `remote_path`, or None if it was never synced."""
+        return self.entries.get(remote_path)
+
+    def update(self, remote_path, size, mtime, chain_digest, local_path):
+        """Records the state of a synced file and persists the manifest."""
+        self.entries[remote_path] = {'size': size, 'mtime': mtime, 'chain_digest': chain_digest,
+                                     'local_path': local_path}
+        self.save()
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
@@ -2,13 +2,26 @@ import gradio as gr
 import pandas as pd
 import os
 import re
+import glob
 from data_ingestion.sftp_ingestor import SFTPIngestor
+from data_ingestion.sftp_pool import SFTPConnectionPool
 from data_ingestion.file_upload_ingestor import FileUploadIngestor
+from data_ingestion.chunked_dataset import ChunkedDataset
+from data_ingestion.dataset_cache import DatasetCache
+from data_ingestion.readers import file_type_from_path, CHUNKED_FILE_TYPES
+from data_ingestion.schema import to_numpy_backed
 from preprocessing.data_cleaner import DataCleaner
 from preprocessing.categorizer import Categorizer
+from preprocessing.deduplicator import StreamingDeduplicator
+from preprocessing.exporter import Exporter, format_from_path, with_extension
+from preprocessing.pipeline import PreprocessingPipeline
 from file_handling.cloud_storage import CloudStorage
 from resolution_handler.llm_classifier import LLMClassifier
+from resolution_handler.classification_cache import ClassificationCache
+from resolution_handler.embedding_classifier import EmbeddingClassifier
+from resolution_handler.rule_classifier import RuleClassifier
 from resolution_handler.resolution_actions import ResolutionActions
+from resolution_handler.run_status import resolution_status
 from reporting.report_generator import ReportGenerator
 from reporting.logger import setup_logger
 from config import Config
@@ -19,6 +32,19 @@ config = Config()
 logger = setup_logger(config.log_file_path)
 logger.info("Starting Gradio application...")
 
+# Shared across requests so every SFTP fetch reuses one authenticated session
+sftp_pool = SFTPConnectionPool(config.sftp_max_channels, config.sftp_idle_timeout,
+                               config.sftp_keepalive_interval) if config.sftp_pool_enabled else None
+# Parsed uploads / synced files keyed by content hash, so repeated ingests of the same file skip parsing
+dataset_cache = DatasetCache(config.dataset_cache_dir, config.dataset_cache_max_mb * 1024 * 1024,
+                             config.dataset_cache_max_entries) if config.dataset_cache_enabled else None
+# Keyword/regex rules labelling obvious comments before any model is involved
+rule_classifier = (RuleClassifier.from_file(config.rule_classifier_rules_path) if config.rule_classifier_rules_path
+                   else RuleClassifier()) if config.rule_classifier_enabled else None
+# Labels of previously classified comments, so repeated comments and re-runs skip the LLM
+classification_cache = ClassificationCache(config.llm_cache_path, config.llm_cache_max_entries,
+                                           config.llm_cache_ttl_days * 24 * 3600) if config.llm_cache_enabled else None
+
 
 def purge(dir, pattern):
     for f in os.listdir(dir):
@@ -27,6 +53,13 @@ def purge(dir, pattern):
             print(f"Deleting: {file_path}")  # Debugging statement
             os.remove(file_path)
 
+def make_sftp_ingestor(schema=None):
+    """Creates an SFTPIngestor backed by the shared connection pool."""
+    return SFTPIngestor(config.sftp_host, config.sftp_port, config.sftp_username,
+                        config.sftp_password, config.sftp_private_key_path,
+                        config.sftp_private_key_passphrase, schema=schema, pool=sftp_pool,
+                        cache=dataset_cache, sheet_name=config.excel_sheet, excel_engine=config.excel_engine)
+
 # --- Helper Functions (for Gradio) ---
 
 async def ingest_data(file_obj, method="file_upload"):
@@ -36,17 +69,31 @@ async def ingest_data(file_obj, method="file_upload"):
             if file_obj is None:
                 raise ValueError("Please upload a file.")
             # Gradio File objects have a .name attribute which is the path to the temp file
-            file_type = file_obj.name.split('.')[-1].lower()
-            with open(file_obj.name, 'rb') as f:
-                file_content = f.read()
-            ingestor = FileUploadIngestor()
-            raw_data_df = ingestor.ingest_data(file_content, file_type)
+            file_type = file_type_from_path(file_obj.name)
+            ingestor = FileUploadIngestor(schema=config.ingest_schema(), cache=dataset_cache,
+                                          sheet_name=config.excel_sheet, excel_engine=config.excel_engine)
+            if config.ingest_chunk_size > 0 and file_type in CHUNKED_FILE_TYPES:
+                # Stream large CSV/Excel uploads straight from the temp file instead of loading them
+                file_path, chunk_size = file_obj.name, config.ingest_chunk_size
+                raw_data_df = ChunkedDataset(lambda: ingestor.ingest_chunks(file_path, file_type, chunk_size),
+                                             description=file_path)
+            else:
+                with open(file_obj.name, 'rb') as f:
+                    file_content = f.read()
+                raw_data_df = ingestor.ingest_data(file_content, file_type)
 
         elif method == "sftp":
-            ingestor = SFTPIngestor(config.sftp_host, config.sftp_port, config.sftp_username,
-                                     config.sftp_password, config.sftp_private_key_path,
-                                     config.sftp_private_key_passphrase)
-            raw_data_df = ingestor.fetch_data(config.sftp_remote_file, config.sftp_file_type)
+            ingestor = make_sftp_ingestor(schema=config.ingest_schema())
+            if config.sftp_incremental_sync:
+                # Only new or changed remote files (or appended bytes) are transferred
+                raw_data_df = ingestor.fetch_incremental(config.sftp_remote_file, config.sftp_file_type,
+                                                         config.sftp_sync_dir, append_only=config.sftp_append_only)
+            elif glob.has_magic(config.sftp_remote_file):
+                # Partitioned drops: download every matching file in parallel
+                raw_data_df = ingestor.fetch_many(config.sftp_remote_file, config.sftp_file_type,
+                                                  max_workers=config.sftp_fetch_workers)
+            else:
+                raw_data_df = ingestor.fetch_data(config.sftp_remote_file, config.sftp_file_type)
 
         else:
             raise ValueError("Invalid ingestion method selected.")
@@ -61,38 +108,70 @@ async def ingest_data(file_obj, method="file_upload"):
         logger.error(f"Data ingestion error: {e}")
         return None, str(e)
 
+def display_frame(data):
+    """
+    Returns something Gradio can render; streamed datasets only show their first rows.
+    Arrow-backed columns (DATAFRAME_ENGINE=pyarrow) are converted back to NumPy here only.
+    """
+    if isinstance(data, ChunkedDataset):
+        data = data.head(100)
+    return gr.Dataframe(value=to_numpy_backed(data) if data is not None else None)
+
+# Result columns of preprocessing and their display names
+RESULT_COLUMNS = {'txn_ref_id': 'Transaction ID', 'sys_a_amount_attribute_1': 'Amount', 'sys_a_date': 'Date'}
+
 async def preprocess_data(raw_data_df):
-    """Cleans and categorizes the ingested data."""
+    """
+    Cleans and categorizes the ingested data, and exports the result once (in
+    EXPORT_FORMAT) to the artifact that `upload_to_gcs` later uploads.
+
+    Data flows through a PreprocessingPipeline chunk by chunk (a DataFrame is
+    a single chunk), so chunked ingests never have to fit in memory.  Results
+    over the pipeline's budget are returned as a ChunkedDataset over the export.
+    """
     if raw_data_df is None or raw_data_df.empty:
-        return None, "No data to preprocess. Please ingest data first."
+        return None, None, "No data to preprocess. Please ingest data first."
     try:
-        cleaner = DataCleaner()
-        cleaned_df = cleaner.clean_data(raw_data_df, date_columns=config.date_columns)
-
-        categorizer = Categorizer()
-        not_found_df = categorizer.categorize_data(cleaned_df, config.system_b_column, config.not_found_value)
-        not_found_df = not_found_df[['txn_ref_id', 'sys_a_amount_attribute_1', 'sys_a_date']]  # Keep only required columns
-        not_found_df = not_found_df.rename(columns={'txn_ref_id': 'Transaction ID', 'sys_a_amount_attribute_1': 'Amount', 'sys_a_date': 'Date'})
-        categorizer.export_to_csv(not_found_df, os.path.join(config.local_temp_dir, "temp_categorized_data.csv"), config.csv_export_columns)
+        exporter = Exporter(workers=config.export_workers)
+        deduplicator = StreamingDeduplicator(config.dedup_key_columns, config.dedup_memory_mb * 1024 * 1024,
+                                             config.dedup_spill_dir)
+        pipeline = PreprocessingPipeline(DataCleaner(), Categorizer(exporter), config.system_b_column,
+                                         config.not_found_value, config.date_columns, deduplicator,
+                                         columns=list(RESULT_COLUMNS), rename=RESULT_COLUMNS,
+                                         bucket_export_dir=config.bucket_export_dir,
+                                         memory_budget_bytes=config.pipeline_memory_mb * 1024 * 1024,
+                                         workers=config.pipeline_workers)
+        chunks = raw_data_df if isinstance(raw_data_df, ChunkedDataset) else [raw_data_df]
+        export_path = with_extension(os.path.join(config.local_temp_dir, "temp_categorized_data.csv"), config.export_format)
+        not_found_df, stats = pipeline.run(chunks, export_path, config.export_format, exporter)
         logger.info("Data preprocessed successfully.")
-        return not_found_df, "Data preprocessed successfully."
+        status = (f"Data preprocessed successfully.  Exported {stats['rows']} rows "
+                  f"({stats['bytes']} bytes, {config.export_format}) in {stats['seconds']:.2f}s.")
+        if pipeline.stats['unparsable_dates']:
+            status += f"  {pipeline.stats['unparsable_dates']} date values could not be parsed (see the log)."
+        return not_found_df, export_path, status
 
     except Exception as e:
         logger.error(f"Data preprocessing error: {e}")
-        return None, str(e)
+        return None, None, str(e)
 
-async def upload_to_gcs(df, progress=gr.Progress()):
-    """Uploads the categorized data to GCS."""
-    if df is None or df.empty:
-        return "No data to upload. Please preprocess data first."
+async def upload_to_gcs(df, export_path=None, progress=gr.Progress()):
+    """Uploads the categorized data to GCS, reusing the artifact written by `preprocess_data`."""
     try:
+        if df is None or df.empty:
+            return "No data to upload. Please preprocess data first."
         progress(0.5, desc="Starting Upload")
         storage = CloudStorage(config.gcs_bucket_name, config.gcs_credentials_path, config.gcs_project_id)
-        local_file_path = os.path.join(config.local_temp_dir, "temp_categorized_data.csv")
-        df.to_csv(local_file_path, index=False)
-
-        storage.upload_file(local_file_path, config.gcs_categorized_file_path)
-        os.remove(local_file_path)
+        local_file_path = export_path
+        if not local_file_path or not os.path.exists(local_file_path):
+            local_file_path = with_extension(os.path.join(config.local_temp_dir, "temp_categorized_data.csv"), config.export_format)
+            Exporter(workers=config.export_workers).export_chunks(df if isinstance(df, ChunkedDataset) else [df],
+                                                                  local_file_path, config.export_format)
+
+        storage.upload_file(local_file_path, with_extension(config.gcs_categorized_file_path, format_from_path(local_file_path)))
+        # A result over the pipeline's budget is read back from this file, so it stays while the state uses it
+        if not (isinstance(df, ChunkedDataset) and df.description == local_file_path):
+            os.remove(local_file_path)
         progress(1, desc="Finishing Upload")
         logger.info("Data uploaded to GCS successfully.")
         return "Data uploaded to GCS successfully."
@@ -102,15 +181,18 @@ async def upload_to_gcs(df, progress=gr.Progress()):
         return str(e)
 
 async def ingest_comments(comments_file):
-  """Ingest the comments file"""
+  """Ingest the comments file (uploaded, or SFTP_COMMENTS_FILE when nothing is uploaded)"""
   try:
-    if comments_file is None:
+    if comments_file is not None:
+      file_type = file_type_from_path(comments_file.name)
+      with open(comments_file.name, 'rb') as f:
+        file_content = f.read()
+      ingestor = FileUploadIngestor()
+      comments_df = ingestor.ingest_data(file_content, file_type)
+    elif config.sftp_comments_file:
+      comments_df = make_sftp_ingestor().fetch_data(config.sftp_comments_file, config.sftp_comments_file_type)
+    else:
       raise ValueError("Please upload a file")
-    file_type = comments_file.name.split(".")[-1].lower()
-    with open(comments_file.name, 'rb') as f:
-      file_content = f.read()
-    ingestor = FileUploadIngestor()
-    comments_df = ingestor.ingest_data(file_content, file_type)
 
     if comments_df is None or comments_df.empty:
       raise ValueError("Failed to ingest data or the file is empty")
@@ -132,7 +214,8 @@ async def handle_resolution(processed_df, comments_df, progress=gr.Progress()):
 
     try:
         progress(0, desc="Starting Resolution")
-        classifier = LLMClassifier(config.openai_api_key, config.openai_model_name)
+        classifier = LLMClassifier(config.openai_api_key, config.openai_model_name, config.llm_max_concurrency,
+                                   config.llm_batch_size, config.llm_batch_max_tokens, classification_cache)
 
         storage = CloudStorage(config.gcs_bucket_name, config.gcs_credentials_path, config.gcs_project_id)
         actions = ResolutionActions(storage, progress, config.model_path)
@@ -140,11 +223,31 @@ async def handle_resolution(processed_df, comments_df, progress=gr.Progress()):
 
         total_comments = len(comments_df)
         print('Total comments to process:', total_comments)
-        for index, row in comments_df.iterrows():
-          progress(index / total_comments, desc=f"Processing Resolution: {index + 1} / {total_comments}")
-          order_id = row['Transaction ID']
-          comment = row['Comments']
-          classification = await asyncio.to_thread(classifier.classify_comment, order_id, comment) # Run in a separate thread
+        order_ids = comments_df['Transaction ID'].tolist()
+        comments = comments_df['Comments'].tolist()
+        classify_progress = lambda done, total: progress(done / total, desc=f"Classifying Comments: {done} / {total}")
+        local_classifier = None
+        if config.local_classifier_enabled:
+            # Nearest neighbours among earlier LLM labels; only low-confidence comments go to the LLM
+            local_classifier = EmbeddingClassifier(actions.model, config.local_classifier_store_path,
+                                                   k=config.local_classifier_k,
+                                                   confidence_threshold=config.local_classifier_confidence,
+                                                   audit_fraction=config.local_classifier_audit_fraction)
+
+        async def classify_with_models(order_ids, comments, model_progress):
+            if local_classifier is not None:
+                return await local_classifier.classify_comments(order_ids, comments, classifier,
+                                                                progress=model_progress)
+            # All comments are classified concurrently (up to LLM_MAX_CONCURRENCY requests of LLM_BATCH_SIZE comments)
+            return await classifier.classify_comments(order_ids, comments, progress=model_progress)
+
+        if rule_classifier is not None:
+            # Obvious comments are labelled by rule; the rest go through the models
+            classifications = await rule_classifier.classify_comments(order_ids, comments, classify_with_models,
+                                                                      progress=classify_progress)
+        else:
+            classifications = await classify_with_models(order_ids, comments, classify_progress)
+        for order_id, comment, classification in zip(order_ids, comments, classifications):
           if classification:
             await asyncio.to_thread(actions.handle_resolution, order_id, classification, comment,
                                      config.gcs_resolved_folder, config.gcs_unresolved_folder, config.local_temp_dir)
@@ -158,9 +261,13 @@ async def handle_resolution(processed_df, comments_df, progress=gr.Progress()):
 
         purge(config.local_temp_dir, r".*_(resolved|unresolved)\.txt$")
 
-        logger.info("Resolution handling complete.")
+        status = resolution_status(classifier.last_run_stats,
+                                   rule_classifier.last_stats if rule_classifier is not None else None,
+                                   classification_cache is not None,
+                                   local_classifier.last_stats if local_classifier is not None else None)
+        logger.info(status)
         progress(1, desc="Finishing Resolution")
-        return processed_data_df, pattern_analysis_results, "Resolution handling complete."
+        return processed_data_df, pattern_analysis_results, status + "."
 
     except Exception as e:
         logger.error(f"Resolution handling error: {e}")
@@ -204,7 +311,9 @@ with gr.Blocks() as demo:
 
     with gr.Tab("Ingest Data"):
         with gr.Row():
-            data_file_input = gr.File(label="Upload Data File (CSV/Excel)")
+            data_file_input = gr.File(label="Upload Data File (CSV/Excel/Parquet/Feather/Arrow, optionally gzip/bz2/zstd/zip compressed)",
+                                      file_types=[".csv", ".xlsx", ".xls", ".parquet", ".feather", ".arrow", ".ipc",
+                                                  ".gz", ".bz2", ".zst", ".zip"])
             sftp_radio = gr.Radio(["file_upload", "sftp"], label="Data Source", value="file_upload")
         ingest_button = gr.Button("Ingest Data")
         raw_data_output = gr.Dataframe(label="Raw Data")
@@ -241,16 +350,17 @@ with gr.Blocks() as demo:
     # State variables to store data across tabs
     raw_data_state = gr.State()
     processed_data_state = gr.State()
+    export_path_state = gr.State()  # Artifact written by preprocessing, uploaded as is
     comments_data_state = gr.State()
 
     # Event Handlers
     ingest_button.click(ingest_data, [data_file_input, sftp_radio], [raw_data_state, ingest_status])
-    ingest_button.click(lambda df: gr.Dataframe(value=df), raw_data_state, raw_data_output)  # Update the visible Dataframe
+    ingest_button.click(display_frame, raw_data_state, raw_data_output)  # Update the visible Dataframe
 
-    preprocess_button.click(preprocess_data, raw_data_state, [processed_data_state, preprocess_status])
-    preprocess_button.click(lambda df: gr.Dataframe(value=df), processed_data_state, processed_data_output)
+    preprocess_button.click(preprocess_data, raw_data_state, [processed_data_state, export_path_state, preprocess_status])
+    preprocess_button.click(display_frame, processed_data_state, processed_data_output)
 
-    upload_button.click(upload_to_gcs, processed_data_state, upload_status)
+    upload_button.click(upload_to_gcs, [processed_data_state, export_path_state], upload_status)
 
     comments_ingest_button.click(ingest_comments, comments_file_input, [comments_data_state, comment_ingest_status])
     comments_ingest_button.click(lambda df: gr.Dataframe(value=df), comments_data_state, comments_data_output)
@@ -1,14 +1,28 @@
 # preprocessing/categorizer.py
+import os
+import re
+import numpy as np
 import pandas as pd
 import logging
+from preprocessing.exporter import Exporter
 
 class Categorizer:
     """
     Categorizes records based on specific criteria.
+
+    The status column is handled as a categorical, so patterns are matched
+    against its few distinct values instead of every row.  The matches are
+    then mapped back to the rows through the integer category codes.
     """
 
-    def __init__(self):
-        pass
+    def __init__(self, exporter=None):
+        """
+        Args:
+            exporter (Exporter, optional): Writer used by `export_to_csv`
+                (CSV, compressed CSV or Parquet).
+        """
+        self.exporter = exporter or Exporter()
+        self._bucket_names = {}  # Output directory -> {status: bucket file name}, see `export_partitions`
 
     def categorize_data(self, df, system_b_column, not_found_value="Not Found-SysB"):
         """
@@ -32,27 +46,137 @@ class Categorizer:
             return None
 
         # Filter for "Not Found Sys B" records
-        not_found_df = df[df[system_b_column].str.contains(not_found_value)]
+        column = self.as_categorical(df[system_b_column])
+        matches = np.asarray(column.cat.categories.astype(str).str.contains(not_found_value), dtype=bool)
+        codes = column.cat.codes.to_numpy()
+        not_found_df = df[(codes >= 0) & matches[codes]]  # Code -1 (missing status) never matches
         return not_found_df
 
-    def export_to_csv(self, df, file_path, columns=None):
+    @staticmethod
+    def as_categorical(series):
+        """Returns `series` as a categorical (converted once; categoricals are returned as is)."""
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            return series
+        return series.astype('category')
+
+    def partition_data(self, df, system_b_column):
         """
-        Exports a DataFrame to a CSV file.
+        Splits the data into one bucket per status value in a single pass.
+
+        Rows are grouped by their category code with one stable sort, so
+        every bucket keeps the input row order.  The cost grows with the row
+        count plus the number of distinct statuses, however many buckets
+        there are.
+
+        Args:
+            df (pd.DataFrame): The input DataFrame.
+            system_b_column (str): The column holding the recon sub-status.
+
+        Returns:
+            dict: Status value -> DataFrame of its rows (rows without a status are left out).
+            None: If the input DataFrame is empty or the specified column doesn't exist.
+        """
+        if df is None or df.empty:
+            logging.warning("Input DataFrame is empty.  Returning None.")
+            return None
+
+        if system_b_column not in df.columns:
+            logging.error(f"Column '{system_b_column}' not found in DataFrame.")
+            return None
+
+        column = self.as_categorical(df[system_b_column])
+        codes = column.cat.codes.to_numpy()
+        order = np.argsort(codes, kind='stable')
+        counts = np.bincount(codes[codes >= 0], minlength=len(column.cat.categories))
+        boundaries = np.cumsum(counts) + int((codes < 0).sum())  # Missing statuses (-1) sort first
+        partitions = {}
+        for status, count, end in zip(column.cat.categories, counts, boundaries):
+            if count:
+                partitions[status] = df.take(order[end - count:end])
+        logging.info(f"Partitioned {len(df)} rows into {len(partitions)} '{system_b_column}' buckets")
+        return partitions
+
+    def select_partitions(self, partitions, pattern):
+        """
+        Combines the buckets whose status matches `pattern` (a regex, as in `categorize_data`).
+
+        Args:
+            partitions (dict): Buckets from `partition_data`.
+            pattern (str): The status pattern, e.g. the "Not Found Sys B" value.
+
+        Returns:
+            pd.DataFrame: The rows of all matching buckets in input (index) order (empty if none match).
+        """
+        matching = [bucket for status, bucket in partitions.items() if re.search(pattern, str(status))]
+        if not matching:
+            return next(iter(partitions.values())).iloc[:0] if partitions else pd.DataFrame()
+        return matching[0] if len(matching) == 1 else pd.concat(matching).sort_index(kind='stable')
+
+    def export_partitions(self, partitions, output_dir, columns=None, append_to=()):
+        """
+        Exports every bucket to its own CSV file, named after its status
+        (e.g. 'Not Found-SysB' -> 'Not_Found_SysB.csv').  Statuses whose names
+        sanitize alike get a numbered suffix ('Not Found SysB' -> 'Not_Found_SysB_2.csv');
+        a status keeps its file name for the lifetime of the Categorizer.
+
+        Args:
+            partitions (dict): Buckets from `partition_data`.
+            output_dir (str): Directory for the bucket files.
+            columns (list, optional): Columns to export.  Defaults to all.
+            append_to (Collection[str]): Bucket files to append to instead of
+                overwriting, e.g. the paths returned for earlier chunks of a stream.
+
+        Returns:
+            dict: Status value -> path of its CSV file.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        paths = {}
+        names = self._bucket_names.setdefault(os.path.abspath(output_dir), {})
+        for status, bucket in partitions.items():
+            if status not in names:
+                base = re.sub(r'[^A-Za-z0-9]+', '_', str(status)).strip('_') or 'blank'
+                name, suffix = base, 2
+                while name in names.values():
+                    name, suffix = f"{base}_{suffix}", suffix + 1
+                names[status] = name
+            file_path = os.path.join(output_dir, f"{names[status]}.csv")
+            if columns:
+                bucket = bucket[columns]
+            try:
+                append = file_path in append_to
+                bucket.to_csv(file_path, index=False, mode='a' if append else 'w', header=not append)
+                paths[status] = file_path
+            except Exception as e:
+                logging.error(f"Error exporting bucket '{status}' to CSV: {e}")
+        logging.info(f"Exported {len(paths)} buckets to {output_dir}")
+        return paths
+
+    def export_to_csv(self, df, file_path, columns=None, export_format=None):
+        """
+        Exports a DataFrame to a CSV file, or to gzip/zstd CSV or Parquet when
+        `export_format` (or the file suffix, e.g. '.csv.gz') says so.
 
         Args:
           df: Dataframe to export
           file_path: File path
           columns: List of columns. Defaults to None.
+          export_format: One of EXPORT_FORMATS. Defaults to the file suffix.
+
+        Returns:
+          dict: Export stats (path, rows, bytes, seconds, rows_per_second).
+          None: If the DataFrame is empty or the export failed.
         """
 
         if df is None or df.empty:
             logging.warning("DataFrame is empty.  Not exporting to CSV.")
-            return
+            return None
         if columns:
           df = df[columns]
 
         try:
-            df.to_csv(file_path, index=False)
+            stats = self.exporter.export(df, file_path, export_format)
             logging.info(f"Data successfully exported to {file_path}")
+            return stats
         except Exception as e:
-            logging.error(f"Error exporting data to CSV: {e}")
\ No newline at end of file
+            logging.error(f"Error exporting data to CSV: {e}")
+            return None
@@ -1,14 +1,42 @@
 # preprocessing/data_cleaner.py
 import pandas as pd
+import numpy as np
 import logging
+import time
+import tracemalloc
+from contextlib import contextmanager
+from preprocessing.date_parser import DateParser
 
 class DataCleaner:
     """
     Cleans the input DataFrame.
+
+    Cleaning runs as three vectorized steps: hash-based duplicate removal,
+    a single `fillna` with a per-column fill map built from one null scan of
+    the whole frame, and date conversion.  The time (and, optionally, the
+    bytes allocated) of each step is recorded in `last_stats`.
     """
 
-    def __init__(self):
-        pass
+    def __init__(self, inplace=False, numeric_fill=0, text_fill='Unknown', track_memory=False, date_parser=None):
+        """
+        Args:
+            inplace (bool): Clean the caller's DataFrame in place instead of
+                returning a cleaned copy.  Avoids copying wide frames; the input
+                is modified.
+            numeric_fill: Value for missing entries of numeric columns.
+            text_fill (str): Value for missing entries of all other columns.
+            track_memory (bool): Record the bytes allocated per step with
+                `tracemalloc`.  This slows cleaning down, so it is off by default.
+            date_parser (DateParser, optional): Parser for date columns.  One
+                parser is kept per cleaner, so detected formats and parsed values
+                carry over between the chunks of a stream.
+        """
+        self.inplace = inplace
+        self.numeric_fill = numeric_fill
+        self.text_fill = text_fill
+        self.track_memory = track_memory
+        self.last_stats = {}  # step -> {'seconds': float, 'bytes_allocated': int | None}
+        self.date_parser = date_parser or DateParser()
 
     def clean_data(self, df, date_columns=None):
         """
@@ -16,33 +44,132 @@ class DataCleaner:
 
         Args:
             df (pd.DataFrame): The input DataFrame.
-            date_columns: list of date columns
+            date_columns (list | dict): Date columns, or a mapping of date column
+                to its strptime format (None to detect the format).
 
         Returns:
-            pd.DataFrame: The cleaned DataFrame.
+            pd.DataFrame: The cleaned DataFrame (`df` itself in in-place mode).
         """
+        self.last_stats = {}
         if df is None or df.empty:
             logging.warning("Input DataFrame is empty.  Returning empty DataFrame.")
             return pd.DataFrame()
 
-        # Drop duplicate rows
-        df = df.drop_duplicates()
-
-        # Handle missing values (example: fill with a default value)
-        # Customize this based on your specific needs.
-        for col in df.columns:
-            if df[col].isnull().any():
-                if pd.api.types.is_numeric_dtype(df[col]):
-                    df[col] = df[col].fillna(0)  # Fill numeric NaNs with 0
-                else:
-                    df[col] = df[col].fillna('Unknown')  # Fill other NaNs with 'Unknown'
-
-        # Convert date columns to datetime objects
-        if date_columns:
-          for col in date_columns:
+        owned = self.inplace  # Whether `df` may be modified without copying it first
+        with self._step('drop_duplicates'):
+            deduplicated = self.drop_duplicates(df)
+            owned = owned or deduplicated is not df
+            df = deduplicated
+        with self._step('fill_missing'):
+            df = self.fill_missing(df, copy=not owned)
+        with self._step('convert_dates'):
+            df = self.convert_dates(df, date_columns)
+        self._log_stats()
+        return df
+
+    @staticmethod
+    def duplicated_rows(df):
+        """
+        Boolean mask of rows that repeat an earlier row (like `df.duplicated()`).
+
+        `df.duplicated()` factorizes every column into a full-size label array
+        first, which for wide frames allocates as much as the frame itself.
+        Instead, each row is reduced to a 64-bit hash, column by column, and
+        only rows whose hash occurs more than once are compared exactly.
+        """
+        hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+        candidates = np.flatnonzero(pd.Series(hashes).duplicated(keep=False).to_numpy())
+        duplicated = np.zeros(len(df), dtype=bool)
+        if len(candidates):
+            duplicated[candidates] = df.iloc[candidates].duplicated().to_numpy()
+        return duplicated
+
+    def drop_duplicates(self, df):
+        """Drops duplicate rows.  Frames without duplicates are returned without a copy."""
+        duplicated = self.duplicated_rows(df)
+        if not duplicated.any():
+            return df
+        if self.inplace:
+            df.drop(index=df.index[duplicated], inplace=True)
+            return df
+        return df.take(np.flatnonzero(~duplicated))
+
+    def fill_missing(self, df, copy=None):
+        """
+        Fills missing values in one pass: numeric columns get `numeric_fill`,
+        all others (text, categorical, ...) get `text_fill`.
+
+        Args:
+            df (pd.DataFrame): The frame to fill.
+            copy (bool, optional): Fill a copy rather than `df` itself.
+                Defaults to `not self.inplace`.
+        """
+        has_nulls = df.isna().any()
+        if not has_nulls.any():
+            return df
+        if copy is None:
+            copy = not self.inplace
+        if copy:
+            df = df.copy()
+        fill_map = {}
+        for col in has_nulls.index[has_nulls.to_numpy()]:
+            column = df[col]
+            if pd.api.types.is_numeric_dtype(column):
+                fill_map[col] = self.numeric_fill
+            else:
+                if isinstance(column.dtype, pd.CategoricalDtype) and self.text_fill not in column.cat.categories:
+                    df[col] = column.cat.add_categories(self.text_fill)  # Categoricals only accept known values
+                fill_map[col] = self.text_fill
+        df.fillna(fill_map, inplace=True)
+        return df
+
+    def convert_dates(self, df, date_columns=None):
+        """
+        Converts the given columns to datetimes with `self.date_parser`.
+        Unparsable values become NaT and are counted in `date_parser.last_report`.
+        """
+        if not date_columns:
+            return df
+        if not isinstance(date_columns, dict):
+            date_columns = dict.fromkeys(date_columns)
+        converted = {}
+        for col, date_format in date_columns.items():
             if col in df.columns:
-              try:
-                df[col] = pd.to_datetime(df[col], errors='coerce')
-              except Exception as e:
-                logging.error("error in converting to date: %s", e)
-        return df
\ No newline at end of file
+                try:
+                    converted[col] = self.date_parser.parse(df[col], col, formats=date_format)
+                except Exception as e:
+                    logging.error("error in converting to date: %s", e)
+        if not converted:
+            return df
+        if self.inplace:
+            for col, values in converted.items():
+                df[col] = values
+            return df
+        return df.assign(**converted)
+
+    def _log_stats(self):
+        parts = []
+        for step, stats in self.last_stats.items():
+            allocated = f", {stats['bytes_allocated']} bytes" if stats['bytes_allocated'] is not None else ""
+            parts.append(f"{step} {stats['seconds']:.3f}s{allocated}")
+        logging.info(f"Data cleaned: {'; '.join(parts)}")
+
+    @contextmanager
+    def _step(self, name):
+        """Times a cleaning step (and traces its allocations if `track_memory`)."""
+        started_tracing = self.track_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if self.track_memory:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            stats = {'seconds': time.perf_counter() - started, 'bytes_allocated': None}
+            if self.track_memory:
+                stats['bytes_allocated'] = max(0, tracemalloc.get_traced_memory()[1] - baseline)
+            if started_tracing:
+                tracemalloc.stop()
+            self.last_stats[name] = stats
@@ -0,0 +1,192 @@
+# preprocessing/date_parser.py
+import logging
+import numpy as np
+import pandas as pd
+
+# Tried in order; earlier formats win ties.  Day-first comes before month-first, so a
+# column whose values are all ambiguous ('01/02/2024') is read day-first, unlike
+# pd.to_datetime's month-first default; pin the format in DATE_COLUMNS to override.
+CANDIDATE_FORMATS = (
+    '%Y-%m-%d',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%d %H:%M:%S.%f',
+    '%Y-%m-%dT%H:%M:%S.%f',
+    '%Y/%m/%d',
+    '%d/%m/%Y',
+    '%d/%m/%Y %H:%M:%S',
+    '%d/%m/%Y %H:%M',
+    '%d/%m/%y',
+    '%m/%d/%Y',
+    '%m/%d/%Y %H:%M:%S',
+    '%m/%d/%y',
+    '%d-%m-%Y',
+    '%d.%m.%Y',
+    '%d-%b-%Y',
+    '%d %b %Y',
+    '%b %d, %Y',
+    '%d-%b-%y',
+    '%Y%m%d',
+)
+
+
+class DateParser:
+    """
+    Fast, format-aware date parsing for columns with few distinct values.
+
+    Each column's formats are detected once from a sample of its distinct
+    values.  A greedy cover of the candidate formats handles columns that
+    mix several formats.  Parsing then works on the distinct values only:
+    each format is applied vectorized with an explicit `format=`, and the
+    results are broadcast back to the rows.  Parsed values are memoized
+    across calls, so later chunks of the same feed mostly hit the cache.
+    Values that no detected format matches become NaT and are reported in
+    `last_report` (and their running count in `unparsable_rows`) and logged;
+    they are never guessed at.  Formats are only remembered once detection
+    found some, so a chunk without (parsable) text values does not fix a
+    column's formats.
+    """
+
+    def __init__(self, formats=None, candidate_formats=CANDIDATE_FORMATS, sample_size=1000,
+                 max_formats=3, cache_size=100_000):
+        """
+        Args:
+            formats (dict, optional): Column name -> strptime format (or list of
+                formats).  Columns without an entry have their formats detected.
+            candidate_formats (tuple): Formats tried during detection, in priority order.
+            sample_size (int): Distinct values sampled for format detection.
+            max_formats (int): Maximum number of formats detected per column.
+            cache_size (int): Maximum memoized values per column.
+        """
+        self.formats = {col: [fmt] if isinstance(fmt, str) else list(fmt)
+                        for col, fmt in (formats or {}).items() if fmt}
+        self.candidate_formats = tuple(candidate_formats)
+        self.sample_size = sample_size
+        self.max_formats = max_formats
+        self.cache_size = cache_size
+        self.last_report = {}  # column -> {'formats', 'rows', 'unparsable', 'examples'}
+        self.unparsable_rows = {}  # column -> unparsable rows over all calls
+        self._cache = {}  # column -> {raw string: Timestamp or NaT}
+
+    def detect_formats(self, values):
+        """
+        Picks the formats that together parse the most of `values`.
+
+        Args:
+            values (array-like): Distinct string values (a sample is enough).
+
+        Returns:
+            list: Formats in the order they should be tried (may be empty).
+        """
+        remaining = pd.Series(pd.unique(np.asarray(values, dtype=object)), dtype=object).str.strip()
+        remaining = remaining[remaining.notna() & (remaining != '')]
+        chosen = []
+        while len(remaining) and len(chosen) < self.max_formats:
+            best_format, best_mask = None, None
+            for fmt in self.candidate_formats:
+                if fmt in chosen:
+                    continue
+                mask = pd.to_datetime(remaining, format=fmt, errors='coerce').notna().to_numpy()
+                if best_mask is None or mask.sum() > best_mask.sum():
+                    best_format, best_mask = fmt, mask
+            if best_mask is None or not best_mask.any():
+                break
+            chosen.append(best_format)
+            remaining = remaining[~best_mask]
+        return chosen
+
+    def _parse_unique(self, uniques, formats):
+        """Parses distinct strings with each format in turn; values no format matches stay NaT."""
+        parsed = pd.Series(pd.NaT, index=range(len(uniques)), dtype='datetime64[ns]')
+        todo = np.ones(len(uniques), dtype=bool)
+        stripped = pd.Series(uniques, dtype=object).str.strip()
+        for fmt in formats:
+            if not todo.any():
+                break
+            attempt = pd.to_datetime(stripped[todo], format=fmt, errors='coerce')
+            hit = attempt.notna().to_numpy()
+            parsed.iloc[np.flatnonzero(todo)[hit]] = attempt[hit].to_numpy()
+            todo[np.flatnonzero(todo)[hit]] = False
+        return parsed.to_numpy()
+
+    def parse(self, series, column=None, formats=None):
+        """
+        Converts a column to datetimes.
+
+        Args:
+            series (pd.Series): Raw values (strings, or already datetimes).
+            column (str, optional): Column name, for per-column formats, caching
+                and the report.  Defaults to `series.name`.
+            formats (str | list, optional): Format(s) to use for this column
+                instead of detecting them.
+
+        Returns:
+            pd.Series: `datetime64[ns]` values; unparsable entries are NaT and
+                are counted in `last_report[column]`.
+        """
+        column = series.name if column is None else column
+        if formats:
+            formats = [formats] if isinstance(formats, str) else list(formats)
+            if self.formats.get(column) != formats:
+                self.formats[column] = formats
+                self._cache.pop(column, None)  # Memoized values were parsed with other formats
+        if pd.api.types.is_datetime64_any_dtype(series):
+            return series
+        codes, uniques = pd.factorize(series)
+        uniques = np.asarray(uniques, dtype=object)
+        is_text = np.fromiter((isinstance(value, str) for value in uniques), dtype=bool, count=len(uniques))
+
+        column_formats = self.formats.get(column)
+        if column_formats is None:
+            text_values = uniques[is_text]
+            if len(text_values):
+                sample = text_values if len(text_values) <= self.sample_size else np.random.default_rng(0).choice(
+                    text_values, self.sample_size, replace=False)
+                column_formats = self.detect_formats(sample)
+                if column_formats:
+                    self.formats[column] = column_formats
+                    logging.info(f"Detected date format(s) {column_formats} for column '{column}'")
+                else:
+                    logging.warning(f"No date format matches the values of column '{column}'")
+            else:
+                column_formats = []  # Nothing to detect from yet; a later call will
+
+        cache = self._cache.setdefault(column, {})
+        values = np.empty(len(uniques), dtype='datetime64[ns]')
+        missing = []
+        for i, value in enumerate(uniques):
+            cached = cache.get(value) if is_text[i] else None
+            if cached is None:
+                missing.append(i)
+            else:
+                values[i] = cached
+        if missing:
+            missing = np.asarray(missing)
+            text_missing = missing[is_text[missing]]
+            if len(text_missing):
+                fresh = self._parse_unique(uniques[text_missing], column_formats)
+                values[text_missing] = fresh
+                if column_formats and len(cache) + len(text_missing) <= self.cache_size:
+                    cache.update(zip(uniques[text_missing], fresh))
+            other = missing[~is_text[missing]]
+            if len(other):
+                # Non-string values (datetime objects from Excel, numbers, ...)
+                values[other] = pd.to_datetime(pd.Series(uniques[other], dtype=object), errors='coerce').to_numpy()
+
+        # Broadcast back to the rows; factorize codes missing values as -1
+        result = np.full(len(codes), np.datetime64('NaT'), dtype='datetime64[ns]')
+        present = codes >= 0
+        result[present] = values[codes[present]]
+        self._report(column, uniques, codes, np.isnat(values))
+        return pd.Series(result, index=series.index, name=series.name)
+
+    def _report(self, column, uniques, codes, failed_uniques):
+        failed_codes = np.flatnonzero(failed_uniques)
+        unparsable = int(np.isin(codes, failed_codes).sum()) if len(failed_codes) else 0
+        examples = [str(value) for value in uniques[failed_codes[:5]]]
+        self.last_report[column] = {'formats': list(self.formats.get(column, [])), 'rows': len(codes),
+                                    'unparsable': unparsable, 'examples': examples}
+        self.unparsable_rows[column] = self.unparsable_rows.get(column, 0) + unparsable
+        if unparsable:
+            logging.warning(f"{unparsable} of {len(codes)} values in date column '{column}' could not be parsed "
+                            f"(e.g. {examples})")
@@ -0,0 +1,148 @@
+# preprocessing/deduplicator.py
+import logging
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+
+
+class StreamingDeduplicator:
+    """
+    Removes duplicate rows from chunked input without holding the dataset in memory.
+
+    Every row (or just its `key_columns`) is reduced to a 64-bit hash.  The
+    hashes seen so far are kept as sorted runs of `uint64`, about 8 bytes
+    per distinct row, and new chunks are checked against them with a binary
+    search.  This catches duplicates that span chunk boundaries.  When the
+    in-memory runs outgrow `memory_budget_bytes`, they are merged and spilled
+    to a `.npy` file that is searched through a memory map from then on.
+
+    Rows are treated as equal when their 64-bit hashes are equal.  The chance
+    that any two of n distinct rows collide is about n^2 / 2^65: roughly
+    3e-8 for a million rows and 3% for a billion.
+    """
+
+    def __init__(self, key_columns=None, memory_budget_bytes=256 * 1024 * 1024, spill_dir=None):
+        """
+        Args:
+            key_columns (list, optional): Columns identifying a duplicate (e.g.
+                ['txn_ref_id']); the first row per key is kept.  None compares
+                whole rows, like `DataFrame.drop_duplicates()`.
+            memory_budget_bytes (int): In-memory hash storage before spilling to disk.
+            spill_dir (str, optional): Directory for spill files (default: system temp).
+        """
+        self.key_columns = list(key_columns) if key_columns else None
+        self.memory_budget_bytes = memory_budget_bytes
+        self.spill_dir = spill_dir
+        self.rows_seen = 0
+        self.duplicates_dropped = 0
+        self._runs = []  # Sorted, unique uint64 arrays held in memory
+        self._spilled = []  # (path, memory-mapped sorted array) pairs
+
+    def _hash(self, chunk):
+        if self.key_columns is not None:
+            missing = [col for col in self.key_columns if col not in chunk.columns]
+            if missing:
+                raise ValueError(f"Deduplication key columns not found: {missing}")
+            chunk = chunk[self.key_columns]
+        return pd.util.hash_pandas_object(chunk, index=False).to_numpy()
+
+    @staticmethod
+    def _contains(run, hashes):
+        """Vectorized membership test of `hashes` in the sorted array `run`."""
+        if not len(run):
+            return np.zeros(len(hashes), dtype=bool)
+        positions = np.minimum(np.searchsorted(run, hashes), len(run) - 1)
+        return run[positions] == hashes
+
+    def _seen(self, hashes):
+        seen = np.zeros(len(hashes), dtype=bool)
+        for run in self._runs:
+            seen |= self._contains(run, hashes)
+        for _, run in self._spilled:
+            seen |= self._contains(run, hashes)
+        return seen
+
+    def _remember(self, hashes):
+        """Adds new (already unique) hashes, merging runs so that lookups stay few."""
+        self._runs.append(np.sort(hashes))
+        # Merge runs of similar size (a logarithmic number of runs remains).  Runs are
+        # disjoint, so a concatenate + in-place sort suffices (no union1d temporaries).
+        while len(self._runs) > 1 and len(self._runs[-2]) <= 2 * len(self._runs[-1]):
+            newest = self._runs.pop()
+            merged = np.concatenate((self._runs[-1], newest))
+            merged.sort(kind='stable')  # Merges the two sorted halves
+            self._runs[-1] = merged
+        if sum(run.nbytes for run in self._runs) > self.memory_budget_bytes:
+            self._spill()
+
+    def _spill(self):
+        merged = self._runs[0] if len(self._runs) == 1 else np.sort(np.concatenate(self._runs))
+        if self.spill_dir:
+            os.makedirs(self.spill_dir, exist_ok=True)
+        fd, path = tempfile.mkstemp(prefix='dedup_', suffix='.npy', dir=self.spill_dir)
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, merged)
+        self._spilled.append((path, np.load(path, mmap_mode='r')))
+        self._runs = []
+        logging.info(f"Deduplicator spilled {len(merged)} hashes ({merged.nbytes} bytes) to {path}")
+
+    def deduplicate(self, chunk):
+        """
+        Drops the rows of `chunk` that duplicate an earlier row of this chunk
+        or of any chunk passed in before.
+
+        Args:
+            chunk (pd.DataFrame): The next chunk.
+
+        Returns:
+            pd.DataFrame: The chunk's first occurrences (the chunk itself if it has no duplicates).
+        """
+        if chunk is None or chunk.empty:
+            return chunk
+        hashes = self._hash(chunk)
+        duplicated = pd.Series(hashes).duplicated().to_numpy() | self._seen(hashes)
+        self.rows_seen += len(chunk)
+        if duplicated.any():
+            self.duplicates_dropped += int(duplicated.sum())
+            self._remember(hashes[~duplicated])
+            return chunk.take(np.flatnonzero(~duplicated))
+        self._remember(hashes)
+        return chunk
+
+    def iter_unique(self, chunks):
+        """
+        Yields every chunk with cross-chunk duplicates removed.  Each call
+        starts from an empty set of hashes and releases spill files at the end.
+
+        Args:
+            chunks (Iterable[pd.DataFrame]): The input chunks, e.g. a ChunkedDataset.
+
+        Yields:
+            pd.DataFrame: The deduplicated chunks (empty chunks are skipped).
+        """
+        self.close()
+        self.rows_seen = self.duplicates_dropped = 0
+        try:
+            for chunk in chunks:
+                unique = self.deduplicate(chunk)
+                if unique is not None and not unique.empty:
+                    yield unique
+            logging.info(f"Deduplicated {self.rows_seen} rows: {self.duplicates_dropped} duplicates dropped")
+        finally:
+            self.close()
+
+    @property
+    def memory_bytes(self):
+        """Bytes of hash storage currently held in memory."""
+        return sum(run.nbytes for run in self._runs)
+
+    def close(self):
+        """Forgets all hashes and deletes the spill files."""
+        self._runs = []
+        spilled, self._spilled = self._spilled, []
+        for path, _ in spilled:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,188 @@
+# preprocessing/exporter.py
+import gzip
+import logging
+import os
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+EXPORT_FORMATS = ('csv', 'csv.gz', 'csv.zst', 'parquet')
+# File name suffix per format, also used to infer the format from a path
+EXPORT_EXTENSIONS = {'csv': '.csv', 'csv.gz': '.csv.gz', 'csv.zst': '.csv.zst', 'parquet': '.parquet'}
+
+
+def format_from_path(file_path, default='csv'):
+    """Infers the export format from a file name ('out.csv.gz' -> 'csv.gz')."""
+    name = str(file_path).lower()
+    # Longest suffix first, so '.csv.gz' is not mistaken for '.csv'
+    for export_format, extension in sorted(EXPORT_EXTENSIONS.items(), key=lambda item: -len(item[1])):
+        if name.endswith(extension):
+            return export_format
+    return default
+
+
+def with_extension(file_path, export_format):
+    """Replaces a known export suffix of `file_path` with the one of `export_format`."""
+    path = str(file_path)
+    current = EXPORT_EXTENSIONS.get(format_from_path(path, None), '')
+    if current and path.lower().endswith(current):
+        path = path[:-len(current)]
+    return path + EXPORT_EXTENSIONS[export_format]
+
+
+class Exporter:
+    """
+    Writes DataFrames as CSV, gzip/zstd-compressed CSV or Parquet.
+
+    Whole frames or streams of chunks can be exported.  CSV is produced in
+    row chunks by a thread pool.  For gzip, each chunk
+    is also compressed in the pool (zlib releases the GIL) and written as a
+    separate gzip member, so the result is one valid .gz file.  zstd uses the
+    compressor's own worker threads, and Parquet uses pyarrow's.  Files are
+    written to a temporary name and renamed at the end, so readers never see
+    a partial export.  Rows, bytes written and throughput of the last export
+    are kept in `last_stats`.
+    """
+
+    def __init__(self, workers=4, chunk_rows=100_000, compression_level=6, parquet_compression='zstd'):
+        """
+        Args:
+            workers (int): Threads formatting/compressing CSV chunks.
+            chunk_rows (int): Rows per CSV chunk.
+            compression_level (int): gzip/zstd compression level.
+            parquet_compression (str): Parquet codec ('zstd', 'snappy', 'gzip' or 'none').
+        """
+        self.workers = max(1, workers)
+        self.chunk_rows = chunk_rows
+        self.compression_level = compression_level
+        self.parquet_compression = parquet_compression
+        self.last_stats = {}
+
+    def export(self, df, file_path, export_format=None, columns=None):
+        """
+        Exports a DataFrame.
+
+        Args:
+            df (pd.DataFrame): Dataframe to export.
+            file_path (str): Destination file.
+            export_format (str, optional): One of EXPORT_FORMATS.  Inferred from
+                `file_path` if not given.
+            columns (list, optional): Columns to export.  Defaults to all.
+
+        Returns:
+            dict: Export stats ('path', 'format', 'rows', 'bytes', 'seconds', 'rows_per_second').
+
+        Raises:
+            ValueError: If the format is unsupported, or zstd support is missing.
+        """
+        return self.export_chunks([df], file_path, export_format, columns)
+
+    def export_chunks(self, chunks, file_path, export_format=None, columns=None):
+        """
+        Exports a stream of DataFrame chunks as one file, holding only one
+        chunk at a time.  The first chunk sets the header (and Parquet schema).
+
+        Args:
+            chunks (Iterable[pd.DataFrame]): The chunks, e.g. a generator.
+            file_path (str): Destination file.
+            export_format (str, optional): One of EXPORT_FORMATS.  Inferred from
+                `file_path` if not given.
+            columns (list, optional): Columns to export.  Defaults to all.
+
+        Returns:
+            dict: Export stats ('path', 'format', 'rows', 'bytes', 'seconds', 'rows_per_second').
+
+        Raises:
+            ValueError: If the format is unsupported, or zstd support is missing.
+        """
+        export_format = export_format or format_from_path(file_path)
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format: {export_format}.  Use one of {EXPORT_FORMATS}.")
+        rows = 0
+
+        def counted():
+            nonlocal rows
+            for chunk in chunks:
+                if columns:
+                    chunk = chunk[columns]
+                rows += len(chunk)
+                yield chunk
+
+        started = time.perf_counter()
+        fd, tmp_path = tempfile.mkstemp(prefix='.export_', dir=os.path.dirname(os.path.abspath(file_path)))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                if export_format == 'parquet':
+                    self._write_parquet(counted(), f)
+                elif export_format == 'csv.zst':
+                    self._write_zstd(counted(), f)
+                else:
+                    compress = self._gzip if export_format == 'csv.gz' else None
+                    for i, chunk in enumerate(counted()):
+                        for block in self._csv_blocks(chunk, compress, header=i == 0):
+                            f.write(block)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+        seconds = time.perf_counter() - started
+        self.last_stats = {'path': file_path, 'format': export_format, 'rows': rows,
+                           'bytes': os.path.getsize(file_path), 'seconds': seconds,
+                           'rows_per_second': rows / seconds if seconds else float('inf')}
+        logging.info(f"Exported {rows} rows to {file_path} ({export_format}, {self.last_stats['bytes']} bytes) "
+                     f"in {seconds:.3f}s ({self.last_stats['rows_per_second']:.0f} rows/s)")
+        return self.last_stats
+
+    def _gzip(self, data):
+        return gzip.compress(data, compresslevel=self.compression_level)
+
+    def _format_chunk(self, df, start, compress, header):
+        data = df.iloc[start:start + self.chunk_rows].to_csv(index=False, header=header and start == 0).encode('utf-8')
+        return compress(data) if compress else data
+
+    def _csv_blocks(self, df, compress=None, header=True):
+        """Yields the (optionally compressed) CSV of `df` in order, formatting chunks concurrently."""
+        starts = range(0, max(len(df), 1), self.chunk_rows)  # An empty frame still gets its header
+        if self.workers == 1 or len(starts) == 1:
+            for start in starts:
+                yield self._format_chunk(df, start, compress, header)
+            return
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = deque()
+            for start in starts:
+                pending.append(executor.submit(self._format_chunk, df, start, compress, header))
+                if len(pending) >= 2 * self.workers:  # Bound the formatted chunks held in memory
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def _write_parquet(self, chunks, f):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        compression = 'none' if self.parquet_compression == 'none' else self.parquet_compression
+        writer = None
+        try:
+            for chunk in chunks:
+                if writer is None:
+                    table = pa.Table.from_pandas(chunk, preserve_index=False)
+                    writer = pq.ParquetWriter(f, table.schema, compression=compression)
+                else:
+                    # Later chunks are coerced to the first chunk's schema (e.g. all-null columns)
+                    table = pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+
+    def _write_zstd(self, chunks, f):
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError("zstd export needs the optional 'zstandard' package (pip install zstandard).")
+        compressor = zstandard.ZstdCompressor(level=self.compression_level, threads=self.workers)
+        with compressor.stream_writer(f, closefd=False) as writer:
+            for i, chunk in enumerate(chunks):
+                for block in self._csv_blocks(chunk, header=i == 0):
+                    writer.write(block)
@@ -0,0 +1,198 @@
+# preprocessing/parallel.py
+"""
+Multi-core execution of per-chunk preprocessing.
+
+Every input chunk is hash-partitioned on a key column (txn_ref_id), so all
+rows of a transaction land in the same partition.  The partitions are
+processed by a pool of worker processes.  Partitions never travel as
+pickled DataFrames: the parent writes each one as an Arrow IPC stream
+into a shared memory block, and the worker maps it without copying.  The
+worker returns its result as an Arrow IPC buffer.  Every row carries its
+input position in the index, and the parent sorts each chunk's merged
+results by it, so the output order does not depend on scheduling.
+"""
+import math
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from data_ingestion.schema import is_arrow_backed
+
+_worker_task = None  # The per-partition callable, installed in each worker by _init_worker
+
+
+def _ipc_size(table):
+    sink = pa.MockOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.size()
+
+
+def _to_shared_memory(df):
+    """Writes `df` as an Arrow IPC stream into a new shared memory block."""
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    size = _ipc_size(table)
+    block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    target = pa.py_buffer(block.buf)
+    with pa.ipc.new_stream(pa.FixedSizeBufferWriter(target), table.schema) as writer:
+        writer.write_table(table)
+    del target, writer  # The block can only be closed once no view on it remains
+    return block, size
+
+
+def _string_types_mapper(arrow_type):
+    """
+    Reads Arrow strings back as Arrow-backed columns.  Arrow's pandas metadata
+    would otherwise restore them as Python strings.
+    """
+    return pd.ArrowDtype(arrow_type) if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type) else None
+
+
+def _read_ipc(source, arrow_strings):
+    table = pa.ipc.open_stream(source).read_all()
+    return table.to_pandas(types_mapper=_string_types_mapper if arrow_strings else None)
+
+
+def _to_ipc_buffer(df):
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def _init_worker(task):
+    global _worker_task
+    _worker_task = task
+
+
+def _run_partition(name, size, arrow_strings=False):
+    """
+    Worker entry point: runs the installed task on one shared-memory partition.
+    The partition is read without copying, so the block stays mapped until
+    the result has been serialized (the block itself is owned by the parent).
+    """
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        view = block.buf[:size]
+        df = _read_ipc(pa.py_buffer(view), arrow_strings)
+        result, counters = _worker_task(df), None
+        if isinstance(result, tuple):
+            result, counters = result
+        buffer = None if result is None else _to_ipc_buffer(result)
+        del df, result
+        view.release()
+        return buffer, counters
+    finally:
+        block.close()
+
+
+class ParallelChunkProcessor:
+    """
+    Applies a DataFrame -> DataFrame task to chunks on a process pool.
+
+    The task must be picklable.  It is sent to each worker once, when the
+    worker starts, and must keep each row's index label (selecting,
+    filtering and renaming do).  A task may also return a (DataFrame,
+    counters) tuple; the counters (a dict of numbers, e.g. rows that failed
+    a conversion) are summed over all partitions into `counters`.
+    """
+
+    def __init__(self, task, workers=4, key_column='txn_ref_id', min_partition_rows=10_000, max_pending_chunks=None):
+        """
+        Args:
+            task (callable): Maps a partition DataFrame to its result DataFrame (or None).
+            workers (int): Worker processes.
+            key_column (str): Column to hash-partition on.  Whole rows are hashed
+                if the chunk does not have it.
+            min_partition_rows (int): Smaller chunks are split into fewer partitions.
+            max_pending_chunks (int, optional): Chunks in flight (default: 2 per worker).
+        """
+        self.task = task
+        self.workers = max(1, workers)
+        self.key_column = key_column
+        self.min_partition_rows = min_partition_rows
+        self.max_pending_chunks = max_pending_chunks or 2 * self.workers
+        self.counters = {}
+
+    def partition(self, chunk):
+        """Splits a chunk into at most `workers` partitions by the hash of its key column."""
+        parts = max(1, min(self.workers, math.ceil(len(chunk) / self.min_partition_rows)))
+        if parts == 1:
+            return [chunk]
+        keys = chunk[[self.key_column]] if self.key_column in chunk.columns else chunk
+        assignment = pd.util.hash_pandas_object(keys, index=False).to_numpy() % parts
+        return [chunk.take(np.flatnonzero(assignment == part)) for part in range(parts)]
+
+    def map(self, chunks):
+        """
+        Processes the chunks in parallel.
+
+        Args:
+            chunks (Iterable[pd.DataFrame]): Input chunks.
+
+        Yields:
+            pd.DataFrame: One result per input chunk with a non-empty result, in
+                input order.  Rows are in input order and indexed by their
+                position in the whole input.
+        """
+        offset = 0
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                 initargs=(self.task,)) as executor:
+            pending = deque()  # Per chunk: ([(future, shared memory block)], arrow_strings)
+            try:
+                for chunk in chunks:
+                    chunk = chunk.set_axis(pd.RangeIndex(offset, offset + len(chunk)))
+                    offset += len(chunk)
+                    # Chunks of the Arrow engine (DATAFRAME_ENGINE=pyarrow) keep their Arrow strings
+                    arrow_strings = any(is_arrow_backed(dtype) for dtype in chunk.dtypes)
+                    submitted = []
+                    for part in self.partition(chunk):
+                        if part.empty:
+                            continue
+                        block, size = _to_shared_memory(part)
+                        submitted.append((executor.submit(_run_partition, block.name, size, arrow_strings), block))
+                    pending.append((submitted, arrow_strings))
+                    if len(pending) >= self.max_pending_chunks:
+                        merged = self._merge(*pending.popleft())
+                        if merged is not None:
+                            yield merged
+                while pending:
+                    merged = self._merge(*pending.popleft())
+                    if merged is not None:
+                        yield merged
+            finally:
+                for submitted, _ in pending:
+                    for future, block in submitted:
+                        future.cancel()
+                        self._release(block)
+
+    def _merge(self, submitted, arrow_strings):
+        """Collects a chunk's partition results and restores the input row order."""
+        results = []
+        try:
+            for future, _ in submitted:
+                buffer, counters = future.result()
+                for name, value in (counters or {}).items():
+                    self.counters[name] = self.counters.get(name, 0) + value
+                if buffer is not None:
+                    results.append(_read_ipc(buffer, arrow_strings))
+        finally:
+            for _, block in submitted:
+                self._release(block)
+        results = [result for result in results if not result.empty]
+        if not results:
+            return None
+        merged = results[0] if len(results) == 1 else pd.concat(results)
+        return merged.sort_index(kind='stable')
+
+    @staticmethod
+    def _release(block):
+        block.close()
+        try:
+            block.unlink()
+        except FileNotFoundError:
+            pass
+
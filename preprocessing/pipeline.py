@@ -0,0 +1,262 @@
+# preprocessing/pipeline.py
+import copy
+import logging
+import math
+from itertools import chain
+import pandas as pd
+from data_ingestion.chunked_dataset import ChunkedDataset
+from preprocessing.exporter import Exporter, format_from_path
+from preprocessing.parallel import ParallelChunkProcessor
+
+
+class PreprocessingPipeline:
+    """
+    Out-of-core preprocessing: deduplicate -> clean -> categorize -> project -> export.
+
+    Each stage is a generator over DataFrame chunks, so only a bounded
+    number of chunks is alive at any time, whatever the size of the input.
+    The memory budget is split across the stages:
+    - Incoming chunks larger than a quarter of it are split before cleaning
+      (cleaning holds about two copies of a chunk).
+    - Up to another quarter is used to keep the result in memory.  Larger
+      results are served from the exported file instead, as a ChunkedDataset.
+    Cross-chunk duplicates are removed by a StreamingDeduplicator (whole
+    rows, or its key columns), which has its own memory budget.
+
+    The output matches the in-memory path (clean the whole frame, then
+    categorize, then rename), except for date formats.  Those are detected
+    from the first chunk rather than a sample of the whole column.
+
+    With `workers` > 1, cleaning and categorizing run on a process pool over
+    hash partitions of each chunk (see ParallelChunkProcessor).  Date formats
+    are resolved once up front, so every worker parses the same way and the
+    output is identical to a serial run.
+    """
+
+    def __init__(self, cleaner, categorizer, system_b_column, not_found_value, date_columns=None,
+                 deduplicator=None, columns=None, rename=None, bucket_export_dir=None,
+                 memory_budget_bytes=512 * 1024 * 1024, workers=1, key_column='txn_ref_id'):
+        """
+        Args:
+            cleaner (DataCleaner): Cleans each chunk.
+            categorizer (Categorizer): Partitions each chunk and exports the result.
+            system_b_column (str): The recon sub-status column.
+            not_found_value (str): Pattern of the statuses to keep.
+            date_columns (list | dict, optional): Passed to `DataCleaner.clean_data`.
+            deduplicator (StreamingDeduplicator, optional): Removes duplicates across chunks.
+            columns (list, optional): Columns to keep in the result.
+            rename (dict, optional): Column renames applied to the result.
+            bucket_export_dir (str, optional): Export every status bucket here.
+            memory_budget_bytes (int): Memory the pipeline may use.
+            workers (int): Worker processes for cleaning/categorizing (1: in process).
+            key_column (str): Column chunks are hash-partitioned on across workers.
+        """
+        self.cleaner = cleaner
+        self.categorizer = categorizer
+        self.system_b_column = system_b_column
+        self.not_found_value = not_found_value
+        self.date_columns = date_columns
+        self.deduplicator = deduplicator
+        self.columns = columns
+        self.rename = rename or {}
+        self.bucket_export_dir = bucket_export_dir
+        self.memory_budget_bytes = memory_budget_bytes
+        self.workers = workers
+        self.key_column = key_column
+        self.stats = {}
+
+    @property
+    def chunk_budget_bytes(self):
+        return self.memory_budget_bytes // 4
+
+    @property
+    def result_budget_bytes(self):
+        return self.memory_budget_bytes // 4
+
+    # --- Stages ---
+
+    def rechunk(self, chunks):
+        """Splits chunks that exceed the chunk budget into equal row slices."""
+        for chunk in chunks:
+            self.stats['rows_in'] = self.stats.get('rows_in', 0) + len(chunk)
+            size = chunk.memory_usage(deep=True).sum()
+            parts = max(1, math.ceil(size / self.chunk_budget_bytes))
+            if parts == 1:
+                yield chunk
+                continue
+            step = math.ceil(len(chunk) / parts)
+            for start in range(0, len(chunk), step):
+                yield chunk.iloc[start:start + step]
+
+    def deduplicate(self, chunks):
+        """Drops rows that duplicate a row of an earlier chunk (or of the same chunk)."""
+        if self.deduplicator is None:
+            yield from chunks
+            return
+        yield from self.deduplicator.iter_unique(chunks)
+
+    def clean(self, chunks):
+        """
+        Cleans each chunk (fill missing values, convert dates).  Date values
+        that could not be parsed are counted in `stats['unparsable_dates']`.
+        """
+        date_parser = self.cleaner.date_parser
+        for chunk in chunks:
+            before = sum(date_parser.unparsable_rows.values())
+            cleaned = self.cleaner.clean_data(chunk, date_columns=self.date_columns)
+            self.stats['unparsable_dates'] = (self.stats.get('unparsable_dates', 0)
+                                              + sum(date_parser.unparsable_rows.values()) - before)
+            if not cleaned.empty:
+                yield cleaned
+
+    def categorize(self, chunks):
+        """
+        Yields the rows of each chunk whose status matches, in input order.
+        With `bucket_export_dir`, every status bucket is also exported.
+        """
+        exported = set()  # Bucket files written so far; later chunks append to them
+        for chunk in chunks:
+            if self.bucket_export_dir:
+                partitions = self.categorizer.partition_data(chunk, self.system_b_column)
+                if partitions is not None:
+                    exported.update(self.categorizer.export_partitions(partitions, self.bucket_export_dir, self.columns,
+                                                                       append_to=exported).values())
+            selected = self.categorizer.categorize_data(chunk, self.system_b_column, self.not_found_value)
+            if selected is None:
+                raise ValueError(f"Could not categorize data on column '{self.system_b_column}'.")
+            if not selected.empty:
+                yield selected
+
+    def project(self, chunks):
+        """Keeps the result columns and renames them."""
+        for chunk in chunks:
+            if self.columns:
+                chunk = chunk[self.columns]
+            yield chunk.rename(columns=self.rename) if self.rename else chunk
+
+    def process_chunk(self, chunk):
+        """
+        Cleans, categorizes and projects a single chunk (the task run by workers).
+        Returns the result with this chunk's counters (see ParallelChunkProcessor).
+        """
+        return self._counted(lambda: next(self.project(self.categorize(self.clean([chunk]))), None))
+
+    def clean_chunk(self, chunk):
+        """Cleans a single chunk (the worker task when buckets are exported by the parent)."""
+        return self._counted(lambda: next(self.clean([chunk]), None))
+
+    def _counted(self, step):
+        before = self.stats.get('unparsable_dates', 0)
+        result = step()
+        return result, {'unparsable_dates': self.stats.get('unparsable_dates', 0) - before}
+
+    def iter_results(self, chunks):
+        """
+        Chains all stages lazily.
+
+        Args:
+            chunks (Iterable[pd.DataFrame]): Raw input chunks, e.g. a ChunkedDataset.
+
+        Yields:
+            pd.DataFrame: Result chunks.
+        """
+        prepared = self.deduplicate(self.rechunk(chunks))
+        if self.workers <= 1:
+            return self._with_header(self.project(self.categorize(self.clean(prepared))))
+
+        first = next(prepared, None)
+        if first is None:
+            return self._with_header(iter(()))
+        worker = self._worker_copy(first)
+        # Bucket files are written by this process only, so workers then stop after cleaning
+        task = worker.clean_chunk if self.bucket_export_dir else worker.process_chunk
+        processor = ParallelChunkProcessor(task, self.workers, self.key_column)
+        results = self._add_counters(processor, processor.map(chain([first], prepared)))
+        if self.bucket_export_dir:
+            results = self.project(self.categorize(results))
+        return self._with_header(results)
+
+    def _add_counters(self, processor, results):
+        """Passes results through, then adds the workers' counters to `stats`."""
+        yield from results
+        for name, value in processor.counters.items():
+            self.stats[name] = self.stats.get(name, 0) + value
+
+    def _worker_copy(self, sample):
+        """A copy of this pipeline for the workers, with date formats resolved from `sample`."""
+        date_columns = self.date_columns if isinstance(self.date_columns, dict) else dict.fromkeys(self.date_columns or [])
+        resolved = {}
+        for col, date_format in date_columns.items():
+            if not date_format and col in sample.columns:
+                self.cleaner.date_parser.parse(sample[col], col)  # Detects (and remembers) the formats
+                date_format = self.cleaner.date_parser.formats.get(col) or None
+            resolved[col] = date_format
+        worker = copy.copy(self)
+        worker.stats = {}
+        worker.date_columns = resolved
+        worker.deduplicator = None
+        worker.bucket_export_dir = None
+        worker.workers = 1
+        return worker
+
+    def _with_header(self, results):
+        """Passes results through; an empty result still yields its header."""
+        empty = True
+        for chunk in results:
+            empty = False
+            yield chunk
+        if empty and self.columns:
+            yield pd.DataFrame(columns=self._result_columns())
+
+    # --- Driver ---
+
+    def run(self, chunks, export_path, export_format=None, exporter=None):
+        """
+        Streams the input through all stages into the export file.
+
+        Args:
+            chunks (Iterable[pd.DataFrame]): Raw input chunks, e.g. a ChunkedDataset.
+            export_path (str): File receiving the result.
+            export_format (str, optional): One of EXPORT_FORMATS (default: from the path).
+            exporter (Exporter, optional): Writer for the result.
+
+        Returns:
+            tuple: (result, export stats).  The result is a DataFrame if it fits
+                the result budget, else a ChunkedDataset over the exported file.
+        """
+        exporter = exporter or Exporter()
+        export_format = export_format or format_from_path(export_path)
+        self.stats = {'rows_in': 0, 'unparsable_dates': 0}
+        kept, kept_bytes = [], 0
+
+        def collect(results):
+            nonlocal kept, kept_bytes
+            for chunk in results:
+                if kept is not None:
+                    kept.append(chunk)
+                    kept_bytes += chunk.memory_usage(deep=True).sum()
+                    if kept_bytes > self.result_budget_bytes:
+                        logging.info("Preprocessing result exceeds its memory budget; serving it from the export")
+                        kept = None
+                yield chunk
+
+        export_stats = exporter.export_chunks(collect(self.iter_results(chunks)), export_path, export_format)
+        self.stats.update(rows_out=export_stats['rows'], export=export_stats)
+        logging.info(f"Pipeline processed {self.stats['rows_in']} rows into {export_stats['rows']} result rows")
+        if kept is not None:
+            return (pd.concat(kept, ignore_index=True) if kept else pd.DataFrame()), export_stats
+        return ChunkedDataset(lambda: self._read_export(export_path, export_format),
+                              description=export_path), export_stats
+
+    def _result_columns(self):
+        return [self.rename.get(col, col) for col in self.columns or []]
+
+    def _read_export(self, file_path, export_format, chunk_rows=100_000):
+        """Reads the exported result back in chunks."""
+        if export_format == 'parquet':
+            import pyarrow.parquet as pq
+            for batch in pq.ParquetFile(file_path).iter_batches(batch_size=chunk_rows):
+                yield batch.to_pandas()
+            return
+        with pd.read_csv(file_path, chunksize=chunk_rows) as reader:
+            yield from reader
@@ -0,0 +1,139 @@
+# resolution_handler/classification_cache.py
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+
+def normalize_comment(comment):
+    """Case-folds a comment and collapses whitespace and surrounding punctuation ("Refund  processed." -> "refund processed")."""
+    text = re.sub(r"\s+", " ", str(comment)).strip().casefold()
+    return text.strip(" .,;:!?-")
+
+
+class ClassificationCache:
+    """
+    Persistent cache of comment classifications, in a SQLite file.
+
+    Entries are keyed by a SHA-256 of the normalized comment text plus the
+    model name and prompt version.  Repeated comments ("refund processed")
+    are then classified once, and a changed model or prompt never hits a
+    stale label.  Entries expire after `ttl_seconds`.  The least recently
+    used entries are evicted once the cache holds more than `max_entries`.
+    Hits and misses are counted in `hits` / `misses`.
+    """
+
+    _QUERY_CHUNK = 500  # Keys per SQL statement (SQLite limits bound parameters)
+
+    def __init__(self, path, max_entries=100_000, ttl_seconds=30 * 24 * 3600):
+        """
+        Args:
+            path (str): SQLite database file (created if missing).
+            max_entries (int): Maximum number of cached classifications.
+            ttl_seconds (float): Age after which an entry is ignored and removed (0: never).
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS classifications ("
+                               "key TEXT PRIMARY KEY, label TEXT NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS classifications_last_used ON classifications (last_used)")
+
+    @staticmethod
+    def key(comment, model_name, prompt_version):
+        """Returns the cache key of a comment classified by `model_name` with prompt `prompt_version`."""
+        payload = "\x1f".join([normalize_comment(comment), str(model_name), str(prompt_version)])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get_many(self, keys):
+        """
+        Looks up several keys at once.
+
+        Args:
+            keys (Iterable[str]): Cache keys.
+
+        Returns:
+            dict: key -> label for the keys with a live entry.
+        """
+        keys = list(dict.fromkeys(keys))
+        now = time.time()
+        found = {}
+        with self._lock, self._conn:
+            for start in range(0, len(keys), self._QUERY_CHUNK):
+                chunk = keys[start:start + self._QUERY_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(f"SELECT key, label, created FROM classifications WHERE key IN ({placeholders})",
+                                          chunk).fetchall()
+                live = [(key, label) for key, label, created in rows
+                        if not self.ttl_seconds or now - created <= self.ttl_seconds]
+                found.update(live)
+                if live:  # Mark as recently used
+                    self._conn.execute(f"UPDATE classifications SET last_used = ? WHERE key IN ({','.join('?' * len(live))})",
+                                       [now, *(key for key, _ in live)])
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, key):
+        """Returns the cached label of `key`, or None on a miss."""
+        return self.get_many([key]).get(key)
+
+    def put_many(self, items):
+        """
+        Stores classifications, then evicts expired and old entries if over budget.
+
+        Args:
+            items (Iterable[tuple]): (key, label) pairs; None labels are skipped.
+        """
+        now = time.time()
+        rows = [(key, label, now, now) for key, label in items if label is not None]
+        if not rows:
+            return
+        try:
+            with self._lock, self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO classifications (key, label, created, last_used) "
+                                       "VALUES (?, ?, ?, ?)", rows)
+        except sqlite3.Error as e:
+            logging.warning(f"Could not cache {len(rows)} classifications: {e}")
+            return
+        self.evict()
+
+    def put(self, key, label):
+        """Stores one classification."""
+        self.put_many([(key, label)])
+
+    def evict(self):
+        """Removes expired entries, then the least recently used ones beyond `max_entries`."""
+        with self._lock, self._conn:
+            if self.ttl_seconds:
+                self._conn.execute("DELETE FROM classifications WHERE created < ?", (time.time() - self.ttl_seconds,))
+            excess = self._conn.execute("SELECT COUNT(*) FROM classifications").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._conn.execute("DELETE FROM classifications WHERE key IN "
+                                   "(SELECT key FROM classifications ORDER BY last_used LIMIT ?)", (excess,))
+                logging.info(f"Evicted {excess} cached classifications")
+
+    def stats(self):
+        """Hit/miss counters since the cache was opened."""
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self)}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM classifications").fetchone()[0]
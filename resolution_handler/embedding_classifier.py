@@ -0,0 +1,229 @@
+# resolution_handler/embedding_classifier.py
+import asyncio
+import hashlib
+import logging
+import os
+import time
+import numpy as np
+from resolution_handler.classification_cache import normalize_comment
+
+LABELS = ("Resolved", "Unresolved")
+
+
+class EmbeddingClassifier:
+    """
+    Local k-nearest-neighbour classifier in front of the LLM.
+
+    Each comment is embedded with the SentenceTransformer model (the one
+    ResolutionActions already loads).  It is then labelled by a
+    similarity-weighted vote of its `k` nearest neighbours among comments
+    the LLM labelled before.  A prediction is accepted when the vote is at
+    least `confidence_threshold` and the neighbours are similar enough
+    (`min_similarity`).  Everything else goes to the LLM, and the LLM's
+    labels are added to the store, so the local tier covers more traffic
+    on every run.  A small random share of the confident predictions
+    (`audit_fraction`) is also sent to the LLM to measure agreement.
+
+    The store (normalized embeddings plus labels) is kept in a .npz file.
+    It holds at most `max_examples` examples; the oldest are dropped first.
+    """
+
+    def __init__(self, model, store_path=None, k=5, confidence_threshold=0.9, min_similarity=0.75,
+                 min_examples=50, max_examples=50_000, audit_fraction=0.05, query_chunk_rows=256, seed=None):
+        """
+        Args:
+            model (SentenceTransformer): Encoder, called as `model.encode(texts, ...)`.
+            store_path (str, optional): .npz file holding the labelled examples.
+            k (int): Neighbours per vote.
+            confidence_threshold (float): Minimum share of the weighted vote to accept a label.
+            min_similarity (float): Minimum mean cosine similarity of the neighbours.
+            min_examples (int): Examples needed before any local prediction is made.
+            max_examples (int): Maximum examples kept in the store.
+            audit_fraction (float): Share of confident predictions also sent to the LLM.
+            query_chunk_rows (int): Comments scored against the store at a time (bounds memory).
+            seed (int, optional): Seed of the audit sampling.  By default every
+                run audits a fresh random sample.
+        """
+        self.model = model
+        self.store_path = store_path
+        self.k = k
+        self.confidence_threshold = confidence_threshold
+        self.min_similarity = min_similarity
+        self.min_examples = min_examples
+        self.max_examples = max_examples
+        self.audit_fraction = audit_fraction
+        self.query_chunk_rows = query_chunk_rows
+        self._rng = np.random.default_rng(seed)
+        self.embeddings = np.empty((0, 0), dtype=np.float32)
+        self.labels = np.empty(0, dtype=np.int8)  # Index into LABELS
+        self._keys = []  # Normalized-comment digests, aligned with the embeddings
+        self.last_stats = {}
+        if store_path and os.path.exists(store_path):
+            self.load()
+
+    @staticmethod
+    def _key(comment):
+        return hashlib.sha256(normalize_comment(comment).encode('utf-8')).hexdigest()[:32]
+
+    def __len__(self):
+        return len(self.labels)
+
+    def embed(self, comments):
+        """
+        Embeds comments (each distinct normalized text once).
+
+        Returns:
+            np.ndarray: float32 unit vectors, one row per comment.
+        """
+        texts = [normalize_comment(comment) for comment in comments]
+        if not texts:
+            return np.empty((0, self.embeddings.shape[1] if len(self) else 0), dtype=np.float32)
+        uniques, inverse = np.unique(np.asarray(texts, dtype=object), return_inverse=True)
+        vectors = np.asarray(self.model.encode(list(uniques), convert_to_numpy=True, normalize_embeddings=True),
+                             dtype=np.float32)
+        return vectors[inverse]
+
+    def predict(self, comments, embeddings=None):
+        """
+        Labels comments by their nearest stored neighbours.
+
+        Args:
+            comments (list): Comment texts.
+            embeddings (np.ndarray, optional): Their embeddings, if already computed.
+
+        Returns:
+            tuple: (labels, confidences) - a list with "Resolved"/"Unresolved", or
+                None where the prediction is not confident, and the vote shares.
+        """
+        labels, confidences = [None] * len(comments), np.zeros(len(comments))
+        if len(self) < self.min_examples or not len(comments):
+            return labels, confidences
+        embeddings = self.embed(comments) if embeddings is None else embeddings
+        k = min(self.k, len(self))
+        for start in range(0, len(comments), self.query_chunk_rows):
+            similarities = embeddings[start:start + self.query_chunk_rows] @ self.embeddings.T
+            neighbours = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+            neighbour_sims = np.take_along_axis(similarities, neighbours, axis=1)
+            weights = np.clip(neighbour_sims, 1e-6, None)
+            resolved = (weights * (self.labels[neighbours] == 0)).sum(axis=1) / weights.sum(axis=1)
+            vote = np.where(resolved >= 0.5, 0, 1)
+            confidence = np.maximum(resolved, 1 - resolved)
+            confidences[start:start + len(vote)] = confidence
+            confident = (confidence >= self.confidence_threshold) & (neighbour_sims.mean(axis=1) >= self.min_similarity)
+            for offset in np.flatnonzero(confident):
+                labels[start + offset] = LABELS[vote[offset]]
+        return labels, confidences
+
+    def add(self, comments, labels, embeddings=None):
+        """
+        Adds labelled comments to the store (unlabelled and already stored comments are skipped).
+
+        Returns:
+            int: Number of examples added.
+        """
+        known = set(self._keys)
+        rows, keys, codes = [], [], []
+        for row, (comment, label) in enumerate(zip(comments, labels)):
+            key = self._key(comment)
+            if label not in LABELS or key in known:
+                continue
+            known.add(key)
+            rows.append(row)
+            keys.append(key)
+            codes.append(LABELS.index(label))
+        if not rows:
+            return 0
+        if embeddings is None:
+            vectors = self.embed([comments[row] for row in rows])
+        else:
+            vectors = np.asarray(embeddings, dtype=np.float32)[rows]
+        self.embeddings = vectors if not len(self) else np.vstack([self.embeddings, vectors])
+        self.labels = np.concatenate([self.labels, np.asarray(codes, dtype=np.int8)])
+        self._keys.extend(keys)
+        if len(self) > self.max_examples:
+            drop = len(self) - self.max_examples
+            self.embeddings, self.labels, self._keys = self.embeddings[drop:], self.labels[drop:], self._keys[drop:]
+        return len(rows)
+
+    async def classify_comments(self, order_ids, comments, llm_classifier, progress=None):
+        """
+        Classifies comments locally where confident, and with the LLM otherwise.
+
+        Args:
+            order_ids (list): The order IDs.
+            comments (list): The comments, aligned with `order_ids`.
+            llm_classifier (LLMClassifier): Fallback for the low-confidence comments.
+            progress (callable, optional): Called as `progress(done, total)`.
+
+        Returns:
+            list: "Resolved", "Unresolved" or None per comment, in input order.
+        """
+        order_ids, comments = list(order_ids), list(comments)
+        started = time.perf_counter()
+
+        def score():
+            embeddings = self.embed(comments) if comments else None
+            return embeddings, self.predict(comments, embeddings)[0]
+
+        # Encoding is CPU-bound; off the event loop, so concurrent LLM requests keep flowing
+        embeddings, local = await asyncio.to_thread(score)
+        local_seconds = time.perf_counter() - started
+
+        confident = [position for position, label in enumerate(local) if label is not None]
+        audited = sorted(self._rng.choice(confident, int(round(len(confident) * self.audit_fraction)), replace=False).tolist()
+                         ) if confident and self.audit_fraction else []
+        audited_set = set(audited)
+        fallback = [position for position, label in enumerate(local) if label is None or position in audited_set]
+        offset = len(comments) - len(fallback)
+        if progress and offset:
+            progress(offset, len(comments))
+
+        llm_labels = await llm_classifier.classify_comments(
+            [order_ids[position] for position in fallback], [comments[position] for position in fallback],
+            progress=(lambda done, total: progress(offset + done, len(comments))) if progress else None)
+
+        classifications = list(local)
+        for position, label in zip(fallback, llm_labels):
+            if label is not None or position not in audited_set:  # A failed audit keeps the local label
+                classifications[position] = label
+        checked = [position for position, label in zip(fallback, llm_labels) if position in audited_set and label]
+        agreed = sum(1 for position in checked if classifications[position] == local[position])
+        added = self.add([comments[position] for position in fallback], llm_labels,
+                         embeddings[fallback] if embeddings is not None and fallback else None)
+        if self.store_path and added:
+            await asyncio.to_thread(self.save)
+
+        answered_locally = len(comments) - len(fallback)
+        self.last_stats = {
+            'comments': len(comments), 'local': answered_locally, 'llm': len(fallback),
+            'calls_avoided': answered_locally / len(comments) if comments else 0.0,
+            'audited': len(checked), 'agreement': agreed / len(checked) if checked else None,
+            'local_ms_per_comment': 1000 * local_seconds / len(comments) if comments else 0.0,
+            'store_size': len(self), 'added': added,
+        }
+        agreement = f"{self.last_stats['agreement']:.0%}" if checked else "n/a"
+        logging.info(f"Local classifier labelled {answered_locally} of {len(comments)} comments "
+                     f"({self.last_stats['local_ms_per_comment']:.2f} ms/comment); {len(fallback)} went to the LLM "
+                     f"(agreement on {len(checked)} audited: {agreement}); store size {len(self)}")
+        return classifications
+
+    def save(self):
+        """Writes the store to `store_path` (atomically)."""
+        tmp_path = f"{self.store_path}.tmp.npz"
+        try:
+            if os.path.dirname(self.store_path):
+                os.makedirs(os.path.dirname(self.store_path), exist_ok=True)
+            np.savez(tmp_path, embeddings=self.embeddings, labels=self.labels, keys=np.asarray(self._keys, dtype='U32'))
+            os.replace(tmp_path, self.store_path)
+        except OSError as e:
+            logging.warning(f"Could not save the local classifier store: {e}")
+
+    def load(self):
+        """Reads the store from `store_path`; an unreadable store is ignored."""
+        try:
+            with np.load(self.store_path) as data:
+                self.embeddings = data['embeddings'].astype(np.float32)
+                self.labels = data['labels'].astype(np.int8)
+                self._keys = data['keys'].tolist()
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Ignoring unreadable local classifier store {self.store_path}: {e}")
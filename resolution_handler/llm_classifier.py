@@ -1,5 +1,8 @@
 # resolution_handler/llm_classifier.py
-from openai import OpenAI, RateLimitError, APIError, APIConnectionError  # Updated imports
+from openai import OpenAI, AsyncOpenAI, RateLimitError, APIError, APIConnectionError  # Updated imports
+import asyncio
+import hashlib
+import json
 import logging
 import os
 import re
@@ -8,18 +11,188 @@ import time
 class LLMClassifier:
     """
     Classifies resolution comments using an LLM (OpenAI GPT).
+
+    Comments can be classified one at a time (`classify_comment`) or all
+    at once with `classify_comments`.  The latter runs on the async client
+    with up to `max_concurrency` requests in flight, so throughput grows
+    with the limit until the provider's rate limit is reached.
+
+    With `batch_size` > 1, `classify_comments` packs several comments (with
+    their Transaction IDs) into one prompt and asks for a JSON array of
+    labels.  The instructions are then sent once per batch instead of once
+    per comment.  Batches are also capped by an estimated prompt token
+    budget.  Each response is validated item by item, and only the comments
+    without a valid label are sent again.
+
+    With a `cache`, `classify_comments` only sends comments whose normalized
+    text has no cached label for this model and prompt version.  Each
+    distinct comment is sent once per run, and new labels are stored as
+    soon as their batch completes.
     """
 
-    def __init__(self, api_key, model_name="gpt-3.5-turbo"):
+    # Prompt templates.  Every cache key includes `prompt_version`, which
+    # hashes the template(s) a run can use, so editing either one stops
+    # cached labels of the old prompt from being served.
+    PROMPT = """
+        Classify the resolution status for Order ID {order_id} from this comment: "{comment}".
+        Options: [Resolved, Unresolved].
+        Respond ONLY with one word: Resolved or Unresolved.
+        """
+    BATCH_PROMPT = (
+        "Classify the resolution status of each comment below.\n"
+        "Options: [Resolved, Unresolved].\n"
+        'Respond ONLY with JSON of the form {{"labels": [{{"id": <id>, "status": "Resolved" or "Unresolved"}}]}}, '
+        "with exactly one entry per comment.\n"
+        "Comments (JSON):\n{payload}"
+    )
+    # Bump when a label's meaning changes without any template edit (e.g. new response parsing)
+    PROMPT_VERSION = "1"
+
+    def __init__(self, api_key, model_name="gpt-3.5-turbo", max_concurrency=8, batch_size=1,
+                 max_batch_tokens=3000, cache=None):
         """
         Initializes the LLM classifier.
 
         Args:
             api_key (str): Your OpenAI API key.
             model_name (str):  The OpenAI model to use.  Defaults to "gpt-3.5-turbo".
+            max_concurrency (int): Maximum concurrent requests of `classify_comments`.
+            batch_size (int): Maximum comments per request of `classify_comments` (1: one request per comment).
+            max_batch_tokens (int): Estimated prompt tokens a batch may use.
+            cache (ClassificationCache, optional): Persistent cache used by `classify_comments`.
         """
         self.client = OpenAI(api_key=api_key)  # New client initialization
+        self.async_client = AsyncOpenAI(api_key=api_key)
         self.model_name = model_name
+        self.max_concurrency = max(1, max_concurrency)
+        self.batch_size = max(1, batch_size)
+        self.max_batch_tokens = max_batch_tokens
+        self.cache = cache
+        self.request_count = 0  # Chat completions sent by the async methods
+        # Comments, comments sent, requests and cache hits/misses of the last classify_comments
+        self.last_run_stats = {}
+
+    def _request(self, order_id, comment):
+        """Chat completion arguments for one comment."""
+        prompt = self.PROMPT.format(order_id=order_id, comment=comment)
+        return dict(
+            model=self.model_name,
+            messages=[
+                {"role": "system", "content": "You are a helpful assistant."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.2,
+            max_tokens=5,
+        )
+
+    def prompt_version(self, batch_size=None):
+        """
+        Version of the prompts `classify_comments` uses at `batch_size`:
+        `PROMPT_VERSION` plus a hash of the single-comment template and, when
+        batching, the batch template (batches of one use the single-comment prompt).
+        """
+        batch_size = batch_size or self.batch_size
+        templates = [self.PROMPT] + ([self.BATCH_PROMPT] if batch_size > 1 else [])
+        digest = hashlib.sha256("\x1f".join(templates).encode('utf-8')).hexdigest()[:12]
+        return f"{self.PROMPT_VERSION}-{digest}"
+
+    @staticmethod
+    def _parse_response(response):
+        """Returns "Resolved"/"Unresolved" from a completion, or None if the output is invalid."""
+        classification = response.choices[0].message.content.strip()
+
+        # Validate the LLM output using regex
+        if re.match(r"^(Resolved|Unresolved)$", classification, re.IGNORECASE):
+            return classification.capitalize()
+        logging.warning(f"Invalid LLM response: {classification}. Retrying...")
+        return None
+
+    @staticmethod
+    def estimate_tokens(text):
+        """Rough token count of `text` (about 4 characters per token)."""
+        return len(str(text)) // 4 + 1
+
+    def make_batches(self, pairs, batch_size=None, max_batch_tokens=None):
+        """
+        Groups comments into batches of at most `batch_size` comments and
+        `max_batch_tokens` estimated prompt tokens.  A comment that is over
+        the token budget on its own gets its own batch.
+
+        Args:
+            pairs (list): (order_id, comment) tuples.
+            batch_size (int, optional): Defaults to `self.batch_size`.
+            max_batch_tokens (int, optional): Defaults to `self.max_batch_tokens`.
+
+        Returns:
+            list: Batches, as lists of positions in `pairs`.
+        """
+        batch_size = max(1, batch_size or self.batch_size)
+        max_batch_tokens = max_batch_tokens or self.max_batch_tokens
+        batches, batch, tokens = [], [], 0
+        for position, (order_id, comment) in enumerate(pairs):
+            item_tokens = self.estimate_tokens(order_id) + self.estimate_tokens(comment) + 12  # JSON keys/quoting
+            if batch and (len(batch) >= batch_size or tokens + item_tokens > max_batch_tokens):
+                batches.append(batch)
+                batch, tokens = [], 0
+            batch.append(position)
+            tokens += item_tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _batch_request(self, items):
+        """Chat completion arguments for a batch of (key, order_id, comment) items."""
+        payload = json.dumps([{"id": key, "transaction_id": str(order_id), "comment": str(comment)}
+                              for key, order_id, comment in items], ensure_ascii=False)
+        prompt = self.BATCH_PROMPT.format(payload=payload)
+        return dict(
+            model=self.model_name,
+            messages=[
+                {"role": "system", "content": "You are a helpful assistant."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.2,
+            max_tokens=16 * len(items) + 16,
+            response_format={"type": "json_object"},
+        )
+
+    @staticmethod
+    def _parse_batch_response(content, keys):
+        """
+        Extracts the valid labels from a batch response.
+
+        Args:
+            content (str): The model output.
+            keys (list): The ids sent in the batch.
+
+        Returns:
+            dict: id -> "Resolved"/"Unresolved", for the ids with exactly one valid label.
+        """
+        text = re.sub(r"^```(?:json)?\s*|\s*```$", "", (content or "").strip())
+        try:
+            data = json.loads(text)
+        except ValueError:
+            logging.warning(f"Invalid JSON in batch LLM response: {text[:200]}")
+            return {}
+        if isinstance(data, dict):
+            data = data.get("labels", next((value for value in data.values() if isinstance(value, list)), []))
+        if not isinstance(data, list):
+            return {}
+
+        wanted = {str(key): key for key in keys}
+        labels, conflicting = {}, set()
+        for entry in data:
+            if not isinstance(entry, dict):
+                continue
+            key = wanted.get(str(entry.get("id")))
+            status = entry.get("status")
+            if key is None or not isinstance(status, str) or not re.match(r"^(Resolved|Unresolved)$", status.strip(), re.IGNORECASE):
+                continue
+            status = status.strip().capitalize()
+            if labels.get(key, status) != status:
+                conflicting.add(key)  # Contradictory labels for one comment: ask again
+            labels[key] = status
+        return {key: status for key, status in labels.items() if key not in conflicting}
 
     def classify_comment(self, order_id, comment, max_retries=3, retry_delay=5):
         """
@@ -34,29 +207,12 @@ class LLMClassifier:
         Returns:
             str: "Resolved" or "Unresolved", or None if classification fails.
         """
-        prompt = f"""
-        Classify the resolution status for Order ID {order_id} from this comment: "{comment}".
-        Options: [Resolved, Unresolved].
-        Respond ONLY with one word: Resolved or Unresolved.
-        """
         for attempt in range(max_retries):
             try:
-                response = self.client.chat.completions.create(  # Updated API call
-                    model=self.model_name,
-                    messages=[
-                        {"role": "system", "content": "You are a helpful assistant."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.2,
-                    max_tokens=5,
-                )
-                classification = response.choices[0].message.content.strip()
-
-                # Validate the LLM output using regex
-                if re.match(r"^(Resolved|Unresolved)$", classification, re.IGNORECASE):
-                    return classification.capitalize()
-                else:
-                    logging.warning(f"Invalid LLM response: {classification}. Retrying...")
+                response = self.client.chat.completions.create(**self._request(order_id, comment))  # Updated API call
+                classification = self._parse_response(response)
+                if classification:
+                    return classification
 
             except RateLimitError:  # Direct exception reference
                 logging.warning(f"Rate limit exceeded. Waiting {retry_delay} seconds before retrying...")
@@ -71,4 +227,157 @@ class LLMClassifier:
                 else:
                     return None
         logging.error(f"Failed to classify comment after {max_retries} attempts.")
-        return None
\ No newline at end of file
+        return None
+
+    async def aclassify_comment(self, order_id, comment, max_retries=3, retry_delay=5):
+        """
+        Async version of `classify_comment`, using the async client.
+
+        Args:
+            order_id (str): The ID of the order.
+            comment (str): The resolution comment.
+            max_retries (int): Maximum number of retries if the API call fails.
+            retry_delay (int): Delay in seconds between retries.
+
+        Returns:
+            str: "Resolved" or "Unresolved", or None if classification fails.
+        """
+        for attempt in range(max_retries):
+            try:
+                self.request_count += 1
+                response = await self.async_client.chat.completions.create(**self._request(order_id, comment))
+                classification = self._parse_response(response)
+                if classification:
+                    return classification
+
+            except RateLimitError:
+                logging.warning(f"Rate limit exceeded. Waiting {retry_delay} seconds before retrying...")
+                await asyncio.sleep(retry_delay)
+            except (APIConnectionError, APIError) as e:
+                logging.warning(f"API connection issue: {e}. Waiting {retry_delay} seconds...")
+                await asyncio.sleep(retry_delay)
+            except Exception as e:
+                logging.error(f"An unexpected error occurred: {e}")
+                if attempt < max_retries - 1:
+                    await asyncio.sleep(retry_delay)
+                else:
+                    return None
+        logging.error(f"Failed to classify comment after {max_retries} attempts.")
+        return None
+
+    async def aclassify_batch(self, pairs, max_retries=3, retry_delay=5):
+        """
+        Classifies several comments with one request per attempt.  Comments
+        without a valid label in the response are sent again, together as a
+        smaller batch, on the next attempt.
+
+        Args:
+            pairs (list): (order_id, comment) tuples.
+            max_retries (int): Maximum number of attempts.
+            retry_delay (int): Delay in seconds between retries after API errors.
+
+        Returns:
+            list: "Resolved", "Unresolved" or None per comment, in input order.
+        """
+        labels = {}
+        pending = list(range(len(pairs)))  # Keys are positions in the batch; Transaction IDs may repeat
+        for attempt in range(max_retries):
+            if not pending:
+                break
+            try:
+                self.request_count += 1
+                response = await self.async_client.chat.completions.create(
+                    **self._batch_request([(key, *pairs[key]) for key in pending]))
+                parsed = self._parse_batch_response(response.choices[0].message.content, pending)
+                labels.update(parsed)
+                missing = [key for key in pending if key not in parsed]
+                if missing:
+                    logging.warning(f"Batch LLM response lacks valid labels for {len(missing)} of {len(pending)} "
+                                    f"comments. Re-queuing them...")
+                pending = missing
+
+            except RateLimitError:
+                logging.warning(f"Rate limit exceeded. Waiting {retry_delay} seconds before retrying...")
+                await asyncio.sleep(retry_delay)
+            except (APIConnectionError, APIError) as e:
+                logging.warning(f"API connection issue: {e}. Waiting {retry_delay} seconds...")
+                await asyncio.sleep(retry_delay)
+            except Exception as e:
+                logging.error(f"An unexpected error occurred: {e}")
+                if attempt < max_retries - 1:
+                    await asyncio.sleep(retry_delay)
+                else:
+                    break
+        if pending:
+            logging.error(f"Failed to classify {len(pending)} comments of a batch after {max_retries} attempts.")
+        return [labels.get(key) for key in range(len(pairs))]
+
+    async def classify_comments(self, order_ids, comments, progress=None, max_concurrency=None,
+                                max_retries=3, retry_delay=5, batch_size=None, max_batch_tokens=None):
+        """
+        Classifies many comments concurrently.
+
+        Args:
+            order_ids (Iterable[str]): The order IDs.
+            comments (Iterable[str]): The comments, aligned with `order_ids`.
+            progress (callable, optional): Called as `progress(done, total)` after each request.
+            max_concurrency (int, optional): Requests in flight (default: `self.max_concurrency`).
+            max_retries (int): Maximum number of retries per comment (or batch).
+            retry_delay (int): Delay in seconds between retries.
+            batch_size (int, optional): Comments per request (default: `self.batch_size`).
+            max_batch_tokens (int, optional): Prompt token budget per batch (default: `self.max_batch_tokens`).
+
+        Returns:
+            list: "Resolved", "Unresolved" or None per comment, in input order.
+        """
+        pairs = list(zip(order_ids, comments))
+        semaphore = asyncio.Semaphore(max(1, max_concurrency or self.max_concurrency))
+        classifications = [None] * len(pairs)
+        todo = list(range(len(pairs)))  # Positions sent to the LLM
+        copies = {}  # Position sent -> later positions with the same normalized comment
+        keys = None
+        if self.cache is not None:
+            version = self.prompt_version(batch_size)
+            keys = [self.cache.key(comment, self.model_name, version) for _, comment in pairs]
+            cached = self.cache.get_many(keys)
+            todo, first = [], {}
+            for position, key in enumerate(keys):
+                if key in cached:
+                    classifications[position] = cached[key]
+                elif key in first:
+                    copies[first[key]].append(position)
+                else:
+                    first[key] = position
+                    copies[position] = []
+                    todo.append(position)
+        hits = len(pairs) - len(todo) - sum(len(others) for others in copies.values())
+        done = hits
+        if progress and done:
+            progress(done, len(pairs))
+
+        async def classify(batch):
+            nonlocal done
+            async with semaphore:
+                if len(batch) == 1:
+                    labels = [await self.aclassify_comment(*pairs[batch[0]], max_retries, retry_delay)]
+                else:
+                    labels = await self.aclassify_batch([pairs[position] for position in batch], max_retries, retry_delay)
+            for position, label in zip(batch, labels):
+                for target in [position, *copies.get(position, ())]:
+                    classifications[target] = label
+                done += 1 + len(copies.get(position, ()))
+            if keys is not None:
+                # Stored per batch, so an interrupted run keeps what it has classified
+                self.cache.put_many((keys[position], label) for position, label in zip(batch, labels))
+            if progress:
+                progress(done, len(pairs))
+
+        started, requests = time.perf_counter(), self.request_count
+        batches = self.make_batches([pairs[position] for position in todo], batch_size, max_batch_tokens)
+        await asyncio.gather(*(classify([todo[i] for i in batch]) for batch in batches))
+        seconds = time.perf_counter() - started
+        self.last_run_stats = {'comments': len(pairs), 'sent': len(todo), 'requests': self.request_count - requests,
+                               'cache_hits': hits, 'cache_misses': len(pairs) - hits, 'seconds': seconds}
+        logging.info(f"Classified {len(pairs)} comments with {self.last_run_stats['requests']} requests "
+                     f"({hits} cache hits) in {seconds:.1f}s ({len(pairs) / seconds if seconds else 0:.1f} comments/s)")
+        return classifications
@@ -0,0 +1,139 @@
+# resolution_handler/rule_classifier.py
+import json
+import logging
+import re
+import numpy as np
+import pandas as pd
+
+LABELS = ("Resolved", "Unresolved")
+
+# Keywords are matched as whole words/phrases, case-insensitively.  The
+# Resolved keywords also occur in open statements ("yet to be resolved",
+# "will be closed after refund", "never credited"); the negation pattern
+# makes those match both labels, so they fall through to the models.
+DEFAULT_RULES = [
+    {"name": "resolved", "label": "Resolved",
+     "keywords": ["resolved", "closed", "refund processed", "refunded", "settled", "reversal done", "credited"]},
+    {"name": "pending", "label": "Unresolved",
+     "keywords": ["pending", "awaiting", "unresolved", "under investigation", "in progress", "escalated",
+                  "follow up", "no response", "yet to be"],
+     "patterns": [r"\b(?:not|never|pending|(?:yet\s+)?to\s+be|will\s+(?:not\s+)?be|won'?t\s+be)"
+                  r"\s+(?:yet\s+)?(?:been\s+)?(?:resolved|closed|refund(?:ed)?\s+processed|processed|refunded"
+                  r"|settled|credited|reversed)\b"]},
+]
+
+
+class RuleClassifier:
+    """
+    Keyword/regex pre-classifier that labels obvious comments before the LLM.
+
+    Each rule has a label and compiles its keywords (whole words or phrases)
+    and regex patterns into one case-insensitive regex.  All rules are
+    evaluated vectorized over the distinct comments of the column, so
+    repeated comments cost nothing extra.  A comment is labelled only if the
+    rules it matches all agree on one label.  Comments that match no rule,
+    or rules with different labels ("not resolved yet, pending with bank"),
+    are left to the LLM.  `hits` counts, per rule, the comments that rule
+    helped label.
+    """
+
+    def __init__(self, rules=None):
+        """
+        Args:
+            rules (list, optional): Dicts with 'name', 'label' ("Resolved" or
+                "Unresolved"), and 'keywords' and/or 'patterns'.  Defaults to DEFAULT_RULES.
+
+        Raises:
+            ValueError: If a rule has an unknown label, nothing to match, or an invalid pattern.
+        """
+        self.rules = []
+        for position, rule in enumerate(DEFAULT_RULES if rules is None else rules):
+            name = rule.get("name") or f"rule_{position}"
+            if rule.get("label") not in LABELS:
+                raise ValueError(f"Rule '{name}' has label {rule.get('label')!r}; use one of {', '.join(LABELS)}.")
+            alternatives = [r"\b" + r"\s+".join(map(re.escape, keyword.split())) + r"\b"
+                            for keyword in rule.get("keywords", []) if keyword.strip()]
+            alternatives += list(rule.get("patterns", []))
+            if not alternatives:
+                raise ValueError(f"Rule '{name}' has no keywords or patterns.")
+            try:
+                regex = re.compile("|".join(f"(?:{alternative})" for alternative in alternatives), re.IGNORECASE)
+            except re.error as e:
+                raise ValueError(f"Rule '{name}' has an invalid pattern: {e}")
+            self.rules.append((name, rule["label"], regex))
+        self.hits = {name: 0 for name, _, _ in self.rules}
+        self.last_stats = {}
+
+    @classmethod
+    def from_file(cls, path):
+        """Loads the rules from a JSON file holding a list of rule dicts (see `__init__`)."""
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def classify(self, comments):
+        """
+        Labels the comments that the rules decide.
+
+        Args:
+            comments (Iterable[str]): The comments.
+
+        Returns:
+            list: "Resolved", "Unresolved", or None where no rule (or conflicting
+                rules) matched, in input order.
+        """
+        codes, uniques = pd.factorize(pd.Series(list(comments), dtype=object))
+        texts = pd.Series(uniques, dtype=object).astype(str)
+        matches = np.zeros((len(self.rules), len(uniques)), dtype=bool)
+        for row, (_, _, regex) in enumerate(self.rules):
+            matches[row] = texts.str.contains(regex, regex=True).to_numpy(dtype=bool)
+
+        label_codes = np.array([LABELS.index(label) for _, label, _ in self.rules])
+        matched_labels = np.zeros((len(LABELS), len(uniques)), dtype=bool)
+        for code in range(len(LABELS)):
+            matched_labels[code] = matches[label_codes == code].any(axis=0)
+        decided = matched_labels.sum(axis=0) == 1
+        unique_labels = np.where(decided, matched_labels.argmax(axis=0), -1)
+
+        # Broadcast back to the rows; factorize codes missing comments as -1
+        row_labels = np.where(codes >= 0, unique_labels[codes], -1)
+        present = codes >= 0
+        counts = np.bincount(codes[present], minlength=len(uniques))  # Rows per distinct comment
+        rule_hits = {}
+        for row, (name, _, _) in enumerate(self.rules):
+            hit_rows = int(counts[matches[row] & decided].sum())
+            rule_hits[name] = hit_rows
+            self.hits[name] += hit_rows
+        labelled = int((row_labels >= 0).sum())
+        conflicts = int(counts[matched_labels.sum(axis=0) > 1].sum())
+        self.last_stats = {'comments': len(codes), 'labelled': labelled, 'conflicts': conflicts,
+                           'rule_hits': rule_hits}
+        logging.info(f"Rules labelled {labelled} of {len(codes)} comments ({conflicts} with conflicting rules); "
+                     f"hits per rule: {rule_hits}")
+        return [LABELS[code] if code >= 0 else None for code in row_labels]
+
+    async def classify_comments(self, order_ids, comments, fallback, progress=None):
+        """
+        Labels comments by rule, and sends the rest to `fallback`.
+
+        Args:
+            order_ids (list): The order IDs.
+            comments (list): The comments, aligned with `order_ids`.
+            fallback (callable): Coroutine function `fallback(order_ids, comments, progress)`
+                returning one label (or None) per comment, e.g. an LLM classifier's.
+            progress (callable, optional): Called as `progress(done, total)`.
+
+        Returns:
+            list: "Resolved", "Unresolved" or None per comment, in input order.
+        """
+        order_ids, comments = list(order_ids), list(comments)
+        classifications = self.classify(comments)
+        rest = [position for position, label in enumerate(classifications) if label is None]
+        offset = len(comments) - len(rest)
+        if progress and offset:
+            progress(offset, len(comments))
+        if rest:
+            labels = await fallback([order_ids[position] for position in rest], [comments[position] for position in rest],
+                                    (lambda done, total: progress(offset + done, len(comments))) if progress else None)
+            for position, label in zip(rest, labels):
+                classifications[position] = label
+        return classifications
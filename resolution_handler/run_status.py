@@ -0,0 +1,37 @@
+# resolution_handler/run_status.py
+
+
+def resolution_status(run_stats, rule_stats=None, cache_enabled=False, local_stats=None):
+    """
+    Builds the status line of a resolution run from the classifiers' stats.
+
+    A stage that did not run in this call (e.g. the embedding classifier and
+    the LLM when the rules labelled every comment) has empty stats and is
+    reported as such instead of failing.
+
+    Args:
+        run_stats (dict): `LLMClassifier.last_run_stats` ({} if the LLM was not called).
+        rule_stats (dict, optional): `RuleClassifier.last_stats`, if rules are enabled.
+        cache_enabled (bool): Whether the classification cache is enabled.
+        local_stats (dict, optional): `EmbeddingClassifier.last_stats`, if it is enabled.
+
+    Returns:
+        str: The status line (without a final period).
+    """
+    if run_stats:
+        # Cache hits and repeats of a comment in the same run are never sent
+        status = (f"Resolution handling complete. {run_stats['sent']} comments sent to the LLM with "
+                  f"{run_stats['requests']} requests")
+    else:
+        status = "Resolution handling complete. No comments sent to the LLM"
+    if rule_stats:
+        status += (f"; rules: {rule_stats['labelled']} of {rule_stats['comments']} comments "
+                   f"(hits per rule: {rule_stats['rule_hits']})")
+    if cache_enabled and run_stats:
+        status += f"; classification cache: {run_stats['cache_hits']} hits, {run_stats['cache_misses']} misses"
+    if local_stats:
+        agreement = f"{local_stats['agreement']:.0%}" if local_stats['agreement'] is not None else "n/a"
+        status += (f"; local classifier: {local_stats['local']} of {local_stats['comments']} comments "
+                   f"({local_stats['calls_avoided']:.0%} of LLM calls avoided), "
+                   f"agreement with LLM {agreement} on {local_stats['audited']} audited")
+    return status
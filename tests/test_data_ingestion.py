@@ -4,8 +4,21 @@ import pytest
 import pandas as pd
 from data_ingestion.sftp_ingestor import SFTPIngestor
 from data_ingestion.file_upload_ingestor import FileUploadIngestor
+from data_ingestion.chunked_dataset import ChunkedDataset
+from data_ingestion.schema import IngestSchema, to_numpy_backed
+from data_ingestion.readers import file_type_from_path, read_frame, iter_frames
+from data_ingestion.sftp_pool import SFTPConnectionPool
+from data_ingestion.api_ingestor import APIIngestor
+from data_ingestion.http_cache import HTTPResponseCache
+from data_ingestion.dataset_cache import DatasetCache
 from unittest.mock import patch, MagicMock  # Import mock
 import io
+import paramiko
+import gzip
+import hashlib
+import bz2
+import zipfile
+import requests
 import os
 
 # --- Tests for SFTPIngestor ---
@@ -135,4 +148,701 @@ def test_file_upload_ingestor_unsupported_file_type():
 
   ingestor = FileUploadIngestor()
   with pytest.raises(ValueError, match="Unsupported file type"):
-    ingestor.ingest_data(b"some data", 'txt')  # Use bytes directly
\ No newline at end of file
+    ingestor.ingest_data(b"some data", 'txt')  # Use bytes directly
+
+def test_file_upload_ingestor_csv_chunks_from_bytes():
+  """Test streaming CSV ingestion from bytes yields fixed-size chunks."""
+
+  csv_data = "col1,col2\n1,2\n3,4\n5,6\n7,8\n9,10".encode('utf-8')
+  ingestor = FileUploadIngestor()
+  chunks = list(ingestor.ingest_chunks(csv_data, 'csv', chunksize=2))
+  assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+  full_df = pd.concat(chunks, ignore_index=True)
+  pd.testing.assert_frame_equal(full_df, ingestor.ingest_data(csv_data, 'csv'))
+
+def test_file_upload_ingestor_csv_chunks_from_path(tmpdir):
+  """Test streaming CSV ingestion directly from a file path."""
+
+  file_path = os.path.join(tmpdir, 'upload.csv')
+  with open(file_path, 'w', encoding='ISO-8859-1') as f:
+    f.write("col1,col2\n1,caf\xe9\n3,b\n")
+  ingestor = FileUploadIngestor()
+  chunks = list(ingestor.ingest_chunks(file_path, 'csv', chunksize=1))
+  assert len(chunks) == 2
+  assert chunks[0]['col2'].iloc[0] == 'caf\xe9'
+
+def test_file_upload_ingestor_chunks_unsupported_file_type():
+  """Test chunked ingestion rejects formats without a streaming reader eagerly."""
+
+  ingestor = FileUploadIngestor()
+  with pytest.raises(ValueError, match="Unsupported file type"):
+    ingestor.ingest_chunks(b"some data", 'parquet')
+
+def test_chunked_dataset_is_reiterable():
+  """Test that a ChunkedDataset re-opens its source on every iteration."""
+
+  csv_data = "col1\n1\n2\n3".encode('utf-8')
+  ingestor = FileUploadIngestor()
+  dataset = ChunkedDataset(lambda: ingestor.ingest_chunks(csv_data, 'csv', chunksize=2))
+  assert not dataset.empty
+  assert list(dataset.head(1)['col1']) == [1]
+  assert sum(len(chunk) for chunk in dataset) == 3
+  assert sum(len(chunk) for chunk in dataset) == 3
+
+# --- Tests for IngestSchema ---
+
+def test_file_upload_ingestor_csv_schema_projection():
+  """Test that the ingest schema skips unused columns and applies dtypes while parsing."""
+
+  csv_data = "txn_ref_id,extra,amount,status\n001,x,1.5,Not Found-SysB\n002,y,2,Matched".encode('utf-8')
+  schema = IngestSchema(columns=['txn_ref_id', 'amount', 'status', 'missing_col'],
+                        dtypes={'txn_ref_id': 'string', 'amount': 'float64'},
+                        categorical_columns=['status'])
+  ingestor = FileUploadIngestor(schema=schema)
+  df = ingestor.ingest_data(csv_data, 'csv')
+  assert list(df.columns) == ['txn_ref_id', 'amount', 'status']
+  assert list(df['txn_ref_id']) == ['001', '002']  # Leading zeros kept
+  assert df['amount'].dtype == 'float64'
+  assert isinstance(df['status'].dtype, pd.CategoricalDtype)
+
+def test_file_upload_ingestor_excel_schema_projection():
+  """Test that the ingest schema is also applied when parsing Excel."""
+
+  excel_buffer = io.BytesIO()
+  pd.DataFrame({'a': [1, 2], 'b': ['x', 'y'], 'd': ['2024-01-31', '2024-02-01']}).to_excel(excel_buffer, index=False)
+  schema = IngestSchema(columns=['a', 'd'], date_formats={'d': '%Y-%m-%d'})
+  df = FileUploadIngestor(schema=schema).ingest_data(excel_buffer.getvalue(), 'excel')
+  assert list(df.columns) == ['a', 'd']
+  assert pd.api.types.is_datetime64_any_dtype(df['d'])
+
+def test_file_upload_ingestor_chunks_apply_schema():
+  """Test that streamed chunks are projected by the ingest schema."""
+
+  csv_data = "a,b,c\n1,2,3\n4,5,6\n7,8,9".encode('utf-8')
+  ingestor = FileUploadIngestor(schema=IngestSchema(columns=['c', 'a']))
+  for chunk in ingestor.ingest_chunks(csv_data, 'csv', chunksize=2):
+    assert list(chunk.columns) == ['a', 'c']
+
+def test_ingest_schema_apply_to_parsed_frame():
+  """Test applying the schema to an already-parsed DataFrame (e.g. API JSON)."""
+
+  df = pd.DataFrame({'id': [1, 2], 'status': ['A', 'B'], 'noise': [0, 0]})
+  schema = IngestSchema(columns=['id', 'status'], dtypes={'id': 'string'}, categorical_columns=['status'])
+  result = schema.apply(df)
+  assert list(result.columns) == ['id', 'status']
+  assert result['id'].dtype == 'string'
+  assert isinstance(result['status'].dtype, pd.CategoricalDtype)
+
+@patch('paramiko.Transport')
+@patch('paramiko.SFTPClient.from_transport')
+def test_sftp_ingestor_fetch_data_applies_schema(mock_from_transport, mock_transport):
+    """Test that SFTP fetches are parsed through the ingest schema."""
+    mock_sftp = MagicMock()
+    mock_from_transport.return_value = mock_sftp
+    mock_sftp.open.return_value.__enter__.return_value = io.BytesIO(b"col1,col2,col3\n1,2,3\n4,5,6")
+
+    ingestor = SFTPIngestor('host', 22, 'user', 'pass', schema=IngestSchema(columns=['col3']))
+    df = ingestor.fetch_data('remote_path.csv', 'csv')
+    assert list(df.columns) == ['col3']
+    assert list(df['col3']) == [3, 6]
+
+# --- Tests for columnar (Parquet / Feather / Arrow IPC) ingestion ---
+
+@pytest.fixture
+def recon_df():
+    return pd.DataFrame({
+        'txn_ref_id': ['T1', 'T2', 'T3', 'T4'],
+        'recon_sub_status': ['Not Found-SysB', 'Matched', 'Not Found-SysB', 'Not Found-SysA'],
+        'unused': [1, 2, 3, 4],
+    })
+
+def _to_columnar_bytes(df, file_type):
+    buffer = io.BytesIO()
+    if file_type == 'parquet':
+        df.to_parquet(buffer, index=False)
+    else:
+        df.to_feather(buffer)
+    return buffer.getvalue()
+
+@pytest.mark.parametrize('file_type', ['parquet', 'feather', 'arrow'])
+def test_file_upload_ingestor_columnar_success(recon_df, file_type):
+    """Test that Parquet, Feather and Arrow IPC uploads round-trip."""
+    ingestor = FileUploadIngestor()
+    df = ingestor.ingest_data(_to_columnar_bytes(recon_df, file_type), file_type)
+    pd.testing.assert_frame_equal(df, recon_df)
+
+@pytest.mark.parametrize('file_type', ['parquet', 'arrow'])
+def test_file_upload_ingestor_columnar_pushdown(recon_df, file_type):
+    """Test that column projection and the row filter are applied by the columnar reader."""
+    schema = IngestSchema(columns=['txn_ref_id', 'recon_sub_status'], categorical_columns=['recon_sub_status'],
+                          row_filter=('recon_sub_status', 'Not Found-SysB'))
+    df = FileUploadIngestor(schema=schema).ingest_data(_to_columnar_bytes(recon_df, file_type), file_type)
+    assert list(df.columns) == ['txn_ref_id', 'recon_sub_status']
+    assert list(df['txn_ref_id']) == ['T1', 'T3']
+    assert isinstance(df['recon_sub_status'].dtype, pd.CategoricalDtype)
+
+@pytest.mark.parametrize('file_type', ['parquet', 'feather', 'arrow'])
+def test_file_upload_ingestor_columnar_filter_on_categorical_column(recon_df, file_type):
+    """Test that the pushed-down row filter works on a dictionary-encoded (categorical) status column."""
+    source = recon_df.astype({'recon_sub_status': 'category'})
+    schema = IngestSchema(row_filter=('recon_sub_status', 'Not Found-SysB'))
+    df = FileUploadIngestor(schema=schema).ingest_data(_to_columnar_bytes(source, file_type), file_type)
+    assert df is not None
+    assert list(df['txn_ref_id']) == ['T1', 'T3']
+
+def test_file_upload_ingestor_arrow_stream_format(recon_df):
+    """Test reading the Arrow IPC streaming format (no file footer)."""
+    import pyarrow as pa
+    table = pa.Table.from_pandas(recon_df, preserve_index=False)
+    buffer = io.BytesIO()
+    with pa.ipc.new_stream(buffer, table.schema) as writer:
+        writer.write_table(table)
+    schema = IngestSchema(row_filter=('recon_sub_status', 'SysA'))
+    df = FileUploadIngestor(schema=schema).ingest_data(buffer.getvalue(), 'arrow')
+    assert list(df['txn_ref_id']) == ['T4']
+
+def test_csv_row_filter_without_pushdown(recon_df):
+    """Test that the row filter also applies to CSV input."""
+    schema = IngestSchema(row_filter=('recon_sub_status', 'Not Found-SysB'))
+    df = FileUploadIngestor(schema=schema).ingest_data(recon_df.to_csv(index=False).encode('utf-8'), 'csv')
+    assert list(df['txn_ref_id']) == ['T1', 'T3']
+
+def test_file_type_from_path():
+    """Test mapping upload file names to reader file types."""
+    assert file_type_from_path('/tmp/gradio/recon.xlsx') == 'excel'
+    assert file_type_from_path('recon.PARQUET') == 'parquet'
+    assert file_type_from_path('recon.ipc') == 'arrow'
+    assert file_type_from_path('recon.csv') == 'csv'
+    assert file_type_from_path('/tmp/gradio/recon.csv.gz') == 'csv'
+    assert file_type_from_path('recon.parquet.zst') == 'parquet'
+    assert file_type_from_path('drop.zip') == 'csv'
+    assert file_type_from_path('notes.txt') == 'txt'
+
+# --- Tests for SFTPConnectionPool ---
+
+@patch('paramiko.Transport')
+@patch('paramiko.SFTPClient.from_transport')
+def test_sftp_pool_reuses_authenticated_transport(mock_from_transport, mock_transport):
+    """Test that several pooled fetches share one transport and one channel."""
+    mock_sftp = MagicMock()
+    mock_sftp.get_channel.return_value.closed = False
+    mock_sftp.open.side_effect = lambda *args: io.BytesIO(b"col1\n1\n2")
+    mock_from_transport.return_value = mock_sftp
+
+    pool = SFTPConnectionPool()
+    ingestor = SFTPIngestor('host', 22, 'user', 'pass', pool=pool)
+    assert len(ingestor.fetch_data('data.csv', 'csv')) == 2
+    assert len(ingestor.fetch_data('comments.csv', 'csv')) == 2
+    # A second ingestor for the same host/user also reuses the session
+    SFTPIngestor('host', 22, 'user', 'pass', pool=pool).fetch_data('data.csv', 'csv')
+
+    mock_transport.assert_called_once_with(('host', 22))
+    mock_transport.return_value.connect.assert_called_once_with(username='user', password='pass')
+    mock_from_transport.assert_called_once()
+    mock_transport.return_value.close.assert_not_called()
+
+@patch('paramiko.Transport')
+@patch('paramiko.SFTPClient.from_transport')
+def test_sftp_pool_replaces_dead_transport(mock_from_transport, mock_transport):
+    """Test that a transport failing its health check is reconnected."""
+    dead, alive = MagicMock(), MagicMock()
+    dead.is_active.return_value = False
+    mock_transport.side_effect = [dead, alive]
+
+    pool = SFTPConnectionPool()
+    with pool.sftp('host', 22, 'user', 'pass'):
+        pass
+    with pool.sftp('host', 22, 'user', 'pass'):
+        pass
+    assert mock_transport.call_count == 2
+    dead.close.assert_called_once()
+
+@patch('paramiko.Transport')
+@patch('paramiko.SFTPClient.from_transport')
+def test_sftp_pool_retires_dead_transport_in_use(mock_from_transport, mock_transport):
+    """Test that a dead transport still in use is closed only when its last user releases it."""
+    dead, alive = MagicMock(), MagicMock()
+    mock_transport.side_effect = [dead, alive]
+
+    pool = SFTPConnectionPool()
+    with pool.sftp('host', 22, 'user', 'pass'):
+        dead.is_active.return_value = False
+        with pool.sftp('host', 22, 'user', 'pass'):
+            dead.close.assert_not_called()
+        dead.close.assert_not_called()
+    dead.close.assert_called_once()
+    alive.close.assert_not_called()
+    assert mock_transport.call_count == 2
+
+@patch('paramiko.Transport')
+@patch('paramiko.SFTPClient.from_transport')
+def test_sftp_pool_evicts_idle_transports(mock_from_transport, mock_transport):
+    """Test idle eviction closes unused transports."""
+    pool = SFTPConnectionPool(idle_timeout=0)
+    with pool.sftp('host', 22, 'user', 'pass'):
+        pass
+    assert len(pool) == 1
+    pool.evict_idle()
+    assert len(pool) == 0
+    mock_transport.return_value.close.assert_called_once()
+
+@patch('paramiko.Transport')
+@patch('paramiko.SFTPClient.from_transport')
+def test_sftp_pool_caps_concurrent_channels(mock_from_transport, mock_transport):
+    """Test that no more than max_channels channels are open on one transport."""
+    import threading
+    import time
+    active, peak = [0], [0]
+    lock = threading.Lock()
+    mock_from_transport.side_effect = lambda transport: MagicMock()
+    pool = SFTPConnectionPool(max_channels=2)
+
+    def borrow():
+        with pool.sftp('host', 22, 'user', 'pass'):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+
+    threads = [threading.Thread(target=borrow) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] == 2
+    mock_transport.assert_called_once()
+
+# --- Tests for parallel multi-file SFTP fetch ---
+
+def _remote_entry(filename, size):
+    import stat
+    attributes = paramiko.SFTPAttributes()
+    attributes.filename = filename
+    attributes.st_size = size
+    attributes.st_mode = stat.S_IFREG | 0o644
+    return attributes
+
+@pytest.fixture
+def mock_partitioned_sftp():
+    """Patches paramiko so that /drop holds three CSV partitions and one other file."""
+    contents = {
+        '/drop/recon_2.csv': b"id\n3\n4",
+        '/drop/recon_1.csv': b"id\n1\n2",
+        '/drop/recon_3.csv': b"id\n5",
+        '/drop/readme.txt': b"not data",
+    }
+    opened = {}  # remote path -> mocked SFTPFile
+    with patch('paramiko.Transport'), patch('paramiko.SFTPClient.from_transport') as mock_from_transport:
+        def new_client(transport):
+            client = MagicMock()
+            client.get_channel.return_value.closed = False
+            client.listdir_attr.return_value = [_remote_entry(path.rsplit('/', 1)[1], len(data))
+                                                for path, data in contents.items()]
+            def open_remote(path, mode='r'):
+                remote_file = MagicMock()
+                remote_file.__enter__.return_value.read.return_value = contents[path]
+                opened[path] = remote_file.__enter__.return_value
+                return remote_file
+            client.open.side_effect = open_remote
+            return client
+        mock_from_transport.side_effect = new_client
+        yield opened
+
+def test_sftp_ingestor_fetch_many_concatenates_in_order(mock_partitioned_sftp):
+    """Test that all matching files are fetched and concatenated in file name order."""
+    ingestor = SFTPIngestor('host', 22, 'user', 'pass', pool=SFTPConnectionPool(max_channels=2))
+    df = ingestor.fetch_many('/drop/recon_*.csv', 'csv', max_workers=2)
+    assert list(df['id']) == [1, 2, 3, 4, 5]
+    stats = ingestor.last_fetch_stats
+    assert [f['path'] for f in stats['files']] == ['/drop/recon_1.csv', '/drop/recon_2.csv', '/drop/recon_3.csv']
+    assert stats['total_bytes'] == sum(f['bytes'] for f in stats['files'])
+    assert stats['wall_seconds'] > 0
+
+def test_sftp_ingestor_fetch_many_stream(mock_partitioned_sftp):
+    """Test streaming per-file frames without a caller-supplied pool."""
+    ingestor = SFTPIngestor('host', 22, 'user', 'pass')
+    frames = list(ingestor.fetch_many('/drop/recon_[12].csv', 'csv', as_stream=True))
+    assert [list(frame['id']) for frame in frames] == [[1, 2], [3, 4]]
+    assert ingestor.pool is None  # The private pool is closed again
+
+def test_sftp_ingestor_fetch_many_prefetches_large_files(mock_partitioned_sftp):
+    """Test that only files above the prefetch threshold use paramiko's prefetch."""
+    ingestor = SFTPIngestor('host', 22, 'user', 'pass', pool=SFTPConnectionPool())
+    with patch('data_ingestion.sftp_ingestor.PREFETCH_MIN_BYTES', 6):
+        ingestor.fetch_many('/drop/recon_*.csv', 'csv', max_prefetch_requests=16)
+    mock_partitioned_sftp['/drop/recon_1.csv'].prefetch.assert_called_once_with(6, 16)
+    mock_partitioned_sftp['/drop/recon_3.csv'].prefetch.assert_not_called()
+
+def test_sftp_ingestor_fetch_many_no_match(mock_partitioned_sftp):
+    """Test that a pattern without matches returns None."""
+    ingestor = SFTPIngestor('host', 22, 'user', 'pass', pool=SFTPConnectionPool())
+    assert ingestor.fetch_many('/drop/*.parquet', 'parquet') is None
+
+# --- Tests for incremental SFTP sync ---
+
+class _FakeRemoteFile(io.FileIO):
+    """Local file standing in for a paramiko SFTPFile."""
+    def prefetch(self, *args):
+        pass
+
+@pytest.fixture
+def fake_sftp_server(tmpdir):
+    """Patches paramiko so that SFTP paths resolve to files under a local 'remote' directory."""
+    remote_dir = tmpdir.mkdir('remote')
+    client = MagicMock()
+    client.get_channel.return_value.closed = False
+    client.stat.side_effect = lambda path: os.stat(str(remote_dir.join(path)))
+    client.opened = []
+    def open_remote(path, mode='r'):
+        client.opened.append(path)
+        return _FakeRemoteFile(str(remote_dir.join(path)), 'rb')
+    client.open.side_effect = open_remote
+    with patch('paramiko.Transport'), patch('paramiko.SFTPClient.from_transport', return_value=client):
+        yield remote_dir, client
+
+def test_sftp_ingestor_sync_skips_unchanged_files(fake_sftp_server, tmpdir):
+    """Test that an unchanged remote file is not transferred again."""
+    remote_dir, client = fake_sftp_server
+    remote_dir.join('recon.csv').write("id\n1\n2\n")
+    local_dir = str(tmpdir.join('mirror'))
+    ingestor = SFTPIngestor('host', 22, 'user', 'pass', pool=SFTPConnectionPool())
+
+    first = ingestor.sync('recon.csv', local_dir)
+    assert first[0]['status'] == 'downloaded'
+    assert first[0]['content_changed']
+    second = ingestor.sync('recon.csv', local_dir)
+    assert second[0]['status'] == 'unchanged'
+    assert second[0]['bytes_transferred'] == 0
+    assert client.opened == ['recon.csv']  # Only the first sync opened the file
+
+def test_sftp_ingestor_sync_fetches_only_appended_bytes(fake_sftp_server, tmpdir):
+    """Test that an append-only file is extended with just the new byte range."""
+    remote_dir, _ = fake_sftp_server
+    remote_file = remote_dir.join('recon.csv')
+    remote_file.write("id\n1\n2\n")
+    local_dir = str(tmpdir.join('mirror'))
+    ingestor = SFTPIngestor('host', 22, 'user', 'pass', pool=SFTPConnectionPool())
+    first = ingestor.sync('recon.csv', local_dir, append_only=True)[0]
+
+    remote_file.write("3\n4\n", mode='a')
+    os.utime(str(remote_file), (1, 2_000_000_000))
+    result = ingestor.sync('recon.csv', local_dir, append_only=True)[0]
+    assert result['status'] == 'appended'
+    assert result['bytes_transferred'] == 4
+    # The digest is chained over just the appended bytes, without re-reading the local copy
+    assert result['content_changed']
+    assert result['chain_digest'] == hashlib.sha256(first['chain_digest'].encode('ascii') + b"3\n4\n").hexdigest()
+    with open(result['local_path']) as f:
+        assert f.read() == "id\n1\n2\n3\n4\n"
+
+def test_sftp_ingestor_sync_redownloads_rewritten_file(fake_sftp_server, tmpdir):
+    """Test that a grown file whose old bytes changed is re-downloaded in full."""
+    remote_dir, _ = fake_sftp_server
+    remote_file = remote_dir.join('recon.csv')
+    remote_file.write("id\n1\n")
+    local_dir = str(tmpdir.join('mirror'))
+    ingestor = SFTPIngestor('host', 22, 'user', 'pass', pool=SFTPConnectionPool())
+    ingestor.sync('recon.csv', local_dir, append_only=True)
+
+    remote_file.write("id\n9\n8\n")
+    os.utime(str(remote_file), (1, 2_000_000_000))
+    result = ingestor.sync('recon.csv', local_dir, append_only=True)[0]
+    assert result['status'] == 'downloaded'
+    assert result['content_changed']
+
+def test_sftp_ingestor_fetch_incremental(fake_sftp_server, tmpdir):
+    """Test parsing the synced local copy."""
+    remote_dir, _ = fake_sftp_server
+    remote_dir.join('recon.csv').write("id,extra\n1,a\n2,b\n")
+    ingestor = SFTPIngestor('host', 22, 'user', 'pass', schema=IngestSchema(columns=['id']))
+    df = ingestor.fetch_incremental('recon.csv', 'csv', str(tmpdir.join('mirror')))
+    assert list(df.columns) == ['id']
+    assert list(df['id']) == [1, 2]
+
+# --- Tests for APIIngestor ---
+def _paged_api(records, total=None):
+    """Returns a fake `Session.get` serving `records` by page, offset or cursor."""
+    calls = []
+    def fake_get(url, params=None, timeout=None):
+        calls.append(dict(params))
+        if 'cursor' in params or ('limit' in params and 'offset' not in params):
+            start = int(params.get('cursor', 0))
+            size = params['limit']
+        elif 'offset' in params:
+            start, size = params['offset'], params['limit']
+        else:
+            start, size = (params['page'] - 1) * params['page_size'], params['page_size']
+        body = {'results': records[start:start + size]}
+        if total is not None:
+            body['total'] = total
+        if start + size < len(records):
+            body['next_cursor'] = str(start + size)
+        response = MagicMock(status_code=200)
+        response.json.return_value = body
+        return response
+    return fake_get, calls
+
+@pytest.mark.parametrize('pagination', ['page', 'offset', 'cursor'])
+def test_api_ingestor_fetch_all_paginations(pagination):
+    """Test that every pagination strategy returns all records in order."""
+    records = [{'txn_ref_id': str(i), 'amount': i} for i in range(23)]
+    fake_get, calls = _paged_api(records)
+    ingestor = APIIngestor('https://api.example.com', max_concurrency=3)
+    with patch.object(ingestor.session, 'get', side_effect=fake_get):
+        df = ingestor.fetch_all('/transactions', pagination=pagination, page_size=5)
+    assert list(df['amount']) == list(range(23))
+    assert ingestor.latency_summary()['records'] == 23
+
+def test_api_ingestor_fetch_all_uses_total():
+    """Test that a reported total avoids speculative requests past the last page."""
+    records = [{'id': i} for i in range(20)]
+    fake_get, calls = _paged_api(records, total=20)
+    ingestor = APIIngestor('https://api.example.com', max_concurrency=8)
+    with patch.object(ingestor.session, 'get', side_effect=fake_get):
+        df = ingestor.fetch_all('/transactions', page_size=5)
+    assert len(df) == 20
+    assert sorted(call['page'] for call in calls) == [1, 2, 3, 4]
+
+def test_api_ingestor_fetch_all_failure():
+    """Test that a failing page is logged and None returned."""
+    ingestor = APIIngestor('https://api.example.com')
+    response = MagicMock()
+    response.raise_for_status.side_effect = requests.exceptions.HTTPError("503")
+    with patch.object(ingestor.session, 'get', return_value=response):
+        assert ingestor.fetch_all('/transactions') is None
+
+def test_api_ingestor_session_headers():
+    """Test that the API key is sent on the pooled session."""
+    ingestor = APIIngestor('https://api.example.com', api_key='secret')
+    assert ingestor.session.headers['Authorization'] == 'Bearer secret'
+
+def _streamed_response(body, content_type='application/json', read_size=7):
+    response = MagicMock(status_code=200, encoding=None, headers={'Content-Type': content_type})
+    response.__enter__.return_value = response
+    response.iter_content.side_effect = lambda size: (body[i:i + read_size] for i in range(0, len(body), read_size))
+    return response
+
+@pytest.mark.parametrize('content_type,body', [
+    ('application/json', b'[{"id": 1, "note": "caf\xc3\xa9"}, {"id": 2, "note": "x"},\n {"id": 3, "note": "]"}]'),
+    ('application/x-ndjson', b'{"id": 1, "note": "caf\xc3\xa9"}\n{"id": 2, "note": "x"}\n\n{"id": 3, "note": "]"}'),
+])
+def test_api_ingestor_stream_data(content_type, body):
+    """Test streaming a JSON array / NDJSON body into bounded chunks."""
+    ingestor = APIIngestor('https://api.example.com')
+    with patch.object(ingestor.session, 'get', side_effect=lambda *a, **k: _streamed_response(body, content_type)):
+        chunks = list(ingestor.stream_data('/transactions', chunk_rows=2))
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    df = pd.concat(chunks, ignore_index=True)
+    assert list(df['id']) == [1, 2, 3]
+    assert list(df['note']) == ['café', 'x', ']']
+
+def test_api_ingestor_stream_data_truncated():
+    """Test that a truncated JSON array raises instead of silently dropping rows."""
+    ingestor = APIIngestor('https://api.example.com')
+    with patch.object(ingestor.session, 'get', return_value=_streamed_response(b'[{"id": 1}, {"id": 2')):
+        with pytest.raises(ValueError):
+            list(ingestor.stream_data('/transactions'))
+
+def test_api_ingestor_cache_revalidates(tmpdir):
+    """Test that a 304 is served from the on-disk cache."""
+    cache = HTTPResponseCache(str(tmpdir.join('cache')))
+    ingestor = APIIngestor('https://api.example.com', cache=cache)
+    first = MagicMock(status_code=200, headers={'ETag': '"v1"'})
+    first.json.return_value = [{'txn_ref_id': 'A', 'amount': 1.5}]
+    not_modified = MagicMock(status_code=304, headers={})
+    with patch.object(ingestor.session, 'get', side_effect=[first, not_modified]) as mock_get:
+        fresh = ingestor.fetch_data('/transactions', {'day': 1})
+        cached = ingestor.fetch_data('/transactions', {'day': 1})
+    assert mock_get.call_args.kwargs['headers'] == {'If-None-Match': '"v1"'}
+    pd.testing.assert_frame_equal(fresh, cached)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_http_cache_lru_eviction(tmpdir):
+    """Test that the least recently used entry is evicted past max_entries."""
+    cache = HTTPResponseCache(str(tmpdir), max_entries=2)
+    df = pd.DataFrame({'a': [1]})
+    for name in ('one', 'two'):
+        cache.store(name, name, df, etag=name)
+    cache.load('one')  # 'two' is now the least recently used
+    cache.store('three', 'three', df, etag='three')
+    assert cache.conditional_headers('two') == {}
+    assert cache.conditional_headers('one') == {'If-None-Match': 'one'}
+    assert len(HTTPResponseCache(str(tmpdir))) == 2
+
+# --- Tests for DatasetCache ---
+def test_file_upload_ingestor_dataset_cache(tmpdir):
+    """Test that a re-upload with the same schema is served from the cache with dtypes intact."""
+    cache = DatasetCache(str(tmpdir))
+    schema = IngestSchema(dtypes={'id': 'string'}, categorical_columns=['status'])
+    content = b"id,status,amount\nA,ok,1.5\nB,miss,2.0\n"
+    ingestor = FileUploadIngestor(schema=schema, cache=cache)
+    parsed = ingestor.ingest_data(content, 'csv')
+    with patch('data_ingestion.file_upload_ingestor.read_frame') as mock_read:
+        cached = ingestor.ingest_data(content, 'csv')
+        mock_read.assert_not_called()
+    pd.testing.assert_frame_equal(parsed, cached)
+    assert (cache.hits, cache.misses) == (1, 1)
+    # A different schema must not hit the entry parsed with the first one
+    assert FileUploadIngestor(cache=cache).ingest_data(content, 'csv')['status'].dtype == object
+
+def test_file_upload_ingestor_dataset_cache_per_excel_engine(tmpdir):
+    """Test that switching the Excel engine does not serve the other engine's cached frame."""
+    cache = DatasetCache(str(tmpdir))
+    content = _workbook_bytes({'Recon': pd.DataFrame({'id': [1, 2]})})
+    FileUploadIngestor(cache=cache, excel_engine='streaming').ingest_data(content, 'excel')
+    FileUploadIngestor(cache=cache, excel_engine='openpyxl').ingest_data(content, 'excel')
+    assert (cache.hits, cache.misses) == (0, 2)
+
+def test_dataset_cache_arrow_backed_hit(tmpdir):
+    """Test that an Arrow-backed load keeps the cached columns as Arrow (no NumPy conversion)."""
+    cache = DatasetCache(str(tmpdir))
+    cache.put('one', pd.DataFrame({'id': ['A', 'B'], 'amount': [1.5, 2.0]}))
+    df = cache.get('one', dtype_backend='pyarrow')
+    assert isinstance(df['id'].dtype, pd.ArrowDtype) and isinstance(df['amount'].dtype, pd.ArrowDtype)
+    assert list(df['id']) == ['A', 'B']
+    assert cache.get('one')['id'].dtype == object
+
+def test_dataset_cache_lru_eviction(tmpdir):
+    """Test that the least recently used dataset is evicted past max_entries."""
+    cache = DatasetCache(str(tmpdir), max_entries=2)
+    df = pd.DataFrame({'a': [1, 2]})
+    cache.put('one', df)
+    cache.put('two', df)
+    os.utime(os.path.join(str(tmpdir), 'two.arrow'), (1, 1))  # 'two' is now the least recently used
+    cache.put('three', df)
+    assert cache.get('two') is None
+    assert cache.get('one') is not None
+    assert len(cache) == 2
+
+def test_sftp_ingestor_fetch_incremental_uses_dataset_cache(fake_sftp_server, tmpdir):
+    """Test that an unchanged synced file is not re-parsed."""
+    remote_dir, _ = fake_sftp_server
+    remote_dir.join('recon.csv').write("id\n1\n2\n")
+    cache = DatasetCache(str(tmpdir.join('cache')))
+    ingestor = SFTPIngestor('host', 22, 'user', 'pass', cache=cache)
+    first = ingestor.fetch_incremental('recon.csv', 'csv', str(tmpdir.join('mirror')))
+    second = ingestor.fetch_incremental('recon.csv', 'csv', str(tmpdir.join('mirror')))
+    pd.testing.assert_frame_equal(first, second)
+    assert cache.hits == 1
+
+# --- Tests for streaming Excel ---
+def _workbook_bytes(sheets):
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer) as writer:
+        for name, df in sheets.items():
+            df.to_excel(writer, sheet_name=name, index=False)
+    return buffer.getvalue()
+
+def test_file_upload_ingestor_excel_chunks():
+    """Test that Excel uploads stream in chunks with the schema's projection and dtypes."""
+    df = pd.DataFrame({'txn_ref_id': ['001', '002', '003'], 'extra': [1, 2, 3], 'amount': [1, 2, 3.5]})
+    content = _workbook_bytes({'Summary': pd.DataFrame({'x': [0]}), 'Recon': df})
+    schema = IngestSchema(columns=['txn_ref_id', 'amount'], dtypes={'amount': 'float64'})
+    ingestor = FileUploadIngestor(schema=schema, sheet_name='Recon')
+    chunks = list(ingestor.ingest_chunks(content, 'excel', chunksize=2))
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    full_df = pd.concat(chunks, ignore_index=True)
+    assert list(full_df.columns) == ['txn_ref_id', 'amount']
+    assert list(full_df['txn_ref_id']) == ['001', '002', '003']
+    assert full_df['amount'].dtype == 'float64'
+
+@pytest.mark.parametrize('sheet_name', [1, 'Recon'])
+def test_file_upload_ingestor_excel_streaming_matches_pandas(sheet_name):
+    """Test that the streaming engine parses a sheet like pandas' openpyxl reader."""
+    df = pd.DataFrame({'id': [1, 2], 'name': ['a', None], 'when': pd.to_datetime(['2024-01-31', '2024-02-01'])})
+    content = _workbook_bytes({'Summary': pd.DataFrame({'x': [0]}), 'Recon': df})
+    streamed = FileUploadIngestor(sheet_name=sheet_name).ingest_data(content, 'excel')
+    expected = FileUploadIngestor(sheet_name=sheet_name, excel_engine='openpyxl').ingest_data(content, 'excel')
+    pd.testing.assert_frame_equal(streamed, expected)
+
+# --- Tests for compressed input ---
+def _zip_bytes(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+@pytest.mark.parametrize('compress', [gzip.compress, bz2.compress])
+def test_file_upload_ingestor_compressed_csv(compress):
+    """Test that gzip/bz2 input is detected from magic bytes, whatever the declared type."""
+    csv_data = "txn_ref_id,amount\nA,1.5\nB,2.0\n".encode('utf-8')
+    df = FileUploadIngestor().ingest_data(compress(csv_data), 'csv')
+    pd.testing.assert_frame_equal(df, FileUploadIngestor().ingest_data(csv_data, 'csv'))
+
+def test_file_upload_ingestor_gzip_chunks_from_path(tmpdir):
+    """Test streaming chunks straight out of a .csv.gz file."""
+    file_path = str(tmpdir.join('recon.csv.gz'))
+    with gzip.open(file_path, 'wb') as f:
+        f.write(b"col1\n1\n2\n3\n")
+    chunks = list(FileUploadIngestor().ingest_chunks(file_path, file_type_from_path(file_path), chunksize=2))
+    assert [list(chunk['col1']) for chunk in chunks] == [[1, 2], [3]]
+
+def test_file_upload_ingestor_zip_of_csvs():
+    """Test that every data file in a zip is ingested as one dataset, in name order."""
+    content = _zip_bytes({'part-2.csv': "id\n3\n", 'part-1.csv.gz': gzip.compress(b"id\n1\n2\n"),
+                          'nested/': '', '__MACOSX/._part-1.csv': 'junk'})
+    ingestor = FileUploadIngestor()
+    assert list(ingestor.ingest_data(content, 'csv')['id']) == [1, 2, 3]
+    assert [len(chunk) for chunk in ingestor.ingest_chunks(content, 'csv', chunksize=5)] == [2, 1]
+
+def test_file_upload_ingestor_zip_with_excel_member():
+    """Test that zip members are typed by their names, and an .xlsx is not taken for an archive."""
+    workbook = _workbook_bytes({'Sheet1': pd.DataFrame({'id': [1, 2]})})
+    assert list(FileUploadIngestor().ingest_data(workbook, 'excel')['id']) == [1, 2]
+    content = _zip_bytes({'recon.xlsx': workbook})
+    assert list(FileUploadIngestor().ingest_data(content, 'csv')['id']) == [1, 2]
+
+def test_sftp_ingestor_fetch_gzip(fake_sftp_server):
+    """Test that a gzipped SFTP drop is decompressed while parsing."""
+    remote_dir, _ = fake_sftp_server
+    remote_dir.join('recon.csv.gz').write_binary(gzip.compress(b"id,amount\n1,2.5\n"))
+    ingestor = SFTPIngestor('host', 22, 'user', 'pass', pool=SFTPConnectionPool())
+    df = ingestor.fetch_data('recon.csv.gz', 'csv')
+    assert list(df['amount']) == [2.5]
+
+# --- Arrow-backed dataframe engine ---
+
+def _engine_frame():
+    return pd.DataFrame({'txn_ref_id': ['T1', 'T2', None, 'T4'], 'amount': [1.5, None, 3.0, 4.25],
+                         'count': [1, None, 3, 4], 'recon_sub_status': ['Not Found-SysB', 'Matched', None, 'Matched']})
+
+def _engine_schema(backend):
+    return IngestSchema(dtypes={'txn_ref_id': 'string', 'amount': 'float64'},
+                        categorical_columns=['recon_sub_status'], dtype_backend=backend)
+
+def test_schema_pyarrow_backend_read_kwargs():
+    """Test that declared dtypes map to Arrow-backed dtypes and the reader backend is set."""
+    kwargs = _engine_schema('pyarrow').read_kwargs()
+    assert kwargs['dtype_backend'] == 'pyarrow'
+    assert str(kwargs['dtype']['txn_ref_id']) == 'string[pyarrow]'
+    assert str(kwargs['dtype']['amount']) == 'double[pyarrow]'
+    assert kwargs['dtype']['recon_sub_status'] == 'category'
+    with pytest.raises(ValueError):
+        IngestSchema(dtype_backend='polars')
+
+@pytest.mark.parametrize('file_type', ['csv', 'parquet', 'excel'])
+def test_pyarrow_backend_matches_numpy_backend(file_type):
+    """Test that every reader yields Arrow-backed columns holding the same values as the NumPy engine."""
+    df = _engine_frame()
+    buffer = io.BytesIO()
+    if file_type == 'csv':
+        df.to_csv(buffer, index=False)
+    elif file_type == 'parquet':
+        df.to_parquet(buffer, index=False)
+    else:
+        df.to_excel(buffer, index=False)
+    content = buffer.getvalue()
+    numpy_df = read_frame(content, file_type, _engine_schema('numpy'))
+    arrow_df = read_frame(content, file_type, _engine_schema('pyarrow'))
+    assert all(isinstance(dtype, (pd.ArrowDtype, pd.CategoricalDtype)) for dtype in arrow_df.dtypes)
+    pd.testing.assert_frame_equal(to_numpy_backed(arrow_df).astype(numpy_df.dtypes.to_dict()), numpy_df)
+
+def test_pyarrow_backend_chunked_csv():
+    """Test that chunked CSV ingestion honours the Arrow backend."""
+    content = _engine_frame().to_csv(index=False).encode()
+    chunks = list(iter_frames(content, 'csv', 2, _engine_schema('pyarrow')))
+    assert len(chunks) == 2
+    assert str(chunks[0]['amount'].dtype) == 'double[pyarrow]'
@@ -3,6 +3,13 @@ import pytest
 import pandas as pd
 from preprocessing.data_cleaner import DataCleaner
 from preprocessing.categorizer import Categorizer
+from preprocessing.deduplicator import StreamingDeduplicator
+from preprocessing.date_parser import DateParser
+from preprocessing.exporter import Exporter, format_from_path, with_extension
+from preprocessing.pipeline import PreprocessingPipeline
+from preprocessing.parallel import ParallelChunkProcessor
+from data_ingestion.chunked_dataset import ChunkedDataset
+from data_ingestion.schema import to_arrow_backed, to_numpy_backed
 import logging
 import os
 from unittest.mock import MagicMock
@@ -164,4 +171,302 @@ def test_categorizer_export_to_csv_error_handling(tmpdir, caplog):
     with caplog.at_level(logging.ERROR):
         categorizer.export_to_csv(df, file_path)
 
-    assert "Error exporting data to CSV" in caplog.text
\ No newline at end of file
+    assert "Error exporting data to CSV" in caplog.text
+
+
+def test_data_cleaner_fill_na_categorical():
+    """Test filling NaN values in categorical columns (as produced by the ingest schema)."""
+    cleaner = DataCleaner()
+    df = pd.DataFrame({'status': pd.Categorical(['Not Found-SysB', None, 'Matched'])})
+    cleaned_df = cleaner.clean_data(df)
+    assert list(cleaned_df['status']) == ['Not Found-SysB', 'Unknown', 'Matched']
+
+def test_data_cleaner_inplace_mode():
+    """Test that in-place mode cleans and returns the caller's frame."""
+    cleaner = DataCleaner(inplace=True)
+    df = pd.DataFrame({'col1': [1, 1, None], 'col2': ['a', 'a', None]})
+    cleaned_df = cleaner.clean_data(df)
+    assert cleaned_df is df
+    assert list(df['col1']) == [1.0, 0.0]
+    assert list(df['col2']) == ['a', 'Unknown']
+
+def test_data_cleaner_default_mode_leaves_input_untouched():
+    """Test that the default mode does not modify its input."""
+    df = pd.DataFrame({'col1': [1, None], 'col2': ['a', None]})
+    original = df.copy()
+    DataCleaner().clean_data(df)
+    pd.testing.assert_frame_equal(df, original)
+
+def test_data_cleaner_step_stats():
+    """Test that per-step timings and allocations are recorded."""
+    cleaner = DataCleaner(track_memory=True)
+    df = pd.DataFrame({'col1': [1.0, None] * 50, 'date': ['2024-01-01'] * 100})
+    cleaner.clean_data(df, date_columns=['date'])
+    assert list(cleaner.last_stats) == ['drop_duplicates', 'fill_missing', 'convert_dates']
+    assert all(stats['seconds'] >= 0 for stats in cleaner.last_stats.values())
+    assert cleaner.last_stats['fill_missing']['bytes_allocated'] > 0
+
+def test_data_cleaner_duplicated_rows_matches_pandas():
+    """Test that the hash-based duplicate mask matches `DataFrame.duplicated`."""
+    df = pd.DataFrame({'a': [1, 2, 1, None, None, 2], 'b': ['x', 'y', 'x', 'z', 'z', 'x'],
+                       'c': pd.Categorical(['p', 'q', 'p', 'q', 'q', 'q'])})
+    assert list(DataCleaner.duplicated_rows(df)) == list(df.duplicated())
+
+# --- Tests for StreamingDeduplicator ---
+
+def test_streaming_deduplicator_across_chunks():
+    """Test that duplicates spanning chunk boundaries are removed, keeping first occurrences."""
+    df = pd.DataFrame({'id': [1, 2, 1, 3, 2, 4, 1], 'v': ['a', 'b', 'a', 'c', 'b', 'd', 'x']})
+    chunks = [df.iloc[i:i + 2] for i in range(0, len(df), 2)]
+    deduplicator = StreamingDeduplicator()
+    result = pd.concat(deduplicator.iter_unique(chunks))
+    pd.testing.assert_frame_equal(result, df.drop_duplicates())
+    assert deduplicator.duplicates_dropped == 2
+
+def test_streaming_deduplicator_key_columns():
+    """Test deduplicating on a key subset."""
+    df = pd.DataFrame({'txn_ref_id': ['T1', 'T2', 'T1'], 'amount': [1, 2, 3]})
+    result = pd.concat(StreamingDeduplicator(key_columns=['txn_ref_id']).iter_unique([df.iloc[:2], df.iloc[2:]]))
+    assert list(result['amount']) == [1, 2]
+
+def test_streaming_deduplicator_spills_to_disk(tmpdir):
+    """Test that hashes beyond the memory budget are spilled and still matched."""
+    deduplicator = StreamingDeduplicator(memory_budget_bytes=64, spill_dir=str(tmpdir))
+    chunks = [pd.DataFrame({'id': range(start, start + 10)}) for start in (0, 10, 5, 20)]
+    unique = deduplicator.iter_unique(chunks)
+    assert list(next(unique)['id']) == list(range(10))
+    assert os.listdir(str(tmpdir))  # 80 bytes of hashes exceeded the 64-byte budget
+    assert deduplicator.memory_bytes == 0
+    rest = list(unique)
+    assert [list(chunk['id']) for chunk in rest] == [list(range(10, 20)), list(range(20, 30))]
+    assert os.listdir(str(tmpdir)) == []  # Spill files removed when done
+
+# --- Tests for DateParser ---
+
+def test_date_parser_detects_mixed_formats():
+    """Test that a column mixing ISO and day-first dates is parsed with detected formats."""
+    parser = DateParser()
+    series = pd.Series(['2024-03-15', '31/01/2024', '2024-03-15', None, '15/02/2024'], name='sys_a_date')
+    parsed = parser.parse(series)
+    assert str(parsed.dtype) == 'datetime64[ns]'
+    assert list(parsed.dropna()) == [pd.Timestamp('2024-03-15'), pd.Timestamp('2024-01-31'),
+                                     pd.Timestamp('2024-03-15'), pd.Timestamp('2024-02-15')]
+    assert sorted(parser.formats['sys_a_date']) == ['%Y-%m-%d', '%d/%m/%Y']
+    assert parser.last_report['sys_a_date']['unparsable'] == 0
+
+def test_date_parser_reports_unparsable_and_memoizes():
+    """Test that unparsable values are reported and parsed values are reused across chunks."""
+    parser = DateParser()
+    parsed = parser.parse(pd.Series(['2024-01-01', 'not a date', 'not a date'], name='d'))
+    assert parsed.isna().sum() == 2
+    assert parser.last_report['d']['unparsable'] == 2
+    assert parser.last_report['d']['examples'] == ['not a date']
+    assert '2024-01-01' in parser._cache['d']
+    parser.parse(pd.Series(['2024-01-01'], name='d'))
+    assert parser.last_report['d']['unparsable'] == 0
+
+def test_date_parser_waits_for_text_values_to_detect():
+    """Test that a chunk without text values does not fix the column's formats."""
+    parser = DateParser()
+    assert parser.parse(pd.Series([None, None], name='d', dtype=object)).isna().all()
+    assert 'd' not in parser.formats
+    parsed = parser.parse(pd.Series(['31/01/2024', '15/02/2024'], name='d'))
+    assert parser.formats['d'] == ['%d/%m/%Y']
+    assert list(parsed) == [pd.Timestamp('2024-01-31'), pd.Timestamp('2024-02-15')]
+
+def test_date_parser_two_digit_years_and_no_guessing():
+    """Test that dd/mm/yy feeds are detected, and values no detected format matches count as unparsable."""
+    parser = DateParser()
+    parsed = parser.parse(pd.Series(['02/04/24', '30/07/24', '07/05/24', '2024-07-30'], name='sys_a_date'))
+    assert parser.formats['sys_a_date'][0] == '%d/%m/%y'
+    assert list(parsed[:3]) == [pd.Timestamp('2024-04-02'), pd.Timestamp('2024-07-30'), pd.Timestamp('2024-05-07')]
+
+    parser = DateParser()
+    parsed = parser.parse(pd.Series(['someday', 'later'], name='d'))
+    assert parsed.isna().all() and parser.last_report['d']['unparsable'] == 2
+    assert 'd' not in parser.formats  # An empty detection is not remembered
+    parser.parse(pd.Series(['2024-01-31'], name='d'))
+    assert parser.formats['d'] == ['%Y-%m-%d']
+
+def test_data_cleaner_date_columns_with_formats():
+    """Test that explicit per-column formats are honoured (month-first here)."""
+    cleaner = DataCleaner()
+    df = pd.DataFrame({'d': ['01/02/2024', '03/04/2024']})
+    cleaned_df = cleaner.clean_data(df, date_columns={'d': '%m/%d/%Y'})
+    assert list(cleaned_df['d']) == [pd.Timestamp('2024-01-02'), pd.Timestamp('2024-03-04')]
+
+def test_categorizer_partition_data_one_pass():
+    """Test that every status gets its own bucket, in input order, with missing statuses left out."""
+    categorizer = Categorizer()
+    df = pd.DataFrame({'status': ['Not Found-SysB', 'Matched', 'Not Found-SysA', None, 'Not Found-SysB'],
+                       'id': [1, 2, 3, 4, 5]})
+    partitions = categorizer.partition_data(df, 'status')
+    assert sorted(partitions) == ['Matched', 'Not Found-SysA', 'Not Found-SysB']
+    assert list(partitions['Not Found-SysB']['id']) == [1, 5]
+    assert list(categorizer.select_partitions(partitions, 'Not Found')['id']) == [1, 3, 5]
+    assert list(categorizer.categorize_data(df, 'status', 'Not Found-SysB')['id']) == [1, 5]
+
+def test_categorizer_export_partitions_appends_chunks(tmpdir):
+    """Test that bucket files are written per status and appended to for later chunks."""
+    categorizer = Categorizer()
+    first = categorizer.partition_data(pd.DataFrame({'status': ['Not Found-SysB', 'Matched'], 'id': [1, 2]}), 'status')
+    second = categorizer.partition_data(pd.DataFrame({'status': ['Not Found-SysB'], 'id': [3]}), 'status')
+    paths = categorizer.export_partitions(first, str(tmpdir))
+    assert os.path.basename(paths['Not Found-SysB']) == 'Not_Found_SysB.csv'
+    categorizer.export_partitions(second, str(tmpdir), append_to=set(paths.values()))
+    assert list(pd.read_csv(paths['Not Found-SysB'])['id']) == [1, 3]
+    assert list(pd.read_csv(paths['Matched'])['id']) == [2]
+
+def test_categorizer_export_partitions_colliding_names(tmpdir):
+    """Test that statuses sanitizing to the same file name get separate bucket files."""
+    categorizer = Categorizer()
+    first = categorizer.partition_data(pd.DataFrame({'status': ['Not Found-SysB'], 'id': [1]}), 'status')
+    second = categorizer.partition_data(pd.DataFrame({'status': ['Not Found SysB', 'Not Found-SysB'], 'id': [2, 3]}),
+                                        'status')
+    paths = categorizer.export_partitions(first, str(tmpdir))
+    paths.update(categorizer.export_partitions(second, str(tmpdir), append_to=set(paths.values())))
+    assert os.path.basename(paths['Not Found SysB']) == 'Not_Found_SysB_2.csv'
+    assert list(pd.read_csv(paths['Not Found-SysB'])['id']) == [1, 3]
+    assert list(pd.read_csv(paths['Not Found SysB'])['id']) == [2]
+
+# --- Tests for Exporter ---
+
+@pytest.mark.parametrize('file_name', ['out.csv', 'out.csv.gz', 'out.parquet'])
+def test_exporter_round_trip(tmpdir, file_name):
+    """Test that chunked, threaded CSV/gzip and Parquet exports read back identically, with stats."""
+    df = pd.DataFrame({'Transaction ID': [f'T{i}' for i in range(250)], 'Amount': [i * 1.5 for i in range(250)]})
+    exporter = Exporter(workers=3, chunk_rows=40)
+    file_path = os.path.join(str(tmpdir), file_name)
+    stats = exporter.export(df, file_path)
+    loaded = pd.read_parquet(file_path) if file_name.endswith('.parquet') else pd.read_csv(file_path)
+    pd.testing.assert_frame_equal(loaded, df)
+    assert stats['rows'] == 250 and stats['bytes'] == os.path.getsize(file_path)
+    assert stats['format'] == format_from_path(file_name)
+    assert [name for name in os.listdir(str(tmpdir)) if name.startswith('.export_')] == []
+
+def test_exporter_paths():
+    """Test format inference and suffix replacement for export paths."""
+    assert format_from_path('a/b.CSV.GZ') == 'csv.gz'
+    assert format_from_path('a/b.txt') == 'csv'
+    assert with_extension('processed/categorized_data.csv', 'parquet') == 'processed/categorized_data.parquet'
+    assert with_extension('temp/data.csv.gz', 'csv') == 'temp/data.csv'
+
+def test_categorizer_export_to_csv_gzip(tmpdir):
+    """Test that export_to_csv writes compressed output when the path asks for it."""
+    categorizer = Categorizer()
+    df = pd.DataFrame({'col1': [1, 2], 'col2': ['a', 'b']})
+    file_path = os.path.join(str(tmpdir), 'test.csv.gz')
+    stats = categorizer.export_to_csv(df, file_path)
+    with open(file_path, 'rb') as f:
+        assert f.read(2) == b'\x1f\x8b'
+    pd.testing.assert_frame_equal(pd.read_csv(file_path), df)
+    assert stats['rows'] == 2
+
+# --- Tests for PreprocessingPipeline ---
+
+def _recon_frame(n=600):
+    statuses = ['Not Found-SysB', 'Matched', 'Not Found-SysA', 'Amount Mismatch']
+    return pd.DataFrame({'txn_ref_id': [f'T{i % 500}' for i in range(n)],  # Rows 500+ repeat earlier rows
+                         'sys_a_amount_attribute_1': [float(i % 500) if i % 500 % 7 else None for i in range(n)],
+                         'sys_a_date': [f'2024-01-{i % 500 % 28 + 1:02d}' for i in range(n)],
+                         'recon_sub_status': [statuses[i % 500 % 4] for i in range(n)]})
+
+def _make_pipeline(**kwargs):
+    return PreprocessingPipeline(DataCleaner(), Categorizer(), 'recon_sub_status', 'Not Found-SysB',
+                                 ['sys_a_date'], StreamingDeduplicator(),
+                                 columns=['txn_ref_id', 'sys_a_amount_attribute_1', 'sys_a_date'],
+                                 rename={'txn_ref_id': 'Transaction ID'}, **kwargs)
+
+def test_pipeline_matches_in_memory_path(tmpdir):
+    """Test that streaming 64-row chunks gives the same result and export as cleaning the whole frame."""
+    df = _recon_frame()
+    cleaned = DataCleaner().clean_data(df, date_columns=['sys_a_date'])
+    expected = Categorizer().categorize_data(cleaned, 'recon_sub_status', 'Not Found-SysB')
+    expected = expected[['txn_ref_id', 'sys_a_amount_attribute_1', 'sys_a_date']].rename(
+        columns={'txn_ref_id': 'Transaction ID'}).reset_index(drop=True)
+
+    export_path = os.path.join(str(tmpdir), 'out.csv.gz')
+    result, stats = _make_pipeline().run([df.iloc[i:i + 64] for i in range(0, len(df), 64)], export_path)
+    pd.testing.assert_frame_equal(result, expected)
+    assert stats['rows'] == len(expected) == 125
+    exported = pd.read_csv(export_path, parse_dates=['sys_a_date'])
+    pd.testing.assert_frame_equal(exported, expected)
+
+def test_pipeline_serves_large_results_from_export(tmpdir):
+    """Test that results over the memory budget are re-read from the export, and big chunks are split."""
+    df = _recon_frame()
+    pipeline = _make_pipeline(memory_budget_bytes=4096)
+    result, _ = pipeline.run([df], os.path.join(str(tmpdir), 'out.parquet'))
+    assert isinstance(result, ChunkedDataset)
+    assert len(pd.concat(list(result))) == 125
+    assert pipeline.stats['rows_in'] == 600
+
+def _select_not_found(df):
+    """Module-level (picklable) task for the process pool tests."""
+    return Categorizer().categorize_data(df, 'recon_sub_status', 'Not Found-SysB')
+
+def test_parallel_processor_partitions_and_restores_order():
+    """Test that hash partitions processed by the pool merge back in input order."""
+    df = _recon_frame()
+    chunks = [df.iloc[:250], df.iloc[250:]]
+    processor = ParallelChunkProcessor(_select_not_found, workers=3, min_partition_rows=50)
+    parts = processor.partition(df)
+    assert len(parts) == 3 and sum(len(part) for part in parts) == len(df)
+    assert all(part['txn_ref_id'].isin(other['txn_ref_id']).sum() == 0
+               for i, part in enumerate(parts) for other in parts[i + 1:])  # Each key in one partition
+    result = pd.concat(processor.map(chunks))
+    expected = _select_not_found(df)
+    assert list(result.index) == list(expected.index)
+    pd.testing.assert_frame_equal(result, expected)
+
+def test_pipeline_parallel_matches_serial(tmpdir):
+    """Test that the process-pool pipeline gives the same result as the serial one."""
+    df = _recon_frame()
+    chunks = [df.iloc[i:i + 200] for i in range(0, len(df), 200)]
+    serial, _ = _make_pipeline().run(chunks, os.path.join(str(tmpdir), 'serial.csv'))
+    parallel, _ = _make_pipeline(workers=2).run(chunks, os.path.join(str(tmpdir), 'parallel.csv'))
+    pd.testing.assert_frame_equal(parallel, serial)
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_pipeline_counts_unparsable_dates(tmpdir, workers):
+    """Test that dates no format matches are counted in the pipeline stats, also across worker processes."""
+    df = _recon_frame()
+    df.loc[[3, 250, 420], 'sys_a_date'] = 'n/a'
+    chunks = [df.iloc[i:i + 200] for i in range(0, len(df), 200)]
+    pipeline = _make_pipeline(workers=workers)
+    pipeline.run(chunks, os.path.join(str(tmpdir), 'out.csv'))
+    assert pipeline.stats['unparsable_dates'] == 3
+
+# --- Engine parity: Arrow-backed vs NumPy-backed columns ---
+
+@pytest.mark.parametrize('workers', [1, 2])
+@pytest.mark.parametrize('export_format', ['csv', 'parquet'])
+def test_pipeline_pyarrow_engine_matches_numpy_engine(tmpdir, workers, export_format):
+    """Test that Arrow-backed input gives the same result and export bytes as NumPy-backed input."""
+    df = _recon_frame()
+    arrow_df = to_arrow_backed(df)
+    assert all(isinstance(dtype, pd.ArrowDtype) for dtype in arrow_df.dtypes)
+    outputs = {}
+    for engine, frame in (('numpy', df), ('pyarrow', arrow_df)):
+        path = os.path.join(str(tmpdir), f'{engine}.{export_format}')
+        chunks = [frame.iloc[i:i + 200] for i in range(0, len(frame), 200)]
+        outputs[engine], _ = _make_pipeline(workers=workers).run(chunks, path, export_format)
+    assert isinstance(outputs['pyarrow']['Transaction ID'].dtype, pd.ArrowDtype)
+    pd.testing.assert_frame_equal(to_numpy_backed(outputs['pyarrow']), outputs['numpy'])
+    if export_format == 'csv':
+        with open(os.path.join(str(tmpdir), 'numpy.csv'), 'rb') as a, open(os.path.join(str(tmpdir), 'pyarrow.csv'), 'rb') as b:
+            assert a.read() == b.read()
+    else:
+        pd.testing.assert_frame_equal(to_numpy_backed(pd.read_parquet(os.path.join(str(tmpdir), 'pyarrow.parquet'))),
+                                      pd.read_parquet(os.path.join(str(tmpdir), 'numpy.parquet')))
+
+def test_data_cleaner_pyarrow_engine_matches_numpy_engine():
+    """Test DataCleaner and Categorizer on Arrow-backed columns, including duplicates and nulls."""
+    df = pd.DataFrame({'id': ['a', 'b', 'a', None], 'amount': [1.0, None, 1.0, 2.0],
+                       'status': ['Not Found-SysB', 'Matched', 'Not Found-SysB', 'Not Found-SysB'],
+                       'date': ['2024-01-02', '2024-01-03', '2024-01-02', 'bad']})
+    results = {}
+    for engine, frame in (('numpy', df), ('pyarrow', to_arrow_backed(df))):
+        cleaned = DataCleaner().clean_data(frame, date_columns=['date'])
+        results[engine] = Categorizer().categorize_data(cleaned, 'status', 'Not Found-SysB')
+    pd.testing.assert_frame_equal(to_numpy_backed(results['pyarrow']), results['numpy'])
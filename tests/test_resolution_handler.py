@@ -3,9 +3,19 @@
 import pytest
 from resolution_handler.llm_classifier import LLMClassifier
 from resolution_handler.resolution_actions import ResolutionActions
+from resolution_handler.classification_cache import ClassificationCache
+from resolution_handler.embedding_classifier import EmbeddingClassifier
+from resolution_handler.rule_classifier import RuleClassifier
+from resolution_handler.run_status import resolution_status
 from unittest.mock import patch, MagicMock
 import openai
+import asyncio
+import json
 import os
+import re
+import time
+import zlib
+import numpy as np
 import pandas as pd
 from sklearn.cluster import KMeans
 
@@ -185,4 +195,479 @@ def test_resolution_actions_identify_pattern_missing_values():
         assert result_df.shape[0] == 2 # One row should be dropped.
         assert 'cluster' in result_df.columns
         assert list(result_df['cluster']) == [0, 0]  # Check the mocked values
-        mock_kmeans.fit_predict.assert_called()
\ No newline at end of file
+        mock_kmeans.fit_predict.assert_called()
+
+# --- Tests for concurrent LLM classification ---
+
+def _completion(content):
+    return MagicMock(choices=[MagicMock(message=MagicMock(content=content))])
+
+
+def _fake_async_create(latency, in_flight, responses=None):
+    """Async stand-in for chat.completions.create: labels by the comment text, tracks concurrency."""
+    async def create(**kwargs):
+        in_flight['now'] += 1
+        in_flight['max'] = max(in_flight['max'], in_flight['now'])
+        prompt = kwargs['messages'][1]['content']
+        await asyncio.sleep(latency(prompt))
+        in_flight['now'] -= 1
+        if responses:
+            return _completion(responses.pop(0))
+        return _completion('Unresolved' if 'pending' in prompt else 'Resolved')
+    return create
+
+
+def test_llm_classifier_classify_comments_bounded_and_ordered():
+    """Results come back in input order although later requests finish first."""
+    classifier = LLMClassifier('test_api_key', max_concurrency=4)
+    in_flight = {'now': 0, 'max': 0}
+    # Earlier orders answer slower, so completions arrive out of order
+    latency = lambda prompt: 0.002 * (20 - int(re.search(r'order(\d+)', prompt).group(1)))
+    classifier.async_client = MagicMock()
+    classifier.async_client.chat.completions.create = _fake_async_create(latency, in_flight)
+    order_ids = [f'order{i}' for i in range(20)]
+    comments = ['still pending' if i % 3 == 0 else 'refund processed' for i in range(20)]
+    progress_calls = []
+
+    result = asyncio.run(classifier.classify_comments(order_ids, comments,
+                                                      progress=lambda done, total: progress_calls.append((done, total))))
+
+    assert result == ['Unresolved' if i % 3 == 0 else 'Resolved' for i in range(20)]
+    assert in_flight['max'] == 4
+    assert progress_calls == [(done, 20) for done in range(1, 21)]
+
+
+def test_llm_classifier_classify_comments_scales_with_concurrency():
+    """Wall time drops with the concurrency limit (requests overlap)."""
+    classifier = LLMClassifier('test_api_key')
+    classifier.async_client = MagicMock()
+    classifier.async_client.chat.completions.create = _fake_async_create(lambda _: 0.02, {'now': 0, 'max': 0})
+    order_ids, comments = [f'order{i}' for i in range(40)], ['refund processed'] * 40
+
+    timings = {}
+    for limit in (1, 8):
+        started = time.perf_counter()
+        asyncio.run(classifier.classify_comments(order_ids, comments, max_concurrency=limit))
+        timings[limit] = time.perf_counter() - started
+    assert timings[8] < timings[1] / 3
+
+
+def test_llm_classifier_classify_comments_retries_invalid_response():
+    """Invalid outputs are retried per comment; exhausted retries give None."""
+    classifier = LLMClassifier('test_api_key', max_concurrency=1)
+    classifier.async_client = MagicMock()
+    classifier.async_client.chat.completions.create = _fake_async_create(
+        lambda _: 0, {'now': 0, 'max': 0}, responses=['Maybe', 'resolved', 'Maybe', 'Maybe'])
+
+    result = asyncio.run(classifier.classify_comments(['order1', 'order2'], ['done', '???'],
+                                                      max_retries=2, retry_delay=0))
+
+    assert result == ['Resolved', None]
+
+
+# --- Tests for batched LLM classification ---
+
+def _batch_items(kwargs):
+    """The (id, transaction_id, comment) items of a batch request."""
+    prompt = kwargs['messages'][1]['content']
+    return json.loads(prompt.split('Comments (JSON):\n', 1)[1])
+
+
+def _batch_labels(items, skip=()):
+    return json.dumps({'labels': [{'id': item['id'],
+                                   'status': 'Unresolved' if 'pending' in item['comment'] else 'Resolved'}
+                                  for item in items if item['transaction_id'] not in skip]})
+
+
+def test_llm_classifier_batched_requests():
+    """Comments are packed into batches; labels map back to input positions."""
+    classifier = LLMClassifier('test_api_key', batch_size=10)
+    requests = []
+
+    async def create(**kwargs):
+        items = _batch_items(kwargs)
+        requests.append(items)
+        assert kwargs['response_format'] == {'type': 'json_object'}
+        return _completion(_batch_labels(items))
+
+    classifier.async_client = MagicMock()
+    classifier.async_client.chat.completions.create = create
+    # Repeated Transaction IDs are fine: items are keyed by batch position
+    order_ids = [f'order{i % 30}' for i in range(45)]
+    comments = ['still pending' if i % 4 == 0 else 'refund processed' for i in range(45)]
+
+    result = asyncio.run(classifier.classify_comments(order_ids, comments))
+
+    assert result == ['Unresolved' if i % 4 == 0 else 'Resolved' for i in range(45)]
+    assert len(requests) == 5 and classifier.request_count == 5
+    assert [item['transaction_id'] for item in requests[0]] == order_ids[:10]
+
+
+def test_llm_classifier_batch_requeues_only_missing_items():
+    """A partial response re-sends only the comments without a valid label."""
+    classifier = LLMClassifier('test_api_key', batch_size=5)
+    responses = [
+        lambda items: _completion(_batch_labels(items, skip={'order1', 'order3'})),  # Two labels missing
+        lambda items: _completion('{"labels": [{"id": 1, "status": "Maybe"}, '
+                                  '{"id": 3, "status": "Resolved"}'),                 # Truncated JSON
+        lambda items: _completion('```json\n' + json.dumps([{'id': 1, 'status': 'unresolved'},
+                                                            {'id': 3, 'status': 'Resolved'}]) + '\n```'),
+    ]
+    requests = []
+
+    async def create(**kwargs):
+        items = _batch_items(kwargs)
+        requests.append([item['transaction_id'] for item in items])
+        return responses[len(requests) - 1](items)
+
+    classifier.async_client = MagicMock()
+    classifier.async_client.chat.completions.create = create
+
+    result = asyncio.run(classifier.classify_comments([f'order{i}' for i in range(5)], ['done'] * 5, retry_delay=0))
+
+    assert result == ['Resolved', 'Unresolved', 'Resolved', 'Resolved', 'Resolved']
+    assert requests == [[f'order{i}' for i in range(5)], ['order1', 'order3'], ['order1', 'order3']]
+
+
+def test_llm_classifier_parse_batch_response_rejects_invalid_items():
+    """Unknown ids, invalid labels and contradictory labels are dropped."""
+    content = json.dumps({'labels': [{'id': 0, 'status': 'Resolved'}, {'id': 1, 'status': 'Closed'},
+                                     {'id': 2, 'status': 'Resolved'}, {'id': 2, 'status': 'Unresolved'},
+                                     {'id': 7, 'status': 'Resolved'}, {'id': 3, 'status': ' unresolved '}]})
+    assert LLMClassifier._parse_batch_response(content, [0, 1, 2, 3]) == {0: 'Resolved', 3: 'Unresolved'}
+    assert LLMClassifier._parse_batch_response('not json', [0]) == {}
+
+
+def test_llm_classifier_make_batches_token_budget():
+    """Batches close at the comment limit or the token budget, whichever comes first."""
+    classifier = LLMClassifier('test_api_key', batch_size=10, max_batch_tokens=100)
+    pairs = [('order1', 'x' * 320), ('order2', 'short'), ('order3', 'short'), ('order4', 'x' * 1000),
+             ('order5', 'short')]
+    assert classifier.make_batches(pairs) == [[0], [1, 2], [3], [4]]
+    assert classifier.make_batches(pairs[1:3], batch_size=1) == [[0], [1]]
+
+
+# --- Tests for the classification cache ---
+
+def test_classification_cache_key_normalizes_comment():
+    """Case, whitespace and trailing punctuation don't change the key; model and prompt version do."""
+    key = ClassificationCache.key('Refund processed', 'gpt-3.5-turbo', '1')
+    assert ClassificationCache.key('  refund   PROCESSED. ', 'gpt-3.5-turbo', '1') == key
+    assert ClassificationCache.key('Refund processed', 'gpt-4o', '1') != key
+    assert ClassificationCache.key('Refund processed', 'gpt-3.5-turbo', '2') != key
+
+
+def test_classification_cache_persists_and_counts(tmpdir):
+    """Entries survive reopening the database; hits and misses are counted."""
+    path = os.path.join(str(tmpdir), 'cache', 'llm.sqlite')
+    cache = ClassificationCache(path)
+    cache.put_many([('a', 'Resolved'), ('b', 'Unresolved'), ('c', None)])
+    cache.close()
+
+    cache = ClassificationCache(path)
+    assert cache.get_many(['a', 'b', 'c']) == {'a': 'Resolved', 'b': 'Unresolved'}
+    assert cache.stats()['hits'] == 2 and cache.stats()['misses'] == 1 and len(cache) == 2
+
+
+def test_classification_cache_ttl_and_eviction(tmpdir):
+    """Expired entries miss; the least recently used entries are evicted first."""
+    path = os.path.join(str(tmpdir), 'llm.sqlite')
+    with patch('resolution_handler.classification_cache.time.time', return_value=1000.0):
+        cache = ClassificationCache(path, max_entries=2, ttl_seconds=100)
+        cache.put_many([('a', 'Resolved'), ('b', 'Resolved')])
+    with patch('resolution_handler.classification_cache.time.time', return_value=1050.0):
+        assert cache.get('a') == 'Resolved'  # 'b' is now the least recently used
+        cache.put('c', 'Unresolved')
+        assert cache.get_many(['a', 'b', 'c']) == {'a': 'Resolved', 'c': 'Unresolved'}
+    with patch('resolution_handler.classification_cache.time.time', return_value=1120.0):
+        assert cache.get('a') is None  # Expired
+        assert cache.get('c') == 'Unresolved'
+
+
+def test_llm_classifier_cache_skips_known_comments(tmpdir):
+    """Repeated comments are sent once; a re-run makes no requests."""
+    cache = ClassificationCache(os.path.join(str(tmpdir), 'llm.sqlite'))
+    in_flight = {'now': 0, 'max': 0}
+    classifier = LLMClassifier('test_api_key', batch_size=1, cache=cache)
+    classifier.async_client = MagicMock()
+    classifier.async_client.chat.completions.create = _fake_async_create(lambda _: 0, in_flight)
+    order_ids = [f'order{i}' for i in range(30)]
+    comments = [('Still pending' if i % 2 else 'Refund processed') + '.' * (i % 3) for i in range(30)]
+    expected = ['Unresolved' if i % 2 else 'Resolved' for i in range(30)]
+
+    assert asyncio.run(classifier.classify_comments(order_ids, comments)) == expected
+    assert classifier.last_run_stats['requests'] == 2 and classifier.last_run_stats['sent'] == 2
+    assert classifier.last_run_stats['cache_hits'] == 0 and classifier.last_run_stats['cache_misses'] == 30
+
+    progress_calls = []
+    assert asyncio.run(classifier.classify_comments(order_ids, comments,
+                                                    progress=lambda done, total: progress_calls.append(done))) == expected
+    assert classifier.last_run_stats['requests'] == 0 and classifier.last_run_stats['cache_hits'] == 30
+    assert classifier.last_run_stats['sent'] == 0
+    assert progress_calls == [30]
+
+
+def test_llm_classifier_cache_resumes_partial_run(tmpdir):
+    """Labels of completed batches are kept, so a re-run only sends the rest."""
+    cache = ClassificationCache(os.path.join(str(tmpdir), 'llm.sqlite'))
+    classifier = LLMClassifier('test_api_key', max_concurrency=1, batch_size=5, cache=cache)
+    comments = [f'comment {i}' for i in range(20)]
+
+    async def failing_create(**kwargs):
+        items = _batch_items(kwargs)
+        if items[0]['transaction_id'] == 'order10':
+            raise RuntimeError("Connection lost")
+        return _completion(_batch_labels(items))
+
+    classifier.async_client = MagicMock()
+    classifier.async_client.chat.completions.create = failing_create
+    first = asyncio.run(classifier.classify_comments([f'order{i}' for i in range(20)], comments,
+                                                     max_retries=1, retry_delay=0))
+    assert first[:10] == ['Resolved'] * 10 and first[10:15] == [None] * 5
+
+    requests = []
+
+    async def create(**kwargs):
+        items = _batch_items(kwargs)
+        requests.append([item['transaction_id'] for item in items])
+        return _completion(_batch_labels(items))
+
+    classifier.async_client.chat.completions.create = create
+    second = asyncio.run(classifier.classify_comments([f'order{i}' for i in range(20)], comments))
+    assert second == ['Resolved'] * 20
+    assert requests == [[f'order{i}' for i in range(10, 15)]]
+
+
+def test_llm_classifier_prompt_change_invalidates_cache(tmpdir):
+    """Editing the prompt a run uses changes the cache key; the other prompt only matters when batching."""
+    classifier = LLMClassifier('test_api_key', batch_size=1)
+    single = classifier.prompt_version()
+    classifier.BATCH_PROMPT = classifier.BATCH_PROMPT + "\nBe brief."
+    assert classifier.prompt_version() == single
+    batched = classifier.prompt_version(batch_size=10)
+    assert batched != single
+    classifier.PROMPT = classifier.PROMPT + "\nBe brief."
+    assert classifier.prompt_version() != single
+    assert classifier.prompt_version(batch_size=10) != batched
+
+
+# --- Tests for the local embedding classifier ---
+
+class _WordEncoder:
+    """Stand-in for the SentenceTransformer: hashed bag-of-words unit vectors."""
+
+    def __init__(self):
+        self.encoded = 0
+
+    def encode(self, texts, convert_to_numpy=True, normalize_embeddings=True):
+        self.encoded += len(texts)
+        vectors = np.zeros((len(texts), 256), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.split():
+                vectors[row, zlib.crc32(word.encode()) % 256] += 1
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-9)
+
+
+def _family_comments(n, offset=0):
+    return [f'refund processed for order {i}' if i % 2 else f'still pending with bank ref {i}'
+            for i in range(offset, offset + n)]
+
+
+def _family_labels(comments):
+    return ['Unresolved' if 'pending' in comment else 'Resolved' for comment in comments]
+
+
+def _counting_llm(sent):
+    classifier = LLMClassifier('test_api_key', batch_size=1)
+
+    async def create(**kwargs):
+        prompt = kwargs['messages'][1]['content']
+        sent.append(prompt)
+        return _completion('Unresolved' if re.search(r'pending|to be|will be|never', prompt, re.IGNORECASE) else 'Resolved')
+
+    classifier.async_client = MagicMock()
+    classifier.async_client.chat.completions.create = create
+    return classifier
+
+
+def test_embedding_classifier_confident_comments_skip_llm():
+    """Comments close to labelled examples are labelled locally; novel ones go to the LLM."""
+    local = EmbeddingClassifier(_WordEncoder(), min_examples=10, audit_fraction=0)
+    seed = _family_comments(40)
+    assert local.add(seed, _family_labels(seed)) == 40
+    assert local.add(seed[:5], _family_labels(seed[:5])) == 0  # Already stored
+
+    comments = _family_comments(20, offset=100) + ['customer disputes the chargeback amount']
+    sent = []
+    result = asyncio.run(local.classify_comments([f'order{i}' for i in range(21)], comments, _counting_llm(sent)))
+
+    assert result == _family_labels(comments)
+    assert len(sent) == 1 and 'chargeback' in sent[0]
+    assert local.last_stats['local'] == 20 and local.last_stats['llm'] == 1
+    assert local.last_stats['calls_avoided'] == pytest.approx(20 / 21)
+    assert len(local) == 41  # The LLM label was added to the store
+
+
+def test_embedding_classifier_audits_confident_predictions():
+    """A share of the confident predictions is checked against the LLM."""
+    local = EmbeddingClassifier(_WordEncoder(), min_examples=10, audit_fraction=0.25)
+    seed = _family_comments(40)
+    local.add(seed, _family_labels(seed))
+    comments = _family_comments(20, offset=100)
+    sent = []
+
+    result = asyncio.run(local.classify_comments([f'order{i}' for i in range(20)], comments, _counting_llm(sent)))
+
+    assert result == _family_labels(comments)
+    assert len(sent) == 5
+    assert local.last_stats['audited'] == 5 and local.last_stats['agreement'] == 1.0
+
+
+def test_embedding_classifier_audits_a_fresh_sample_each_run():
+    """Consecutive runs audit different comments, also once the store stops growing."""
+    local = EmbeddingClassifier(_WordEncoder(), min_examples=10, max_examples=40, audit_fraction=0.25, seed=0)
+    seed = _family_comments(40)
+    local.add(seed, _family_labels(seed))
+    comments = _family_comments(20, offset=100)
+    first, second = [], []
+
+    asyncio.run(local.classify_comments([f'order{i}' for i in range(20)], comments, _counting_llm(first)))
+    asyncio.run(local.classify_comments([f'order{i}' for i in range(20)], comments, _counting_llm(second)))
+
+    assert len(first) == len(second) == 5
+    assert first != second
+
+
+def test_embedding_classifier_encodes_off_the_event_loop():
+    """A slow encode does not block other coroutines on the event loop."""
+    class _SlowEncoder(_WordEncoder):
+        def encode(self, texts, **kwargs):
+            time.sleep(0.2)
+            return super().encode(texts, **kwargs)
+
+    local = EmbeddingClassifier(_SlowEncoder(), min_examples=10, audit_fraction=0)
+    seed = _family_comments(40)
+    local.add(seed, _family_labels(seed))
+    ticks = []
+
+    async def ticker():
+        while len(ticks) < 100:
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.01)
+
+    async def run():
+        task = asyncio.create_task(ticker())
+        await local.classify_comments(range(4), _family_comments(4, offset=100), _counting_llm([]))
+        task.cancel()
+
+    asyncio.run(run())
+    assert len(ticks) > 5
+
+
+def test_embedding_classifier_learns_and_persists(tmpdir):
+    """LLM labels grow the store; a new instance loads it and answers locally."""
+    store_path = os.path.join(str(tmpdir), 'store', 'embeddings.npz')
+    local = EmbeddingClassifier(_WordEncoder(), store_path, min_examples=10, audit_fraction=0)
+    sent = []
+    first = _family_comments(30)
+    assert asyncio.run(local.classify_comments(range(30), first, _counting_llm(sent))) == _family_labels(first)
+    assert len(sent) == 30 and local.last_stats['calls_avoided'] == 0
+
+    reloaded = EmbeddingClassifier(_WordEncoder(), store_path, min_examples=10, audit_fraction=0)
+    assert len(reloaded) == 30
+    sent.clear()
+    second = _family_comments(30, offset=200)
+    assert asyncio.run(reloaded.classify_comments(range(30), second, _counting_llm(sent))) == _family_labels(second)
+    assert sent == [] and reloaded.last_stats['calls_avoided'] == 1.0
+
+
+def test_embedding_classifier_store_is_bounded():
+    """The oldest examples are dropped beyond max_examples."""
+    local = EmbeddingClassifier(_WordEncoder(), max_examples=25)
+    comments = _family_comments(40)
+    local.add(comments, _family_labels(comments))
+    assert len(local) == 25 and local.embeddings.shape == (25, 256)
+    assert local.add(comments[:1], _family_labels(comments[:1])) == 1  # Dropped, so new again
+
+
+# --- Tests for the rule-based pre-classifier ---
+
+def test_rule_classifier_labels_obvious_comments():
+    """Keyword rules label clear comments; unmatched, conflicting and missing comments fall through."""
+    rules = RuleClassifier()
+    comments = ['Resolved', 'Ticket CLOSED.', 'pending with bank', 'Awaiting  confirmation',
+                'not resolved yet, pending with bank', 'unresolved', 'customer called twice', None,
+                'Refund processed', 'Resolved']
+
+    result = rules.classify(comments)
+
+    assert result == ['Resolved', 'Resolved', 'Unresolved', 'Unresolved', None, 'Unresolved', None, None,
+                      'Resolved', 'Resolved']
+    assert rules.last_stats['labelled'] == 7 and rules.last_stats['conflicts'] == 1
+    assert rules.last_stats['rule_hits'] == {'resolved': 4, 'pending': 3}
+    rules.classify(['closed'])
+    assert rules.hits == {'resolved': 5, 'pending': 3}
+
+
+def test_rule_classifier_custom_rules_from_file(tmpdir):
+    """Rules load from JSON; keywords match whole words only; patterns are regexes."""
+    path = os.path.join(str(tmpdir), 'rules.json')
+    with open(path, 'w') as f:
+        json.dump([{'name': 'done', 'label': 'Resolved', 'keywords': ['done']},
+                   {'name': 'ticket', 'label': 'Unresolved', 'patterns': [r'\bticket\s+#\d+\b']}], f)
+    rules = RuleClassifier.from_file(path)
+
+    assert rules.classify(['all done', 'abandoned', 'raised ticket #123', 'ticket']) == \
+        ['Resolved', None, 'Unresolved', None]
+
+
+@pytest.mark.parametrize('rule', [
+    {'name': 'bad_label', 'label': 'Maybe', 'keywords': ['x']},
+    {'name': 'empty', 'label': 'Resolved'},
+    {'name': 'bad_regex', 'label': 'Resolved', 'patterns': ['(unclosed']},
+])
+def test_rule_classifier_rejects_invalid_rules(rule):
+    with pytest.raises(ValueError):
+        RuleClassifier([rule])
+
+
+def test_rule_classifier_decides_everything_without_models():
+    """When the rules label every comment the models are never called, and the status still builds."""
+    rules = RuleClassifier()
+    local = EmbeddingClassifier(_WordEncoder(), min_examples=10)
+    llm = LLMClassifier('test_api_key')
+    llm.async_client = MagicMock()
+
+    async def fallback(order_ids, texts, progress):
+        return await local.classify_comments(order_ids, texts, llm, progress=progress)
+
+    result = asyncio.run(rules.classify_comments(['order0', 'order1'], ['Resolved', 'pending with bank'], fallback))
+
+    assert result == ['Resolved', 'Unresolved']
+    assert local.last_stats == {} and llm.last_run_stats == {}
+    status = resolution_status(llm.last_run_stats, rules.last_stats, True, local.last_stats)
+    assert status.startswith("Resolution handling complete. No comments sent to the LLM; rules: 2 of 2 comments")
+    assert 'local classifier' not in status and 'classification cache' not in status
+
+
+def test_rule_classifier_falls_through_to_llm():
+    """Only the rows the rules leave undecided reach the LLM, in input order."""
+    rules = RuleClassifier()
+    sent = []
+    llm = _counting_llm(sent)
+    comments = ['resolved', 'customer says the refund arrived', 'pending', 'still pending, see thread',
+                'amount mismatch being checked', 'Yet to be resolved by bank', 'Will be closed after refund',
+                'never credited to customer']
+    progress_calls = []
+
+    async def fallback(order_ids, texts, progress):
+        return await llm.classify_comments(order_ids, texts, progress=progress)
+
+    result = asyncio.run(rules.classify_comments([f'order{i}' for i in range(8)], comments, fallback,
+                                                 progress=lambda done, total: progress_calls.append(done)))
+
+    assert result == ['Resolved', 'Resolved', 'Unresolved', 'Unresolved', 'Resolved', 'Unresolved', 'Unresolved',
+                      'Unresolved']
+    assert len(sent) == 5 and 'order1' in sent[0] and 'order4' in sent[1]
+    assert 'order5' in sent[2] and 'order6' in sent[3] and 'order7' in sent[4]  # Open statements aren't closed by rule
+    assert progress_calls[0] == 3 and progress_calls[-1] == 8